@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from backend.app.services.database import get_db, Attendance, Student
+from backend.app.services.metrics_service import metrics
+from backend.app.services.event_bus import event_bus, EventBus, attendance_event
+from backend.app.services.attendance_retention import attendance_retention
 from typing import List
 from datetime import datetime
 from pydantic import BaseModel
+import asyncio
 import csv
 import io
+import time
 
 router = APIRouter()
 
@@ -20,8 +25,17 @@ class MarkAttendanceRequest(BaseModel):
 async def get_attendance_records(
     skip: int = 0,
     limit: int = 100,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
+    start_time = time.perf_counter()
+    if include_archived:
+        # Live and archived rows through one UNION ALL query (see attendance_retention)
+        results = [_record_row(row, archived=True) for row in
+                   attendance_retention.query_rows(db.connection(), True, skip=skip, limit=limit)]
+        metrics.observe("attendance_query_seconds", (time.perf_counter() - start_time) * 1000, query="list_archived")
+        return results
+
     attendance_records = db.query(Attendance).order_by(Attendance.timestamp.desc()).offset(skip).limit(limit).all()
     
     results = []
@@ -37,8 +51,47 @@ async def get_attendance_records(
             "camera_id": record.camera_id or "N/A",
             "status": "present"
         })
+    metrics.observe("attendance_query_seconds", (time.perf_counter() - start_time) * 1000, query="list")
     return results
 
+def _record_row(row: dict, archived: bool = False) -> dict:
+    """GET /attendance/ row from a query_rows result"""
+    timestamp = row["timestamp"]
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    result = {
+        "id": row["id"],
+        "student_id": row["student_id"],
+        "student_name": row["student_name"] or "Unknown",
+        "roll_number": row["roll_number"] or "N/A",
+        "email": row["email"] or "N/A",
+        "timestamp": timestamp.isoformat(),
+        "camera_id": row["camera_id"] or "N/A",
+        "status": "present"
+    }
+    if archived:
+        # Archived rows have no live id (DELETE /attendance/{id} applies to live rows only)
+        result["archived"] = bool(row["archived"])
+        result["archive_id"] = row["archive_id"]
+    return result
+
+@router.get("/attendance/retention")
+async def get_retention_status():
+    """Live/archived row counts, database sizes and the last retention run"""
+    if not attendance_retention.available:
+        raise HTTPException(status_code=404, detail="Attendance retention needs a SQLite database")
+    return {**attendance_retention.status(), "horizon_days": attendance_retention.horizon_days,
+            "schedule_hours": attendance_retention.schedule_hours, "last_run": attendance_retention.last_run}
+
+@router.post("/attendance/retention/run")
+def run_retention(horizon_days: float = None, dry_run: bool = False):
+    """Archive rows older than horizon_days (default retention.horizon_days) and compact the database"""
+    if not attendance_retention.available:
+        raise HTTPException(status_code=404, detail="Attendance retention needs a SQLite database")
+    if horizon_days is not None and horizon_days < 0:
+        raise HTTPException(status_code=400, detail="horizon_days must not be negative")
+    return attendance_retention.run(horizon_days=horizon_days, dry_run=dry_run)
+
 @router.post("/attendance/mark")
 async def mark_attendance(
     request: MarkAttendanceRequest,
@@ -67,6 +120,8 @@ async def mark_attendance(
     db.add(attendance)
     db.commit()
     db.refresh(attendance)
+    metrics.inc("attendance_records_total", source="manual")
+    event_bus.publish("attendance", attendance_event(attendance, student, source="manual"), camera_id=attendance.camera_id)
     
     return {
         "id": attendance.id,
@@ -83,17 +138,81 @@ async def delete_attendance(
     attendance_id: int,
     db: Session = Depends(get_db)
 ):
+    """Delete a live attendance record; archived rows (id null, archive_id set) are not deletable here"""
     attendance = db.query(Attendance).filter(Attendance.id == attendance_id).first()
     if not attendance:
         raise HTTPException(status_code=404, detail="Attendance record not found")
     
     db.delete(attendance)
     db.commit()
+    event_bus.publish("attendance_deleted", {"id": attendance_id, "student_id": attendance.student_id,
+                                             "camera_id": attendance.camera_id}, camera_id=attendance.camera_id)
     return {"message": "Attendance record deleted successfully"}
 
+@router.get("/attendance/stream")
+async def stream_attendance(
+    request: Request,
+    camera_id: str = None,
+    events: str = "attendance,attendance_deleted",
+    last_event_id: str = Header(None),
+):
+    """
+    Server-sent events for attendance records as they are committed (and deleted), optionally
+    for one camera. Add "recognition" to `events` for a per-frame summary of recognized faces.
+    EventSource reconnects resume from Last-Event-ID; a "reset" event means the gap could not
+    be replayed and the client should re-fetch GET /attendance/.
+    """
+    event_types = [event.strip() for event in events.split(",") if event.strip()]
+    subscription, replay, reset = event_bus.subscribe(camera_id, event_types, last_event_id)
+
+    async def stream():
+        try:
+            yield f"retry: {int(event_bus.heartbeat_seconds * 1000)}\n\n"
+            if reset:
+                yield EventBus.format(None, "reset", {"reason": "events since Last-Event-ID are no longer available"})
+            for message in replay:
+                yield message
+            reported = 0
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=event_bus.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.dropped > reported:
+                    yield EventBus.format(None, "overflow", {"missed": subscription.dropped - reported})
+                    reported = subscription.dropped
+                yield message
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/attendance/stream/stats")
+async def get_stream_stats():
+    """Subscribers, published and dropped counts of the attendance event stream"""
+    return event_bus.stats()
+
 @router.get("/attendance/export/csv")
-async def export_attendance_csv(db: Session = Depends(get_db)):
-    attendance_records = db.query(Attendance).order_by(Attendance.timestamp.desc()).all()
+async def export_attendance_csv(include_archived: bool = False, db: Session = Depends(get_db)):
+    start_time = time.perf_counter()
+    if include_archived:
+        rows = [(row["id"] if row["id"] is not None else f"archive:{row['archive_id']}", row["student_name"] or "Unknown", row["roll_number"] or "N/A", row["email"] or "N/A",
+                 datetime.fromisoformat(row["timestamp"]) if isinstance(row["timestamp"], str) else row["timestamp"],
+                 row["camera_id"]) for row in attendance_retention.query_rows(db.connection(), True)]
+    else:
+        rows = []
+        for record in db.query(Attendance).order_by(Attendance.timestamp.desc()).all():
+            student = db.query(Student).filter(Student.id == record.student_id).first()
+            rows.append((record.id,
+                         student.name if student else "Unknown",
+                         student.roll_number if student else "N/A",
+                         student.email if student else "N/A",
+                         record.timestamp,
+                         record.camera_id))
     
     # Create CSV in memory
     output = io.StringIO()
@@ -103,19 +222,21 @@ async def export_attendance_csv(db: Session = Depends(get_db)):
     writer.writerow(["ID", "Student Name", "Roll Number", "Email", "Date", "Time", "Camera ID", "Status"])
     
     # Write data
-    for record in attendance_records:
-        student = db.query(Student).filter(Student.id == record.student_id).first()
+    for record_id, name, roll_number, email, timestamp, camera_id in rows:
         writer.writerow([
-            record.id,
-            student.name if student else "Unknown",
-            student.roll_number if student else "N/A",
-            student.email if student else "N/A",
-            record.timestamp.strftime("%Y-%m-%d"),
-            record.timestamp.strftime("%H:%M:%S"),
-            record.camera_id or "N/A",
+            record_id,
+            name,
+            roll_number,
+            email,
+            timestamp.strftime("%Y-%m-%d"),
+            timestamp.strftime("%H:%M:%S"),
+            camera_id or "N/A",
             "Present"
         ])
     
+    metrics.observe("attendance_query_seconds", (time.perf_counter() - start_time) * 1000,
+                    query="export_archived" if include_archived else "export")
+
     # Prepare response
     output.seek(0)
     return StreamingResponse(
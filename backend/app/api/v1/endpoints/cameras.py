@@ -1,16 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from backend.app.config import get_cameras_config
 from backend.app.services.live_stream_service import LiveStreamService
-import cv2
-import io
+from backend.app.services.snapshot_cache import SnapshotCache
+from backend.app.services.telemetry import camera_telemetry
+from backend.app.services.metrics_service import metrics
+from backend.app.services.camera_profiles import camera_profiles
+from backend.app.services.frame_result_cache import frame_result_cache
+from pydantic import BaseModel
+from typing import Optional
 
 router = APIRouter()
 
 live_stream_service = LiveStreamService()
 
+cameras_config = get_cameras_config()
+snapshot_cache = SnapshotCache(
+    jpeg_quality=cameras_config.get('snapshot_jpeg_quality', 80),
+    sizes=cameras_config.get('snapshot_sizes', {})
+)
+
+class CameraProfileRequest(BaseModel):
+    roi: dict = None            # {"type": "rect", "x", "y", "w", "h"} or {"type": "polygon", "points": [[x, y], ...]}, normalized 0..1
+    min_face_size: int = None   # Pixels (shorter side) in the processed frame
+    max_faces: int = None
+
+def _validated_profile(profile: Optional[CameraProfileRequest]):
+    if profile is None:
+        return None
+    try:
+        return camera_profiles.build(profile.model_dump(exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Adding and removing streams wait for readers/capture processes to start or stop, so these
+# routes are plain defs that FastAPI runs in the threadpool
 @router.post("/cameras/add")
-async def add_camera_stream(stream_url: str):
-    camera_id = live_stream_service.add_camera(stream_url)
+def add_camera_stream(stream_url: str, profile: Optional[CameraProfileRequest] = None):
+    camera_id = live_stream_service.add_camera(stream_url, profile=_validated_profile(profile))
     if camera_id is None:
         raise HTTPException(status_code=400, detail="Could not add camera stream")
     return {"camera_id": camera_id, "message": f"Camera stream added with ID {camera_id}"}
@@ -20,19 +46,80 @@ async def list_cameras():
     camera_ids = live_stream_service.get_all_cameras()
     return {"cameras": [{"id": cam_id} for cam_id in camera_ids]}
 
+@router.get("/cameras/stats")
+async def get_all_camera_stats():
+    """Aggregate capture/recognition telemetry for all cameras, with stalled and lagging camera ids"""
+    return live_stream_service.get_all_camera_stats()
+
+@router.get("/cameras/{camera_id}/stats")
+async def get_camera_stats(camera_id: str):
+    stats = live_stream_service.get_camera_stats(camera_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    return stats
+
+@router.get("/cameras/profiles")
+async def list_camera_profiles():
+    """Explicitly configured profiles and the defaults used for every other camera"""
+    return {"defaults": camera_profiles.get(None).to_dict(), "profiles": camera_profiles.all()}
+
+@router.get("/cameras/{camera_id}/profile")
+async def get_camera_profile(camera_id: str):
+    return {"camera_id": camera_id, "custom": camera_profiles.has(camera_id), **camera_profiles.get(camera_id).to_dict()}
+
+@router.put("/cameras/{camera_id}/profile")
+async def set_camera_profile(camera_id: str, profile: CameraProfileRequest):
+    """
+    Set the ROI, minimum face size and face limit used by recognize-frame for this camera_id.
+    The camera does not have to be a live stream; any camera_id sent to recognize-frame works.
+    """
+    camera_profiles.set(camera_id, _validated_profile(profile))
+    # Cached results were computed with the old ROI and limits
+    frame_result_cache.invalidate(camera_id)
+    return {"camera_id": camera_id, "custom": True, **camera_profiles.get(camera_id).to_dict()}
+
+@router.delete("/cameras/{camera_id}/profile")
+async def reset_camera_profile(camera_id: str):
+    camera_profiles.remove(camera_id)
+    frame_result_cache.invalidate(camera_id)
+    return {"camera_id": camera_id, "custom": False, **camera_profiles.get(camera_id).to_dict()}
+
 @router.delete("/cameras/{camera_id}")
-async def remove_camera_stream(camera_id: int):
+def remove_camera_stream(camera_id: int):
     if live_stream_service.remove_camera(camera_id):
+        snapshot_cache.remove(camera_id)
         return {"message": f"Camera stream {camera_id} removed"}
     raise HTTPException(status_code=404, detail="Camera stream not found")
 
 @router.get("/cameras/{camera_id}/snapshot")
-async def get_camera_snapshot(camera_id: int):
-    frame = live_stream_service.get_frame(camera_id)
+def get_camera_snapshot(
+    camera_id: int,
+    size: str = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Newest camera frame as JPEG. `size` selects a thumbnail variant from cameras.snapshot_sizes.
+    Responses carry an ETag for the frame; If-None-Match with the current ETag returns 304.
+    A plain def, so FastAPI runs it in the threadpool: waiting for a fresh frame and JPEG
+    encoding must not hold up the event loop.
+    """
+    if size is not None and size not in snapshot_cache.sizes:
+        raise HTTPException(status_code=400, detail=f"Unknown snapshot size '{size}'. Options: {sorted(snapshot_cache.sizes)}")
+
+    seq, frame = live_stream_service.get_frame_with_seq(camera_id, fresh=True)
     if frame is None:
         raise HTTPException(status_code=404, detail="Camera not found or no frame available")
 
-    # Encode the frame to JPEG
-    _, buffer = cv2.imencode('.jpg', frame)
-    io_buf = io.BytesIO(buffer)
-    return StreamingResponse(io_buf, media_type="image/jpeg")
\ No newline at end of file
+    telemetry = camera_telemetry.get(camera_id)
+    etag = snapshot_cache.etag(camera_id, seq, size)
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        telemetry.incr("snapshot_not_modified")
+        metrics.inc("snapshot_requests_total", result="not_modified")
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    etag, data, cache_hit = snapshot_cache.get(camera_id, seq, frame, size)
+    if data is None:
+        raise HTTPException(status_code=500, detail="Could not encode snapshot")
+    telemetry.incr("snapshot_cache_hits" if cache_hit else "snapshot_encodes")
+    metrics.inc("snapshot_requests_total", result="cache_hit" if cache_hit else "encoded")
+    return Response(content=data, media_type="image/jpeg", headers={"ETag": etag, "Cache-Control": "no-cache"})
\ No newline at end of file
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from backend.app.services.metrics_service import metrics
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Recognition pipeline metrics in Prometheus text format"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (metrics.enabled in config.yaml)")
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
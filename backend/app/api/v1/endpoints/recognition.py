@@ -1,31 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-import numpy as np
 import cv2
 from backend.app.services.recognition_service import FaceRecognitionService
 from backend.app.services.training_service import TrainingService
+from backend.app.services.model_registry import get_recognition_service
 from backend.app.services.database import get_db, Attendance
+from backend.app.services.telemetry import camera_telemetry
+from backend.app.services.adaptive_controller import AdaptiveController
+from backend.app.services.camera_profiles import camera_profiles
+from backend.app.services.frame_result_cache import frame_result_cache
+from backend.app.services.schedule_service import schedule_service
+from backend.app.services.inference_scheduler import inference_scheduler, FrameSuperseded
+from backend.app.services.event_bus import event_bus, attendance_event
+from backend.app.services.image_ingest import image_ingest, ImageTooLarge, InvalidImage
+from backend.app.services.metrics_service import metrics
 from backend.app.config import config, get_bounding_box_config, get_attendance_config, get_live_stream_config
 from fastapi import UploadFile, File
-from io import BytesIO
-from PIL import Image
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 import base64
+import threading
+import time
 from datetime import datetime, timedelta
 
 router = APIRouter()
 
-# Removed unused FaceDetector - using InsightFace SCRFD-10G instead
-recognition_service = FaceRecognitionService()
-training_service = TrainingService(recognition_service=recognition_service)
+# Face models are loaded once per process by the model registry (see main.py startup)
+training_service = TrainingService()
 
 # Load configuration
 bbox_config = get_bounding_box_config()
 attendance_config = get_attendance_config()
 live_config = config.get_section('live_stream')
+scoped_gallery_enabled = config.get('face_recognition.scoped_gallery.enabled', True)
+
+# Per-camera quality ladder (detector size, resize width, frame interval) driven by latency.
+# Built on the first frame, once the loaded models have picked the detector size for this device.
+adaptive_controller = None
+
+def get_adaptive_controller(recognition_service: FaceRecognitionService) -> AdaptiveController:
+    global adaptive_controller
+    if adaptive_controller is None:
+        adaptive_controller = AdaptiveController(recognition_service.det_size, config.get_section('adaptive'), live_config)
+    return adaptive_controller
 
 # Cache student embeddings to avoid loading from DB every frame
 _student_cache = {"data": None, "last_update": None}
 _attendance_cooldown = {}  # Track last attendance time for each student
+_attendance_lock = threading.Lock()
 
 def get_cached_students(db: Session):
     """Load students from cache or DB if cache is old"""
@@ -34,65 +56,185 @@ def get_cached_students(db: Session):
     if (_student_cache["data"] is None or 
         _student_cache["last_update"] is None or 
         (now - _student_cache["last_update"]).seconds > cache_refresh):
-        _student_cache["data"] = training_service.load_all_student_embeddings(db)
+        with metrics.stage("student_cache_load"):
+            _student_cache["data"] = training_service.load_all_student_embeddings(db)
         _student_cache["last_update"] = now
+        metrics.inc("student_cache_requests_total", result="miss")
+    else:
+        metrics.inc("student_cache_requests_total", result="hit")
+    if metrics.enabled:
+        hits = metrics.counter_value("student_cache_requests_total", result="hit")
+        misses = metrics.counter_value("student_cache_requests_total", result="miss")
+        metrics.set_gauge("student_cache_hit_ratio", hits / (hits + misses))
     return _student_cache["data"]
 
 @router.post("/recognition/recognize-frame")
 async def recognize_frame(
     file: UploadFile = File(...),
     camera_id: str = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    recognition_service: FaceRecognitionService = Depends(get_recognition_service)
 ):
-    contents = await file.read()
-    np_image = np.frombuffer(contents, np.uint8)
-    image = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
+    start_time = time.perf_counter()
+    camera_key = camera_id if camera_id else "Unknown"
+    telemetry = camera_telemetry.get(camera_key)
+    with metrics.stage("upload_read"):
+        try:
+            contents = await image_ingest.read_upload(file)
+        except ImageTooLarge as e:
+            telemetry.incr("oversized_uploads")
+            raise HTTPException(status_code=413, detail=str(e))
+
+    # Match against the sections scheduled for this camera right now first (a reload queries the DB)
+    sections = None
+    if camera_id and scoped_gallery_enabled:
+        sections = await run_in_threadpool(schedule_service.active_sections, db, camera_id)
+
+    # A byte-identical upload from the same camera (stalled camera, fast polling) gets the
+    # previous result: no model run and no second attendance record
+    cache_key = None
+    if frame_result_cache.enabled:
+        cache_key = frame_result_cache.key(camera_key, contents, sections)
+        cached = frame_result_cache.get(cache_key)
+        if cached is not None:
+            telemetry.incr("result_cache_hits")
+            metrics.inc("recognition_result_cache_total", result="hit")
+            return {**cached, "cached": True}
+        telemetry.incr("result_cache_misses")
+        metrics.inc("recognition_result_cache_total", result="miss")
+
+    controller = get_adaptive_controller(recognition_service).get(camera_key)
+    settings = controller.begin()
+    # The scheduler runs the frame on a worker thread when it is this camera's turn; a newer
+    # frame from the same camera that arrives first takes its place (latest frame wins).
+    # Uploads without a camera_id (browser tabs, manual uploads) are unrelated requests that must
+    # not replace each other, so they just run on the threadpool.
+    work = lambda: _recognize_frame(contents, camera_id, sections, settings, telemetry, recognition_service, db)
+    superseded = False
+    try:
+        if camera_id and inference_scheduler.enabled:
+            result = await inference_scheduler.run(camera_id, work)
+        else:
+            result = await run_in_threadpool(work)
+    except FrameSuperseded as e:
+        superseded = True
+        controller.abandon()
+        telemetry.incr("frames_superseded")
+        metrics.inc("recognition_frames_superseded_total")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "0"})
+    finally:
+        if not superseded:
+            controller.end((time.perf_counter() - start_time) * 1000)
+
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    telemetry.set_gauge("quality_level", settings["level"])
+    telemetry.observe("recognition_ms", elapsed_ms)
+    metrics.observe("recognition_frame_seconds", elapsed_ms)
+    result["quality_level"] = settings["level"]
+    result["next_interval_ms"] = settings["interval_ms"]
+    if cache_key is not None:
+        frame_result_cache.put(cache_key, camera_key, result)
+    return {**result, "cached": False}
+
+@router.get("/recognition/inference-server")
+async def get_inference_server_stats(recognition_service: FaceRecognitionService = Depends(get_recognition_service)):
+    """Batching and queue statistics of the shared inference server, when one is used"""
+    if not hasattr(recognition_service, "server_stats"):
+        raise HTTPException(status_code=404, detail="Models run in-process; inference_server is not enabled")
+    return recognition_service.server_stats()
+
+@router.get("/recognition/result-cache")
+async def get_result_cache_stats():
+    """Hit/miss counters of the repeated-upload result cache"""
+    return frame_result_cache.stats()
+
+@router.delete("/recognition/result-cache")
+async def clear_result_cache(camera_id: str = None):
+    frame_result_cache.invalidate(camera_id)
+    return frame_result_cache.stats()
 
-    if image is None:
-        raise HTTPException(status_code=400, detail="Could not decode image")
+@router.get("/recognition/scheduler")
+async def get_scheduler_stats():
+    """Per-camera achieved FPS, superseded (dropped) frames and queue wait of the inference scheduler"""
+    return inference_scheduler.stats()
+
+class SchedulerCameraRequest(BaseModel):
+    weight: float = None    # Share of inference under the weighted policy
+    max_fps: float = None   # Frames per second budget; 0 = unlimited
+
+@router.put("/recognition/scheduler/cameras/{camera_id}")
+async def configure_scheduler_camera(camera_id: str, request: SchedulerCameraRequest):
+    try:
+        return inference_scheduler.configure(camera_id, weight=request.weight, max_fps=request.max_fps)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/recognition/adaptive")
+async def get_adaptive_state():
+    """Current quality level, latency and queue depth per camera"""
+    if adaptive_controller is None:
+        return {"levels": [], "cameras": {}}
+    return adaptive_controller.snapshot()
+
+def _recognize_frame(contents: bytes, camera_id, sections, settings, telemetry, recognition_service: FaceRecognitionService, db: Session):
+    # JPEGs are decoded at 1/2-1/8 scale when that still covers resize_width
+    resize_width = settings["resize_width"]
+    with metrics.stage("decode"):
+        try:
+            image, _ = image_ingest.decode(contents, min_width=resize_width)
+        except ImageTooLarge as e:
+            telemetry.incr("oversized_uploads")
+            raise HTTPException(status_code=413, detail=str(e))
+        except InvalidImage as e:
+            telemetry.incr("decode_errors")
+            raise HTTPException(status_code=400, detail=str(e))
 
     # Resize image for faster processing
-    resize_width = live_config.get('resize_width', 480)
     h, w = image.shape[:2]
     if w > resize_width:
-        scale = resize_width / w
-        image = cv2.resize(image, (resize_width, int(h * scale)), interpolation=cv2.INTER_LINEAR)
+        with metrics.stage("resize"):
+            scale = resize_width / w
+            image = cv2.resize(image, (resize_width, int(h * scale)), interpolation=cv2.INTER_LINEAR)
         h, w = image.shape[:2]
 
-    recognized_faces = []
-    registered_students = get_cached_students(db)  # Use cache
+    # A remote inference server keeps its own gallery; otherwise match against the local cache
+    registered_students = None if getattr(recognition_service, "owns_gallery", False) else get_cached_students(db)
 
-    # Use InsightFace for faster detection and recognition with GPU
-    max_faces = config.get('face_recognition.detection.max_faces', 10)
-    faces = recognition_service.app.get(image, max_num=max_faces)
-    
-    for face in faces:
-        bbox = face.bbox.astype(int)
-        x1, y1, x2, y2 = bbox
-        
-        # Face embedding is already computed by InsightFace
-        embedding = face.embedding
-        name, similarity = recognition_service.find_match(embedding, registered_students)
-
-        recognized_faces.append({
-            "bbox": [int(x1), int(y1), int(x2), int(y2)],
-            "confidence": float(face.det_score),
-            "name": name,
-            "similarity": float(similarity)
-        })
-        
-        if name != "Unknown":
+    # Detect only inside the camera's region of interest; faces too small to recognize reliably
+    # never reach the recognition model (detect/embed/match stages are timed inside)
+    profile = camera_profiles.get(camera_id if camera_id else "Unknown")
+    detect_input, offset = profile.crop(image)
+    recognized_faces, too_small = recognition_service.analyze_frame(
+        image, registered_students,
+        max_num=profile.max_faces,
+        det_size=settings["det_size"],
+        detect_input=detect_input if detect_input is not image else None,
+        offset=offset,
+        min_face_size=profile.min_face_size,
+        sections=sections
+    )
+    if too_small:
+        telemetry.incr("faces_too_small", too_small)
+        metrics.inc("recognition_faces_total", too_small, result="too_small")
+
+    with metrics.stage("attendance_commit"):
+        for face in recognized_faces:
             # Record attendance only once per cooldown period per student
-            student_id = next((s["id"] for s in registered_students if s["name"] == name), None)
+            student_id = face["student_id"]
             if student_id:
-                now = datetime.now()
-                last_recorded = _attendance_cooldown.get(student_id)
-                
                 cooldown_minutes = attendance_config.get('cooldown_minutes', 5)
                 auto_mark = attendance_config.get('auto_mark_enabled', True)
-                
-                # Only record if more than cooldown minutes since last attendance
-                if auto_mark and (last_recorded is None or (now - last_recorded) > timedelta(minutes=cooldown_minutes)):
+                if not auto_mark:
+                    continue
+
+                # Frames run on scheduler workers and the threadpool at once: check and record under
+                # the lock so two frames of the same student cannot both pass the cooldown check
+                with _attendance_lock:
+                    now = datetime.now()
+                    last_recorded = _attendance_cooldown.get(student_id)
+                    # Only record if more than cooldown minutes since last attendance
+                    if last_recorded is not None and (now - last_recorded) <= timedelta(minutes=cooldown_minutes):
+                        continue
                     attendance = Attendance(
                         student_id=student_id,
                         camera_id=str(camera_id) if camera_id else "Unknown"
@@ -100,6 +242,11 @@ async def recognize_frame(
                     db.add(attendance)
                     db.commit()
                     _attendance_cooldown[student_id] = now
+                telemetry.incr("attendance_marked")
+                metrics.inc("attendance_records_total", source="recognition")
+                event_bus.publish("attendance", attendance_event(
+                    attendance, source="recognition", student_name=face["name"], roll_number=face["roll_number"]
+                ), camera_id=attendance.camera_id)
 
     # Encode the image with bounding boxes for response
     font_scale = bbox_config.get('font_scale', 0.5)
@@ -109,25 +256,42 @@ async def recognize_frame(
     color_known = tuple(bbox_config.get('box_color_known', [0, 255, 0]))
     color_unknown = tuple(bbox_config.get('box_color_unknown', [0, 0, 255]))
     
-    for face in recognized_faces:
-        x1, y1, x2, y2 = face["bbox"]
-        name = face["name"]
-        
-        # Get roll number for label
-        roll_number = None
-        if name != "Unknown":
-            student = next((s for s in registered_students if s["name"] == name), None)
-            if student and "roll_number" in student:
-                roll_number = student["roll_number"]
-        
-        label = roll_number if roll_number else name
-        color = color_known if name != "Unknown" else color_unknown
-        cv2.rectangle(image, (x1, y1), (x2, y2), color, box_thickness)
-        cv2.putText(image, label, (x1, y1 + label_offset), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, font_thickness)
+    with metrics.stage("draw"):
+        roi_outline = profile.roi_polygon(h, w)
+        if roi_outline is not None:
+            cv2.polylines(image, [roi_outline], True, tuple(bbox_config.get('roi_color', [255, 255, 0])), 1)
+        for face in recognized_faces:
+            x1, y1, x2, y2 = face["bbox"]
+            name = face["name"]
+            
+            # Label recognized faces with their roll number
+            roll_number = face["roll_number"]
+            label = roll_number if roll_number else name
+            color = color_known if name != "Unknown" else color_unknown
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, box_thickness)
+            cv2.putText(image, label, (x1, y1 + label_offset), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, font_thickness)
     
     # Convert annotated image to base64 string
-    jpeg_quality = live_config.get('jpeg_quality', 85)
-    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
-    jpg_as_text = base64.b64encode(buffer).decode('utf-8')
+    with metrics.stage("encode"):
+        jpeg_quality = live_config.get('jpeg_quality', 85)
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        jpg_as_text = base64.b64encode(buffer).decode('utf-8')
+
+    known_faces = sum(1 for face in recognized_faces if face["name"] != "Unknown")
+    telemetry.incr("frames_processed")
+    telemetry.incr("faces_detected", len(recognized_faces))
+    telemetry.incr("faces_recognized", known_faces)
+    telemetry.incr("faces_unknown", len(recognized_faces) - known_faces)
+    telemetry.set_gauge("last_frame_at", time.time())
+    metrics.inc("recognition_frames_total")
+    metrics.observe("recognition_faces_per_frame", len(recognized_faces))
+    metrics.inc("recognition_faces_total", known_faces, result="matched")
+    metrics.inc("recognition_faces_total", len(recognized_faces) - known_faces, result="unknown")
+    if recognized_faces:
+        event_bus.publish("recognition", {
+            "camera_id": str(camera_id) if camera_id else "Unknown",
+            "timestamp": datetime.now().isoformat(),
+            "faces": [{k: face[k] for k in ("student_id", "name", "roll_number", "similarity")} for face in recognized_faces],
+        }, camera_id=str(camera_id) if camera_id else "Unknown")
 
-    return {"recognized_faces": recognized_faces, "annotated_frame": jpg_as_text}
+    return {"recognized_faces": recognized_faces, "annotated_frame": jpg_as_text, "sections": list(sections) if sections else None}
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from datetime import datetime
+from backend.app.services.database import get_db
+from backend.app.services.schedule_service import schedule_service
+from backend.app.services.frame_result_cache import frame_result_cache
+
+router = APIRouter()
+
+class ScheduleRequest(BaseModel):
+    camera_id: str
+    section: str
+    start_time: str             # "HH:MM", local time
+    end_time: str               # "HH:MM"; earlier than start_time for a window spanning midnight
+    day_of_week: int = None     # 0 = Monday ... 6 = Sunday; omit for every day
+
+@router.get("/schedules/")
+async def list_schedules(camera_id: str = None, db: Session = Depends(get_db)):
+    return {"schedules": schedule_service.list_schedules(db, camera_id)}
+
+@router.post("/schedules/")
+async def add_schedule(schedule: ScheduleRequest, db: Session = Depends(get_db)):
+    try:
+        created = schedule_service.add_schedule(db, schedule.camera_id, schedule.section, schedule.start_time,
+                                                schedule.end_time, day_of_week=schedule.day_of_week)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    frame_result_cache.invalidate(schedule.camera_id)
+    return created
+
+@router.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: int, db: Session = Depends(get_db)):
+    if not schedule_service.delete_schedule(db, schedule_id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    frame_result_cache.invalidate()
+    return {"message": f"Schedule {schedule_id} deleted successfully"}
+
+@router.get("/schedules/active")
+async def get_active_sections(camera_id: str, at: datetime = None, db: Session = Depends(get_db)):
+    """Sections a camera matches against first at `at` (default now); null means the full gallery"""
+    return {"camera_id": camera_id, "sections": schedule_service.active_sections(db, camera_id, at)}
@@ -1,24 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 import numpy as np
 import cv2
 from backend.app.services.database import get_db, Student
 from backend.app.services.training_service import TrainingService
 from backend.app.services.recognition_service import FaceRecognitionService
+from backend.app.services.model_registry import get_recognition_service, model_registry
+from backend.app.services.image_ingest import image_ingest, ImageTooLarge, InvalidImage
+from backend.app.config import config
 from typing import List
 
 router = APIRouter()
 
-recognition_service = FaceRecognitionService() # Initialize once
-training_service = TrainingService(recognition_service=recognition_service)
+# Shares the face models loaded by the model registry with the recognition router
+training_service = TrainingService()
 
 @router.post("/students/", response_model=dict)
 async def add_student(
     name: str = Form(...),
     roll_number: str = Form(...),
     email: str = Form(None),
+    section: str = Form(None),
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    recognition_service: FaceRecognitionService = Depends(get_recognition_service)
 ):
     # Check if student with roll number already exists
     existing_student = db.query(Student).filter(Student.roll_number == roll_number).first()
@@ -33,13 +39,19 @@ async def add_student(
     embeddings = []
     saved_photos = []
     
+    max_width = config.get('student_photos.max_width', 1280)
     for idx, file in enumerate(files):
-        contents = await file.read()
-        np_image = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
-
-        if image is None:
+        # Phone photos are often 12MP+ with an EXIF rotation; decode them upright and at reduced scale
+        try:
+            contents = await image_ingest.read_upload(file)
+            image, _ = image_ingest.decode(contents, min_width=max_width)
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=f"{file.filename}: {e}")
+        except InvalidImage:
             continue
+        h, w = image.shape[:2]
+        if max_width and w > max_width:
+            image = cv2.resize(image, (max_width, int(h * max_width / w)), interpolation=cv2.INTER_AREA)
         
         # Save photo
         photo_filename = f"{roll_number}_{idx+1}.jpg"
@@ -68,16 +80,59 @@ async def add_student(
         db, name, avg_embedding,
         roll_number=roll_number, 
         email=email, 
-        photo_path=photo_paths
+        photo_path=photo_paths,
+        section=section
     )
     
+    # A shared inference server keeps its own gallery; make the new student matchable right away
+    if hasattr(recognition_service, "reload_gallery"):
+        recognition_service.reload_gallery()
+    
     return {"message": f"Student {db_student.name} added successfully with {len(embeddings)} photo(s)", "id": db_student.id}
 
 @router.get("/students/", response_model=List[dict])
-async def get_all_students(db: Session = Depends(get_db)):
-    students = training_service.get_all_students_list(db)
+async def get_all_students(
+    response: Response,
+    q: str = None,
+    after_id: int = None,
+    limit: int = Query(None, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Students ordered by id. q filters by name or roll number prefix (case-insensitive).
+    With limit, a full page sets X-Next-After-Id: pass it back as after_id for the next page.
+    """
+    students = training_service.get_all_students_list(db, q=q, after_id=after_id, limit=limit)
+    if limit is not None and len(students) == limit:
+        response.headers["X-Next-After-Id"] = str(students[-1]["id"])
     return students
 
+@router.get("/students/by-roll/{roll_number}")
+async def get_student_by_roll_number(roll_number: str, db: Session = Depends(get_db)):
+    student = training_service.get_student_by_roll_number(db, roll_number)
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return student
+
+@router.get("/students/sections")
+async def list_sections(db: Session = Depends(get_db)):
+    """Class sections with their enrolled student counts"""
+    rows = db.query(Student.section, func.count(Student.id)).group_by(Student.section).all()
+    return {"sections": [{"section": section, "students": count} for section, count in rows if section],
+            "unassigned": sum(count for section, count in rows if not section)}
+
+@router.put("/students/{student_id}/section")
+async def set_student_section(student_id: int, section: str = None, db: Session = Depends(get_db)):
+    """Move a student to another class section (omit section to unassign)"""
+    student = db.query(Student).filter(Student.id == student_id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    student.section = section or None
+    db.commit()
+    if model_registry.ready and hasattr(model_registry.get(), "reload_gallery"):
+        model_registry.get().reload_gallery()
+    return {"id": student.id, "name": student.name, "section": student.section}
+
 @router.delete("/students/{student_id}")
 async def delete_student(student_id: int, db: Session = Depends(get_db)):
     student = db.query(Student).filter(Student.id == student_id).first()
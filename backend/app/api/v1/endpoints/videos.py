@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from typing import List
+import os
+import uuid
+from backend.app.config import config
+from backend.app.services.recognition_service import FaceRecognitionService
+from backend.app.services.model_registry import get_recognition_service
+from backend.app.services.video_attendance_service import video_attendance_service, parse_recorded_at
+
+router = APIRouter()
+
+video_config = config.get_section('video_attendance')
+
+@router.post("/videos/attendance", status_code=202)
+async def process_videos(
+    camera_id: str = Form(...),
+    recorded_at: List[str] = Form(None),  # ISO recording start, once per file; default: upload time minus duration
+    files: List[UploadFile] = File(...),
+    recognition_service: FaceRecognitionService = Depends(get_recognition_service)
+):
+    """Queue recorded videos for offline attendance; poll GET /videos/attendance/{job_id} for progress"""
+    if recorded_at and len(recorded_at) != len(files):
+        raise HTTPException(status_code=400, detail="Give recorded_at once per file")
+    try:
+        starts = [parse_recorded_at(value) for value in recorded_at] if recorded_at else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid recorded_at format. Use ISO format (YYYY-MM-DDTHH:MM:SS)")
+
+    # Stream uploads to disk in chunks; recordings can be far larger than memory allows
+    upload_dir = video_config.get('upload_directory', './video_uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+    max_bytes = video_config.get('max_upload_mb', 2048) * 1024 * 1024
+    paths = []
+    try:
+        for file in files:
+            extension = os.path.splitext(file.filename or "")[1] or ".mp4"
+            path = os.path.join(upload_dir, f"{uuid.uuid4().hex}{extension}")
+            paths.append(path)
+            written = 0
+            # Disk writes go through the threadpool so a large upload doesn't stall the event loop
+            out = await run_in_threadpool(open, path, "wb")
+            try:
+                while chunk := await file.read(1024 * 1024):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise HTTPException(status_code=413, detail=f"{file.filename}: larger than {max_bytes} bytes")
+                    await run_in_threadpool(out.write, chunk)
+            finally:
+                await run_in_threadpool(out.close)
+    except HTTPException:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    job = video_attendance_service.submit(paths, camera_id, starts, recognition_service=recognition_service, cleanup=True)
+    return job.to_dict()
+
+@router.get("/videos/attendance")
+async def list_video_jobs():
+    return {"jobs": video_attendance_service.list_jobs()}
+
+@router.get("/videos/attendance/{job_id}")
+async def get_video_job(job_id: str):
+    job = video_attendance_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    return job.to_dict()
@@ -78,3 +78,6 @@ def get_student_photos_config():
 
 def get_live_stream_config():
     return config.get_section('live_stream')
+
+def get_cameras_config():
+    return config.get_section('cameras')
@@ -1,7 +1,16 @@
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from backend.app.config import config
 from backend.app.api.v1.api import api_router
+from backend.app.api.v1.endpoints.cameras import live_stream_service
 from backend.app.services.database import create_db_and_tables
+from backend.app.services.model_registry import model_registry, ModelNotReady, model_not_ready_response
+from backend.app.services.video_attendance_service import video_attendance_service
+from backend.app.services.attendance_retention import attendance_retention
+
+_started_at = time.time()
 
 app = FastAPI(
     title="Real-Time Face Attendance Backend",
@@ -16,14 +25,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-After-Id"],  # Student list pagination
 )
 
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    # Load face models in the background so routes that don't need them are served right away
+    if config.get('startup.preload_models', True):
+        model_registry.start_loading()
+    attendance_retention.start_schedule()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    live_stream_service.shutdown()
+    video_attendance_service.shutdown()
+
+@app.exception_handler(ModelNotReady)
+async def model_not_ready(request, exc: ModelNotReady):
+    """Models resolved lazily outside get_recognition_service (e.g. TrainingService): same answer as the dependency"""
+    return JSONResponse(content={"detail": str(exc)}, **model_not_ready_response(exc))
 
 app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Real-Time Face Attendance API! Visit /docs for API documentation."}
+
+@app.get("/health")
+async def health():
+    """Liveness: the API is serving; reports model loading progress"""
+    return {
+        "status": "ok",
+        "uptime_seconds": round(time.time() - _started_at, 3),
+        "models": model_registry.status(),
+    }
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: 200 once the face models are loaded, 503 before"""
+    status = model_registry.status()
+    return JSONResponse(status_code=200 if model_registry.ready else 503, content={"ready": model_registry.ready, "models": status})
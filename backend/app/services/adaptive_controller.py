@@ -0,0 +1,141 @@
+"""
+Adaptive quality controller for frame recognition.
+Tracks per-camera latency and in-flight requests, and walks each camera along a ladder of
+processing levels (detector input size, resize width, frame interval) to hold a latency SLO.
+Level 0 is full quality; higher levels trade accuracy for throughput.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+
+
+def _round_to(value: float, multiple: int) -> int:
+    return max(multiple, int(round(value / multiple)) * multiple)
+
+
+def build_levels(det_size: Tuple[int, int], settings: Dict[str, Any], live_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Interpolate `steps` levels between the best settings (the service's detector size,
+    configured resize width and frame interval) and the configured lower bounds.
+    Detector sizes are kept at multiples of 32 as SCRFD requires.
+    """
+    steps = max(1, settings.get('steps', 4))
+    min_det = settings.get('min_det_size', [160, 160])
+    max_width = live_config.get('resize_width', 480)
+    min_width = min(settings.get('min_resize_width', 320), max_width)
+    min_interval = live_config.get('frame_interval_ms', 500)
+    max_interval = max(settings.get('max_interval_ms', 2000), min_interval)
+
+    levels = []
+    for i in range(steps):
+        t = i / (steps - 1) if steps > 1 else 0.0
+        levels.append({
+            "level": i,
+            "det_size": (
+                _round_to(det_size[0] + (min_det[0] - det_size[0]) * t, 32),
+                _round_to(det_size[1] + (min_det[1] - det_size[1]) * t, 32),
+            ),
+            "resize_width": int(max_width + (min_width - max_width) * t),
+            "interval_ms": int(min_interval + (max_interval - min_interval) * t),
+        })
+    return levels
+
+
+class CameraController:
+    """Latency/queue tracking and level selection for one camera"""
+    def __init__(self, levels, settings):
+        self.levels = levels
+        self.enabled = settings.get('enabled', True)
+        self.slo_ms = settings.get('latency_slo_ms', 300)
+        self.recover_ratio = settings.get('recover_ratio', 0.6)
+        self.max_queue_depth = settings.get('max_queue_depth', 2)
+        self.adjust_every = max(1, settings.get('adjust_every_frames', 5))
+        self.smoothing = settings.get('smoothing', 0.3)
+
+        self.level = 0
+        self.in_flight = 0
+        self.ewma_ms = None
+        self.frames_since_change = 0
+        self.degrade_count = 0
+        self.upgrade_count = 0
+        self._lock = threading.Lock()
+
+    def begin(self) -> Dict[str, Any]:
+        """Register an in-flight frame and return the settings to process it with"""
+        with self._lock:
+            self.in_flight += 1
+            return dict(self.levels[self.level])
+
+    def end(self, latency_ms: float):
+        """Record a finished frame and move one level up or down if warranted"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if self.ewma_ms is None:
+                self.ewma_ms = latency_ms
+            else:
+                self.ewma_ms = self.smoothing * latency_ms + (1 - self.smoothing) * self.ewma_ms
+            self.frames_since_change += 1
+            if not self.enabled or self.frames_since_change < self.adjust_every:
+                return
+
+            overloaded = self.ewma_ms > self.slo_ms or self.in_flight > self.max_queue_depth
+            relaxed = self.ewma_ms < self.slo_ms * self.recover_ratio and self.in_flight <= 1
+            if overloaded and self.level < len(self.levels) - 1:
+                self.level += 1
+                self.degrade_count += 1
+                self.frames_since_change = 0
+            elif relaxed and self.level > 0:
+                self.level -= 1
+                self.upgrade_count += 1
+                self.frames_since_change = 0
+
+    def abandon(self):
+        """A frame registered with begin() was dropped before processing: no latency sample"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "level": self.level,
+                "settings": dict(self.levels[self.level]),
+                "latency_ewma_ms": round(self.ewma_ms, 2) if self.ewma_ms is not None else None,
+                "latency_slo_ms": self.slo_ms,
+                "queue_depth": self.in_flight,
+                "degrades": self.degrade_count,
+                "upgrades": self.upgrade_count,
+            }
+
+
+class AdaptiveController:
+    """
+    Registry of CameraController objects sharing one level ladder. Camera ids come from clients,
+    so only the max_cameras most recently used controllers are kept (an evicted camera restarts
+    at full quality).
+    """
+    def __init__(self, det_size, settings: Dict[str, Any], live_config: Dict[str, Any]):
+        self.settings = settings
+        self.levels = build_levels(tuple(det_size), settings, live_config)
+        self.max_cameras = max(1, int(settings.get('max_cameras', 256)))
+        self._cameras: "OrderedDict[str, CameraController]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, camera_id) -> CameraController:
+        key = str(camera_id)
+        with self._lock:
+            controller = self._cameras.get(key)
+            if controller is None:
+                controller = self._cameras[key] = CameraController(self.levels, self.settings)
+                while len(self._cameras) > self.max_cameras:
+                    self._cameras.popitem(last=False)
+            self._cameras.move_to_end(key)
+        return controller
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cameras = list(self._cameras.items())
+        return {
+            "levels": self.levels,
+            "cameras": {key: controller.snapshot() for key, controller in cameras},
+        }
@@ -0,0 +1,262 @@
+"""
+Attendance retention: rows older than retention.horizon_days are moved from the live
+`attendance` table into an archive SQLite database (attached to the live connection as
+`archive`), with the student's name and roll number copied so archived rows stay meaningful
+after a student is deleted. Rows are moved in batches, each batch one transaction across both
+files, so the job can be interrupted and re-run safely.
+
+The live database is then compacted with PRAGMA incremental_vacuum a few pages at a time
+instead of a full VACUUM, so the API keeps serving while the file shrinks. The first run on
+an existing database switches it to auto_vacuum=INCREMENTAL, which needs one full VACUUM.
+
+Archived rows stay queryable: GET /attendance/?include_archived=true reads both tables
+through a UNION ALL (see AttendanceRetention.query_rows). Archived rows have their own id space,
+so they are returned with id null and their archive key as archive_id; DELETE /attendance/{id}
+only ever applies to live rows.
+
+Usage (from the repository root):
+    python -m backend.app.services.attendance_retention --horizon-days 365 [--dry-run]
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from backend.app.config import config
+from backend.app.services.database import engine
+from backend.app.services.metrics_service import metrics
+
+# Archived rows get their own id: SQLite reuses attendance ids once rows leave the live table,
+# so the live id (kept as source_id) is not unique across runs.
+_ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS archive.attendance_archive (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_id INTEGER,
+        student_id INTEGER,
+        student_name VARCHAR,
+        roll_number VARCHAR,
+        timestamp DATETIME,
+        camera_id VARCHAR,
+        archived_at DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS archive.ix_attendance_archive_timestamp ON attendance_archive (timestamp)",
+    "CREATE INDEX IF NOT EXISTS archive.ix_attendance_archive_student_id ON attendance_archive (student_id)",
+]
+
+# id is the live attendance id (null for archived rows), archive_id the archive's own key
+_ROW_COLUMNS = "id, archive_id, student_id, student_name, roll_number, email, timestamp, camera_id, archived"
+_LIVE_ROWS = """
+    SELECT a.id, NULL AS archive_id, a.student_id, s.name AS student_name, s.roll_number, s.email, a.timestamp,
+           a.camera_id, 0 AS archived
+    FROM attendance a LEFT JOIN students s ON s.id = a.student_id
+"""
+_ARCHIVED_ROWS = """
+    SELECT NULL, r.id, r.student_id, COALESCE(s.name, r.student_name), COALESCE(s.roll_number, r.roll_number), s.email,
+           r.timestamp, r.camera_id, 1 AS archived
+    FROM archive.attendance_archive r LEFT JOIN students s ON s.id = r.student_id
+"""
+
+
+def default_archive_path() -> Optional[str]:
+    """<live db>_archive.db next to the live SQLite file; None for non-SQLite databases"""
+    if engine.dialect.name != "sqlite" or not engine.url.database or engine.url.database == ":memory:":
+        return None
+    root, ext = os.path.splitext(engine.url.database)
+    return f"{root}_archive{ext or '.db'}"
+
+
+class AttendanceRetention:
+    def __init__(self, settings: Dict[str, Any] = None):
+        settings = settings or {}
+        self.horizon_days = settings.get('horizon_days', 365)
+        self.batch_size = max(1, settings.get('batch_size', 5000))
+        self.archive_path = settings.get('archive_path') or default_archive_path()
+        self.incremental_vacuum = settings.get('incremental_vacuum', True)
+        self.vacuum_pages_per_step = max(1, settings.get('vacuum_pages_per_step', 1000))
+        self.schedule_hours = settings.get('schedule_hours', 0)
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._run_lock = threading.Lock()
+        self._scheduler: Optional[threading.Thread] = None
+
+    @property
+    def available(self) -> bool:
+        return self.archive_path is not None
+
+    # -- archive attachment ------------------------------------------------
+
+    def attach(self, connection: Connection) -> bool:
+        """Attach the archive database to `connection` (once per pooled connection), creating its table"""
+        if not self.available:
+            return False
+        attached = {row[1] for row in connection.exec_driver_sql("PRAGMA database_list")}
+        if "archive" not in attached:
+            connection.exec_driver_sql("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            for statement in _ARCHIVE_SCHEMA:
+                connection.exec_driver_sql(statement)
+        return True
+
+    def query_rows(self, connection: Connection, include_archived: bool, skip: int = None,
+                   limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Attendance rows newest first, joined with their student, optionally including archived rows
+        (id null, archive_id set; live rows first among equal timestamps)
+        """
+        sql = _LIVE_ROWS
+        if include_archived and os.path.exists(self.archive_path or "") and self.attach(connection):
+            sql = f"SELECT {_ROW_COLUMNS} FROM ({_LIVE_ROWS} UNION ALL {_ARCHIVED_ROWS})"
+        sql += " ORDER BY timestamp DESC, archived, id DESC, archive_id DESC"
+        params = {}
+        if limit is not None:
+            sql += " LIMIT :limit OFFSET :skip"
+            params = {"limit": limit, "skip": skip or 0}
+        rows = connection.execute(text(sql), params).mappings().all()
+        return [dict(row) for row in rows]
+
+    # -- retention job -----------------------------------------------------
+
+    def run(self, horizon_days: float = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Archive rows older than the horizon, then compact the live database"""
+        if not self.available:
+            raise RuntimeError("Attendance retention needs a SQLite database")
+        horizon_days = self.horizon_days if horizon_days is None else horizon_days
+        cutoff = datetime.now() - timedelta(days=horizon_days)
+        # Stored the way SQLAlchemy writes DateTime to SQLite, so the comparison is textual
+        cutoff_value = cutoff.strftime("%Y-%m-%d %H:%M:%S.%f")
+        with self._run_lock:
+            started = time.perf_counter()
+            report = {"started_at": datetime.now().isoformat(timespec="seconds"), "cutoff": cutoff.isoformat(timespec="seconds"),
+                      "horizon_days": horizon_days, "dry_run": dry_run, "archived": 0, "batches": 0}
+            with engine.connect() as connection:
+                connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_attendance_timestamp ON attendance (timestamp)")
+                connection.commit()
+                if dry_run:
+                    report["would_archive"] = connection.execute(
+                        text("SELECT COUNT(*) FROM attendance WHERE timestamp < :cutoff"), {"cutoff": cutoff_value}).scalar()
+                else:
+                    self.attach(connection)
+                    connection.commit()
+                    while True:
+                        moved = self._move_batch(connection, cutoff_value)
+                        if not moved:
+                            break
+                        report["archived"] += moved
+                        report["batches"] += 1
+                    metrics.inc("attendance_archived_total", report["archived"])
+                    report["vacuum"] = self.compact(connection)
+            report["seconds"] = round(time.perf_counter() - started, 3)
+            report.update(self.status())
+            if not dry_run:
+                self.last_run = report
+            return report
+
+    def _move_batch(self, connection: Connection, cutoff_value: str) -> int:
+        """Copy one batch of old rows into the archive and delete them, in one transaction"""
+        ids = [row[0] for row in connection.execute(
+            text("SELECT id FROM attendance WHERE timestamp < :cutoff ORDER BY timestamp LIMIT :limit"),
+            {"cutoff": cutoff_value, "limit": self.batch_size})]
+        if not ids:
+            return 0
+        placeholders = ",".join(str(int(i)) for i in ids)
+        connection.exec_driver_sql(f"""
+            INSERT INTO archive.attendance_archive
+                (source_id, student_id, student_name, roll_number, timestamp, camera_id, archived_at)
+            SELECT a.id, a.student_id, s.name, s.roll_number, a.timestamp, a.camera_id, ?
+            FROM attendance a LEFT JOIN students s ON s.id = a.student_id
+            WHERE a.id IN ({placeholders})
+        """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),))
+        connection.exec_driver_sql(f"DELETE FROM attendance WHERE id IN ({placeholders})")
+        connection.commit()
+        return len(ids)
+
+    def compact(self, connection: Connection) -> Dict[str, Any]:
+        """Return free pages of the live database to the OS, vacuum_pages_per_step at a time"""
+        if not self.incremental_vacuum:
+            return {"mode": "off"}
+        mode = connection.exec_driver_sql("PRAGMA main.auto_vacuum").scalar()
+        if mode != 2:  # 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+            # One-time switch; the new mode only takes effect after a full VACUUM
+            connection.exec_driver_sql("PRAGMA main.auto_vacuum = INCREMENTAL")
+            connection.commit()
+            start = time.perf_counter()
+            connection.exec_driver_sql("VACUUM main")
+            return {"mode": "incremental", "converted": True, "full_vacuum_seconds": round(time.perf_counter() - start, 3)}
+        freed = 0
+        while True:
+            free = connection.exec_driver_sql("PRAGMA main.freelist_count").scalar()
+            if not free:
+                break
+            step = min(free, self.vacuum_pages_per_step)
+            connection.exec_driver_sql(f"PRAGMA main.incremental_vacuum({step})")
+            connection.commit()
+            freed += step
+            time.sleep(0)  # let other connections in between steps
+        return {"mode": "incremental", "pages_freed": freed}
+
+    def status(self) -> Dict[str, Any]:
+        if not self.available:
+            return {"available": False}
+        with engine.connect() as connection:
+            live = connection.exec_driver_sql("SELECT COUNT(*) FROM attendance").scalar()
+            page_size = connection.exec_driver_sql("PRAGMA main.page_size").scalar()
+            free_pages = connection.exec_driver_sql("PRAGMA main.freelist_count").scalar()
+            archived = None
+            if os.path.exists(self.archive_path):
+                self.attach(connection)
+                archived = connection.exec_driver_sql("SELECT COUNT(*) FROM archive.attendance_archive").scalar()
+        return {
+            "live_rows": live,
+            "archived_rows": archived,
+            "live_db_bytes": os.path.getsize(engine.url.database) if os.path.exists(engine.url.database) else None,
+            "archive_db_bytes": os.path.getsize(self.archive_path) if os.path.exists(self.archive_path) else None,
+            "free_bytes": free_pages * page_size,
+            "archive_path": self.archive_path,
+        }
+
+    # -- schedule ----------------------------------------------------------
+
+    def start_schedule(self) -> bool:
+        """Run the job every schedule_hours in a daemon thread (off when schedule_hours is 0)"""
+        if not self.schedule_hours or not self.available or self._scheduler is not None:
+            return False
+
+        def loop():
+            while True:
+                time.sleep(self.schedule_hours * 3600)
+                try:
+                    report = self.run()
+                    print(f"✓ Attendance retention: archived {report['archived']} rows older than {report['cutoff']}")
+                except Exception as e:
+                    print(f"[!] Attendance retention failed: {e}")
+
+        self._scheduler = threading.Thread(target=loop, name="attendance-retention", daemon=True)
+        self._scheduler.start()
+        return True
+
+
+attendance_retention = AttendanceRetention(config.get_section('retention'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old attendance rows and compact the database")
+    parser.add_argument("--horizon-days", type=float, default=attendance_retention.horizon_days)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be archived")
+    args = parser.parse_args(argv)
+
+    from backend.app.services.database import create_db_and_tables
+    create_db_and_tables()
+    report = attendance_retention.run(horizon_days=args.horizon_days, dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"{report['would_archive']} attendance rows are older than {report['cutoff']}")
+    else:
+        print(f"✓ Archived {report['archived']} rows older than {report['cutoff']} in {report['batches']} batch(es), "
+              f"{report['seconds']}s; vacuum: {report['vacuum']}")
+    print(f"  live rows {report['live_rows']}, archived rows {report['archived_rows']}, "
+          f"live db {report['live_db_bytes']} bytes, archive db {report['archive_db_bytes']} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
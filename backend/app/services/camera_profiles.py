@@ -0,0 +1,158 @@
+"""
+Per-camera detection profile: region of interest, minimum face size and face limit.
+The ROI is given in normalized coordinates (0..1) of the processed frame, either as a rectangle
+or as a polygon. Only the ROI's bounding box is passed to the detector, with the area outside a
+polygon blacked out, so corridors and ceilings around a doorway cost no detection time.
+Faces smaller than min_face_size (pixels, in the processed frame) are dropped before the
+recognition model runs.
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+import cv2
+import numpy as np
+from backend.app.config import config
+
+
+def _normalize_roi(roi) -> Optional[Dict[str, Any]]:
+    """Validate an ROI dict and return it in canonical form; raises ValueError"""
+    if roi is None:
+        return None
+    kind = roi.get("type", "polygon" if "points" in roi else "rect")
+    if kind == "rect":
+        try:
+            x, y, w, h = (float(roi[k]) for k in ("x", "y", "w", "h"))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("rect ROI needs numeric x, y, w, h")
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > 1.0001 or y + h > 1.0001:
+            raise ValueError("rect ROI must lie within the frame (normalized 0..1 coordinates)")
+        return {"type": "rect", "x": x, "y": y, "w": w, "h": h}
+    if kind == "polygon":
+        points = roi.get("points") or []
+        if len(points) < 3:
+            raise ValueError("polygon ROI needs at least 3 points")
+        try:
+            points = [[float(px), float(py)] for px, py in points]
+        except (TypeError, ValueError):
+            raise ValueError("polygon ROI points must be [x, y] pairs")
+        if any(not (0 <= v <= 1) for point in points for v in point):
+            raise ValueError("polygon ROI points must be normalized 0..1 coordinates")
+        return {"type": "polygon", "points": points}
+    raise ValueError(f"Unknown ROI type '{kind}' (use 'rect' or 'polygon')")
+
+
+class CameraProfile:
+    def __init__(self, roi=None, min_face_size: int = 0, max_faces: int = 10):
+        self.roi = _normalize_roi(roi)
+        self.min_face_size = max(0, int(min_face_size or 0))
+        self.max_faces = max(0, int(max_faces or 0))
+        # Polygon masks are rasterized once per frame size
+        self._mask_cache: Dict[Tuple[int, int], Tuple[Tuple[int, int, int, int], Optional[np.ndarray]]] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"roi": self.roi, "min_face_size": self.min_face_size, "max_faces": self.max_faces}
+
+    def _region(self, height: int, width: int):
+        """Pixel bounding box (x1, y1, x2, y2) of the ROI and, for polygons, the mask for that box"""
+        key = (height, width)
+        cached = self._mask_cache.get(key)
+        if cached is not None:
+            return cached
+        if self.roi["type"] == "rect":
+            x1 = int(round(self.roi["x"] * width))
+            y1 = int(round(self.roi["y"] * height))
+            x2 = int(round((self.roi["x"] + self.roi["w"]) * width))
+            y2 = int(round((self.roi["y"] + self.roi["h"]) * height))
+            mask = None
+        else:
+            points = np.array([[px * width, py * height] for px, py in self.roi["points"]], dtype=np.float32)
+            x1, y1 = np.floor(points.min(axis=0)).astype(int)
+            x2, y2 = np.ceil(points.max(axis=0)).astype(int)
+            mask = np.zeros((max(1, y2 - y1), max(1, x2 - x1)), dtype=np.uint8)
+            cv2.fillPoly(mask, [np.round(points - [x1, y1]).astype(np.int32)], 255)
+        x1, y1 = max(0, min(x1, width - 1)), max(0, min(y1, height - 1))
+        x2, y2 = max(x1 + 1, min(x2, width)), max(y1 + 1, min(y2, height))
+        if mask is not None:
+            mask = mask[:y2 - y1, :x2 - x1]
+        cached = ((int(x1), int(y1), int(x2), int(y2)), mask)
+        self._mask_cache[key] = cached
+        return cached
+
+    def crop(self, image: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Return (detector_input, (offset_x, offset_y)): the ROI bounding box of `image`, with
+        pixels outside a polygon ROI zeroed. Without an ROI the image is returned unchanged.
+        """
+        if self.roi is None:
+            return image, (0, 0)
+        h, w = image.shape[:2]
+        (x1, y1, x2, y2), mask = self._region(h, w)
+        region = image[y1:y2, x1:x2]
+        if mask is not None:
+            if mask.shape != region.shape[:2]:
+                mask = mask[:region.shape[0], :region.shape[1]]
+            region = cv2.bitwise_and(region, region, mask=mask)
+        return region, (x1, y1)
+
+    def roi_polygon(self, height: int, width: int) -> Optional[np.ndarray]:
+        """ROI outline in pixel coordinates, for drawing"""
+        if self.roi is None:
+            return None
+        if self.roi["type"] == "rect":
+            x1, y1 = self.roi["x"] * width, self.roi["y"] * height
+            x2, y2 = x1 + self.roi["w"] * width, y1 + self.roi["h"] * height
+            points = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+        else:
+            points = [[px * width, py * height] for px, py in self.roi["points"]]
+        return np.round(np.array(points)).astype(np.int32)
+
+
+class CameraProfileRegistry:
+    """Profiles by camera id (stored as str, like the telemetry registry); unknown cameras get the defaults"""
+    def __init__(self, defaults: Dict[str, Any] = None, profiles: Dict[Any, Dict[str, Any]] = None):
+        self.defaults = dict(defaults or {})
+        self._profiles: Dict[str, CameraProfile] = {}
+        self._default_profile = CameraProfile(**self.defaults)
+        self._lock = threading.Lock()
+        for camera_id, profile in (profiles or {}).items():
+            self.set(camera_id, profile)
+
+    def get(self, camera_id) -> CameraProfile:
+        return self._profiles.get(str(camera_id), self._default_profile)
+
+    def has(self, camera_id) -> bool:
+        return str(camera_id) in self._profiles
+
+    def build(self, data: Dict[str, Any]) -> CameraProfile:
+        """Profile from `data` with omitted fields taken from the defaults. Raises ValueError"""
+        values = {**self.defaults, **{k: v for k, v in (data or {}).items() if k in ("roi", "min_face_size", "max_faces")}}
+        return CameraProfile(**values)
+
+    def set(self, camera_id, data: Dict[str, Any]) -> CameraProfile:
+        """Create or replace a camera's profile. Raises ValueError"""
+        profile = data if isinstance(data, CameraProfile) else self.build(data)
+        with self._lock:
+            self._profiles[str(camera_id)] = profile
+        return profile
+
+    def remove(self, camera_id):
+        with self._lock:
+            self._profiles.pop(str(camera_id), None)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        return {camera_id: profile.to_dict() for camera_id, profile in list(self._profiles.items())}
+
+
+def face_size(face) -> float:
+    """Shorter side of a face bounding box in pixels"""
+    x1, y1, x2, y2 = face.bbox[:4]
+    return float(min(x2 - x1, y2 - y1))
+
+
+camera_profiles = CameraProfileRegistry(
+    defaults={
+        "roi": None,
+        "min_face_size": config.get('face_recognition.detection.min_face_size', 0),
+        "max_faces": config.get('face_recognition.detection.max_faces', 10),
+    },
+    profiles=config.get('cameras.profiles', None) or {},
+)
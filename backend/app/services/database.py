@@ -1,9 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, String, LargeBinary, DateTime, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, LargeBinary, DateTime, Time, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred
 from datetime import datetime
 import numpy as np
 import os
+from backend.app.config import config
+from backend.app.services import embedding_codec
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
 
@@ -19,26 +21,45 @@ class Student(Base):
     roll_number = Column(String, unique=True, index=True)
     email = Column(String)
     photo_path = Column(String)
-    embedding = Column(LargeBinary) # Store numpy array as bytes
+    section = Column(String, index=True)  # Class section; cameras are scheduled per section
+    # Store numpy array as bytes (float32, or float16/int8, see embedding_codec). Deferred: loading a
+    # Student for a listing or lookup does not read the blob; the gallery loader undefers it
+    embedding = deferred(Column(LargeBinary))
 
     attendances = relationship("Attendance", back_populates="student")
 
     def get_embedding(self):
-        return np.frombuffer(self.embedding, dtype=np.float32) if self.embedding else None
+        return embedding_codec.decode(self.embedding)
 
-    def set_embedding(self, embedding_array):
-        self.embedding = embedding_array.astype(np.float32).tobytes()
+    def set_embedding(self, embedding_array, storage: str = None):
+        storage = storage or config.get('face_recognition.recognition.embedding_storage', 'float32')
+        self.embedding = embedding_codec.encode(np.asarray(embedding_array), storage)
+
+# Case-insensitive prefix search (name LIKE 'ab%') can only use an index with NOCASE collation
+Index("ix_students_name_nocase", Student.name.collate("NOCASE"))
+Index("ix_students_roll_number_nocase", Student.roll_number.collate("NOCASE"))
 
 class Attendance(Base):
     __tablename__ = "attendance"
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"))
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     camera_id = Column(String)
 
     student = relationship("Student", back_populates="attendances")
 
+class CameraSchedule(Base):
+    """A camera expects students of `section` between start_time and end_time (on day_of_week, or daily)"""
+    __tablename__ = "camera_schedules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    camera_id = Column(String, index=True)
+    section = Column(String)
+    day_of_week = Column(Integer, nullable=True)  # 0 = Monday ... 6 = Sunday; NULL = every day
+    start_time = Column(Time)
+    end_time = Column(Time)
+
 def create_db_and_tables():
     Base.metadata.create_all(bind=engine)
 
@@ -0,0 +1,194 @@
+"""
+Compact face embedding storage and the in-memory matching matrix.
+
+Blobs in students.embedding are either legacy raw float32 (no header, 4 * dim bytes) or a
+5-byte header (MAGIC + format byte) followed by float16 values, or by a float32 scale and
+per-vector scaled int8 values. The header makes compact blobs an odd number of bytes, so
+they can never be mistaken for a float32 blob and old rows stay readable.
+
+GalleryMatrix holds the L2-normalized gallery in float32, float16 or int8 (one scale per
+row). Compact matrices are matched in their own precision by small onnxruntime graphs
+(float16 Gemm, uint8 x int8 MatMulInteger into int32) and only fall back to expanding
+chunks to float32 when onnx/onnxruntime are not importable.
+"""
+import struct
+import threading
+from typing import Optional
+import numpy as np
+
+MAGIC = b"\x93EMB"
+FORMATS = {"float16": 1, "int8": 2}
+_FORMAT_NAMES = {code: name for name, code in FORMATS.items()}
+_HEADER = len(MAGIC) + 1
+
+
+def encode(embedding: np.ndarray, storage: str = "float32") -> bytes:
+    """Serialize an embedding for the students.embedding column"""
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    if storage == "float32":
+        return vector.tobytes()
+    if storage == "float16":
+        return MAGIC + bytes([FORMATS["float16"]]) + vector.astype(np.float16).tobytes()
+    if storage == "int8":
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        quantized = np.clip(np.round(vector / scale), -127, 127).astype(np.int8)
+        return MAGIC + bytes([FORMATS["int8"]]) + struct.pack("<f", scale) + quantized.tobytes()
+    raise ValueError(f"Unknown embedding storage '{storage}' (use float32, float16 or int8)")
+
+
+def storage_format(blob: bytes) -> str:
+    if len(blob) % 2 == 1 and blob[:len(MAGIC)] == MAGIC:
+        return _FORMAT_NAMES.get(blob[len(MAGIC)], "unknown")
+    return "float32"
+
+
+def decode(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """Embedding as float32 from any stored format (legacy float32 blobs are returned zero-copy)"""
+    if not blob:
+        return None
+    storage = storage_format(blob)
+    if storage == "float32":
+        return np.frombuffer(blob, dtype=np.float32)
+    if storage == "float16":
+        return np.frombuffer(blob, dtype=np.float16, offset=_HEADER).astype(np.float32)
+    if storage == "int8":
+        scale = struct.unpack("<f", blob[_HEADER:_HEADER + 4])[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=_HEADER + 4).astype(np.float32) * scale
+    raise ValueError(f"Unknown embedding blob format byte {blob[len(MAGIC)]}")
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(precision: str, dim: int):
+    """onnxruntime session scoring queries against a compact gallery, or None without onnx/onnxruntime"""
+    try:
+        import onnx
+        import onnxruntime as ort
+    except ImportError:
+        return None
+    from onnx import helper, TensorProto
+    if precision == "float16":
+        # scores = queries @ gallery.T straight from the row-major float16 matrix
+        nodes = [helper.make_node("Gemm", ["queries", "gallery"], ["scores"], transB=1)]
+        inputs = [helper.make_tensor_value_info("queries", TensorProto.FLOAT16, ["q", dim]),
+                  helper.make_tensor_value_info("gallery", TensorProto.FLOAT16, ["n", dim])]
+        output = helper.make_tensor_value_info("scores", TensorProto.FLOAT16, ["q", "n"])
+        initializers = []
+    else:
+        # uint8 queries with zero point 128 (= int8 values) x transposed int8 gallery, int32 accumulation;
+        # the u8 x s8 form is the one onnxruntime has fast CPU kernels for
+        nodes = [helper.make_node("MatMulInteger", ["queries", "gallery", "query_zero_point"], ["scores"])]
+        inputs = [helper.make_tensor_value_info("queries", TensorProto.UINT8, ["q", dim]),
+                  helper.make_tensor_value_info("gallery", TensorProto.INT8, [dim, "n"])]
+        output = helper.make_tensor_value_info("scores", TensorProto.INT32, ["q", "n"])
+        initializers = [helper.make_tensor("query_zero_point", TensorProto.UINT8, [], [128])]
+    graph = helper.make_graph(nodes, f"gallery_{precision}", inputs, [output], initializer=initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    try:
+        return ort.InferenceSession(model.SerializeToString(), providers=["CPUExecutionProvider"])
+    except Exception as e:
+        print(f"[!] Native {precision} gallery matching unavailable, expanding chunks to float32: {e}")
+        return None
+
+
+def _session(precision: str, dim: int):
+    with _sessions_lock:
+        key = (precision, dim)
+        if key not in _sessions:
+            _sessions[key] = _build_session(precision, dim)
+        return _sessions[key]
+
+
+class GalleryMatrix:
+    """
+    Row-normalized gallery matrix at float32, float16 or int8 precision.
+    int8 data is stored transposed (dim x rows, C-contiguous) as MatMulInteger wants it; a row is
+    the same symmetric per-vector quantization as an int8 blob, so rows() decodes it like one.
+    """
+    def __init__(self, data: np.ndarray, scales: np.ndarray = None, precision: str = "float32", chunk_rows: int = 8192):
+        self.data = data
+        self.scales = scales
+        self.precision = precision
+        self.chunk_rows = max(1, chunk_rows)
+
+    @classmethod
+    def build(cls, normalized: np.ndarray, precision: str = "float32", chunk_rows: int = 8192) -> "GalleryMatrix":
+        if precision == "float32":
+            return cls(np.ascontiguousarray(normalized, dtype=np.float32), None, precision, chunk_rows)
+        if precision == "float16":
+            return cls(normalized.astype(np.float16), None, precision, chunk_rows)
+        if precision == "int8":
+            peaks = np.abs(normalized).max(axis=1) if len(normalized) else np.empty(0, dtype=np.float32)
+            scales = np.where(peaks == 0, 1.0, peaks / 127.0).astype(np.float32)
+            data = np.clip(np.round(normalized / scales[:, None]), -127, 127).astype(np.int8)
+            return cls(np.ascontiguousarray(data.T), scales, precision, chunk_rows)
+        raise ValueError(f"Unknown gallery precision '{precision}' (use float32, float16 or int8)")
+
+    def __len__(self):
+        return self.data.shape[1] if self.precision == "int8" else len(self.data)
+
+    @property
+    def dim(self) -> int:
+        return self.data.shape[0] if self.precision == "int8" else self.data.shape[1]
+
+    def row_view(self, index: int) -> np.ndarray:
+        """
+        Zero-copy view of one stored row. int8 rows lack their scale, which only changes the
+        length, not the direction, so the view still works for cosine matching.
+        """
+        return self.data[:, index] if self.precision == "int8" else self.data[index]
+
+    def rows(self, indices: np.ndarray) -> np.ndarray:
+        """Stored rows decoded to float32 (shape indices.shape + (dim,)), e.g. to re-score candidates"""
+        indices = np.asarray(indices)
+        if self.precision == "int8":
+            flat = self.data[:, indices.ravel()].T.astype(np.float32) * self.scales[indices.ravel(), None]
+            return flat.reshape(indices.shape + (self.dim,))
+        return self.data[indices].astype(np.float32)
+
+    @property
+    def exact(self) -> bool:
+        return self.precision == "float32"
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def take(self, indices) -> "GalleryMatrix":
+        if self.precision != "int8":
+            return GalleryMatrix(self.data[indices], None, self.precision, self.chunk_rows)
+        return GalleryMatrix(np.ascontiguousarray(self.data[:, indices]), self.scales[indices], self.precision,
+                             self.chunk_rows)
+
+    def similarities(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarities (queries x rows) of normalized float32 queries"""
+        if self.exact:
+            return queries @ self.data.T
+        session = _session(self.precision, self.dim) if len(self) else None
+        if session is None:
+            return self._expanded_similarities(queries)
+        if self.precision == "float16":
+            scores = session.run(None, {"queries": queries.astype(np.float16), "gallery": self.data})[0]
+            return scores.astype(np.float32)
+        # Per-query symmetric int8 quantization, shifted to uint8 around the graph's zero point
+        peaks = np.abs(queries).max(axis=1)
+        query_scales = np.where(peaks == 0, 1.0, peaks / 127.0).astype(np.float32)
+        quantized = np.clip(np.round(queries / query_scales[:, None]), -127, 127).astype(np.int16) + 128
+        dots = session.run(None, {"queries": quantized.astype(np.uint8), "gallery": self.data})[0]
+        return dots.astype(np.float32) * query_scales[:, None] * self.scales
+
+    def _expanded_similarities(self, queries: np.ndarray) -> np.ndarray:
+        result = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), self.chunk_rows):
+            stop = start + self.chunk_rows
+            if self.precision == "int8":
+                block = queries @ self.data[:, start:stop].astype(np.float32)
+                block *= self.scales[start:stop]
+            else:
+                block = queries @ self.data[start:stop].astype(np.float32).T
+            result[:, start:stop] = block
+        return result
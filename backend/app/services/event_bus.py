@@ -0,0 +1,144 @@
+"""
+In-process pub/sub for the attendance event stream (GET /api/v1/attendance/stream).
+Each event is formatted as a server-sent event once, when it is published, and the same
+string is handed to every subscriber, so a viewer costs a queue slot rather than a query.
+Subscriber queues are bounded: a viewer that cannot keep up loses its oldest events and is
+told how many it missed. The last replay_size events are kept so a reconnecting EventSource
+(Last-Event-ID) resumes where it left off instead of re-fetching the attendance list.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from backend.app.config import config
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, camera_id: Optional[str], event_types: Optional[frozenset],
+                 buffer_size: int):
+        self.loop = loop
+        self.camera_id = camera_id
+        self.event_types = event_types
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def wants(self, event_type: str, camera_id: Optional[str]) -> bool:
+        if self.camera_id is not None and camera_id != self.camera_id:
+            return False
+        return self.event_types is None or event_type in self.event_types
+
+    def offer(self, message: str):
+        """Called on the subscriber's loop; drops the oldest queued event when the buffer is full"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = 256, replay_size: int = 1000, heartbeat_seconds: float = 15):
+        self.buffer_size = max(1, buffer_size)
+        self.heartbeat_seconds = heartbeat_seconds
+        # Event ids are "<epoch>-<seq>"; a Last-Event-ID from before a restart is recognized as stale
+        self.epoch = format(int(time.time()), "x")
+        self._seq = 0
+        self._replay: "deque[Tuple[int, str, Optional[str], str]]" = deque(maxlen=max(0, replay_size))
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    @staticmethod
+    def format(event_id: Optional[str], event_type: str, data: Dict[str, Any]) -> str:
+        lines = [f"id: {event_id}"] if event_id is not None else []
+        lines.append(f"event: {event_type}")
+        lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+        return "\n".join(lines) + "\n\n"
+
+    def publish(self, event_type: str, data: Dict[str, Any], camera_id=None) -> str:
+        """Record an event and push it to matching subscribers; safe to call from any thread"""
+        camera_key = str(camera_id) if camera_id is not None else None
+        with self._lock:
+            self._seq += 1
+            event_id = f"{self.epoch}-{self._seq}"
+            message = self.format(event_id, event_type, data)
+            self._replay.append((self._seq, event_type, camera_key, message))
+            subscribers = [s for s in self._subscribers if s.wants(event_type, camera_key)]
+            self.published += 1
+        for subscription in subscribers:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is subscription.loop:
+                subscription.offer(message)
+            else:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.offer, message)
+                except RuntimeError:
+                    pass  # loop closed: the subscriber is going away
+        return event_id
+
+    def subscribe(self, camera_id=None, event_types: Iterable[str] = None,
+                  last_event_id: str = None) -> Tuple[Subscription, List[str], bool]:
+        """
+        Register a subscriber on the running loop. Returns (subscription, replayed messages, reset);
+        reset is True when last_event_id can no longer be resumed (restart or fell out of the
+        replay buffer) and the client should re-fetch the attendance list.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), str(camera_id) if camera_id is not None else None,
+                                    frozenset(event_types) if event_types else None, self.buffer_size)
+        replay, reset = [], False
+        with self._lock:
+            if last_event_id:
+                epoch, _, seq = last_event_id.partition("-")
+                after = int(seq) if epoch == self.epoch and seq.isdigit() else None
+                oldest = self._replay[0][0] if self._replay else self._seq + 1
+                if after is None or after > self._seq or after + 1 < oldest:
+                    reset = True
+                else:
+                    replay = [message for seq_no, event_type, camera_key, message in self._replay
+                              if seq_no > after and subscription.wants(event_type, camera_key)]
+            self._subscribers.append(subscription)
+        return subscription, replay, reset
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+            self.dropped += subscription.dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "last_event_id": f"{self.epoch}-{self._seq}" if self._seq else None,
+                "replay_buffered": len(self._replay),
+                "dropped": self.dropped + sum(s.dropped for s in self._subscribers),
+                "buffer_size": self.buffer_size,
+            }
+
+
+def attendance_event(attendance, student=None, source: str = None, student_name: str = None,
+                     roll_number: str = None) -> Dict[str, Any]:
+    """Event payload for a committed Attendance row, in the shape of GET /attendance/ rows"""
+    return {
+        "id": attendance.id,
+        "student_id": attendance.student_id,
+        "student_name": student.name if student else student_name,
+        "roll_number": student.roll_number if student else roll_number,
+        "timestamp": attendance.timestamp.isoformat(),
+        "camera_id": attendance.camera_id or "N/A",
+        "status": "present",
+        "source": source,
+    }
+
+
+event_bus = EventBus(
+    buffer_size=config.get('events.subscriber_buffer', 256),
+    replay_size=config.get('events.replay_size', 1000),
+    heartbeat_seconds=config.get('events.heartbeat_seconds', 15),
+)
@@ -0,0 +1,482 @@
+"""
+Multi-process camera ingestion.
+Each capture process decodes one or more cameras and publishes frames into per-camera
+multiprocessing.shared_memory ring buffers, so capture never competes for the API process GIL.
+Consumers in the API process read the newest frame as a zero-copy numpy view.
+This module must stay free of config/FastAPI imports: it is imported by the spawned capture processes.
+"""
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from backend.app.services.telemetry import DEFAULT_BUCKETS_MS, Histogram, CameraTelemetry, ewma_rate
+
+# Header fields (int64 each)
+H_LATEST_SEQ = 0
+H_LATEST_SLOT = 1
+H_DEMAND_MS = 2         # Last time a consumer asked for a frame (written by consumers)
+H_HEARTBEAT_MS = 3      # Last capture loop iteration (written by the capture process)
+H_SOURCE_OK = 4
+H_GRAB_FPS_X100 = 5
+H_DECODE_FPS_X100 = 6
+H_DECODE_US_SUM = 7
+H_LAST_GRAB_MS = 8
+COUNTER_FIELDS = ["frames_grabbed", "frames_decoded", "frames_skipped", "grab_failures", "decode_failures", "reconnects"]
+H_COUNTERS = 9
+H_BUCKETS = H_COUNTERS + len(COUNTER_FIELDS)
+HEADER_FIELDS = H_BUCKETS + len(DEFAULT_BUCKETS_MS) + 1
+
+# How long a removed camera's ring stays mapped for consumers still holding one of its frames
+RING_UNMAP_GRACE_SECONDS = 10.0
+
+# Slot metadata fields (int64 each)
+M_SEQ, M_HEIGHT, M_WIDTH, M_CHANNELS, M_TIME_MS = range(5)
+META_FIELDS = 5
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class SourcePacer:
+    """
+    grab() on a video file returns immediately instead of waiting for the next frame, so a reader
+    loop would spin through the file at full CPU. File sources are paced at their native frame rate
+    (and end at EOF); cameras and network streams are paced by the source and pass through.
+    """
+    def __init__(self, src, stream, fallback_fps=15):
+        self.is_file = isinstance(src, str) and os.path.isfile(src)
+        fps = stream.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        fps = fps if fps and fps > 0 else fallback_fps
+        self.interval = 1.0 / fps if self.is_file and fps and fps > 0 else 0.0
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+class SharedFrameRing:
+    """
+    Fixed-size ring of frame slots in shared memory with a single writer.
+    The writer fills slot (seq % num_slots) and then publishes seq in the header, so a reader
+    always sees a completely written newest frame. A zero-copy view stays valid until the writer
+    laps the ring (num_slots - 1 newer frames); is_valid(seq) tells the reader whether it still holds.
+    """
+    def __init__(self, name=None, max_width=1920, max_height=1080, channels=3, num_slots=4, create=False):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.channels = channels
+        self.num_slots = num_slots
+        self.slot_bytes = max_width * max_height * channels
+        header_bytes = HEADER_FIELDS * 8
+        meta_bytes = num_slots * META_FIELDS * 8
+        size = header_bytes + meta_bytes + num_slots * self.slot_bytes
+
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            # Capture processes are spawned from the API process and share its resource tracker,
+            # so attaching here does not hand ownership of the segment to the child
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.owner = create
+
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self.meta = np.ndarray((num_slots, META_FIELDS), dtype=np.int64, buffer=self.shm.buf, offset=header_bytes)
+        self.data_offset = header_bytes + meta_bytes
+        if create:
+            self.header[:] = 0
+            self.meta[:] = 0
+
+    def spec(self):
+        """Arguments needed to attach to this ring from another process"""
+        return {"name": self.name, "max_width": self.max_width, "max_height": self.max_height,
+                "channels": self.channels, "num_slots": self.num_slots}
+
+    def _slot_view(self, slot, height, width, channels, buf=None):
+        return np.ndarray((height, width, channels), dtype=np.uint8, buffer=self.shm.buf if buf is None else buf,
+                          offset=self.data_offset + slot * self.slot_bytes)
+
+    def write(self, frame: np.ndarray):
+        """Copy a frame into the next slot and publish it. Frames larger than a slot are downscaled."""
+        height, width = frame.shape[:2]
+        if width > self.max_width or height > self.max_height:
+            scale = min(self.max_width / width, self.max_height / height)
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+
+        seq = int(self.header[H_LATEST_SEQ]) + 1
+        slot = seq % self.num_slots
+        self.meta[slot, M_SEQ] = -1  # Mark slot as being written
+        self._slot_view(slot, height, width, channels)[:] = frame.reshape(height, width, channels)
+        self.meta[slot, M_HEIGHT] = height
+        self.meta[slot, M_WIDTH] = width
+        self.meta[slot, M_CHANNELS] = channels
+        self.meta[slot, M_TIME_MS] = _now_ms()
+        self.meta[slot, M_SEQ] = seq
+        self.header[H_LATEST_SLOT] = slot
+        self.header[H_LATEST_SEQ] = seq
+        return seq
+
+    def read_latest(self, copy=False):
+        """Return (seq, frame, timestamp_ms) for the newest frame, or (0, None, None) if none yet or closed"""
+        # Local references: close() may run concurrently (camera removed), and a held view keeps
+        # the mapping alive (close() then gets BufferError) until this read is done
+        header, meta = self.header, self.meta
+        buf = self.shm.buf if header is not None else None
+        if header is None or meta is None or buf is None:
+            return 0, None, None
+        seq = int(header[H_LATEST_SEQ])
+        if seq == 0:
+            return 0, None, None
+        slot = seq % self.num_slots
+        if int(meta[slot, M_SEQ]) != seq:
+            return seq, None, None
+        height, width, channels = (int(v) for v in meta[slot, M_HEIGHT:M_CHANNELS + 1])
+        frame = self._slot_view(slot, height, width, channels, buf)
+        timestamp = int(meta[slot, M_TIME_MS])
+        if copy:
+            frame = frame.copy()
+        return seq, frame, timestamp
+
+    def is_valid(self, seq):
+        """True while the slot holding `seq` has not been overwritten"""
+        meta = self.meta
+        return meta is not None and int(meta[seq % self.num_slots, M_SEQ]) == seq
+
+    def incr(self, field, amount=1):
+        self.header[field] += amount
+
+    def close(self, unmap_after=0.0):
+        """
+        Stop handing out frames (read_latest returns no frame from now on) and release the segment.
+        numpy does not pin the mapping, so unmapping it while a consumer still uses a zero-copy frame
+        crashes the process; pass unmap_after (seconds) to keep it mapped past in-flight readers.
+        The name is unlinked right away: existing mappings stay valid without it.
+        """
+        self.header = None
+        self.meta = None
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        if unmap_after > 0:
+            timer = threading.Timer(unmap_after, self._unmap)
+            timer.daemon = True
+            timer.start()
+        else:
+            self._unmap()
+
+    def _unmap(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # A view is still exported; the mapping is released when it is collected
+
+
+def _capture_loop(spec, stop_flag: threading.Event):
+    """Capture thread inside an ingest process: grab every frame, decode on demand into the ring"""
+    ring = SharedFrameRing(**spec["ring"])
+    capture = spec["capture"]
+    counter_index = {name: H_COUNTERS + i for i, name in enumerate(COUNTER_FIELDS)}
+    histogram = Histogram()
+    decode_interval = 1.0 / capture["target_decode_fps"] if capture["target_decode_fps"] > 0 else 0.0
+    idle_ms = capture["idle_decode_seconds"] * 1000
+
+    def open_stream():
+        stream = cv2.VideoCapture(spec["src"])
+        stream.set(cv2.CAP_PROP_FRAME_WIDTH, capture["width"])
+        stream.set(cv2.CAP_PROP_FRAME_HEIGHT, capture["height"])
+        stream.set(cv2.CAP_PROP_FPS, capture["capture_fps"])
+        stream.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return stream
+
+    stream = open_stream()
+    pacer = SourcePacer(spec["src"], stream, capture["capture_fps"])
+    failures = 0
+    last_grab = None
+    last_decode = 0.0
+    grab_fps = decode_fps = 0.0
+    try:
+        while not stop_flag.is_set():
+            now_ms = _now_ms()
+            ring.header[H_HEARTBEAT_MS] = now_ms
+            pacer.wait()
+            if not stream.grab():
+                ring.header[H_SOURCE_OK] = 0
+                if pacer.is_file:
+                    break  # end of a video file: nothing more will arrive, so stop instead of reopening it
+                ring.incr(counter_index["grab_failures"])
+                failures += 1
+                if capture["reconnect_after_failures"] and failures >= capture["reconnect_after_failures"]:
+                    stream.release()
+                    stream = open_stream()
+                    failures = 0
+                    ring.incr(counter_index["reconnects"])
+                time.sleep(0.1)
+                continue
+
+            now = time.time()
+            failures = 0
+            ring.incr(counter_index["frames_grabbed"])
+            ring.header[H_LAST_GRAB_MS] = int(now * 1000)
+            if last_grab is not None and now > last_grab:
+                grab_fps = ewma_rate(grab_fps, now - last_grab)
+                ring.header[H_GRAB_FPS_X100] = int(grab_fps * 100)
+            last_grab = now
+
+            has_frame = ring.header[H_LATEST_SEQ] > 0
+            demanded = now_ms - int(ring.header[H_DEMAND_MS]) <= idle_ms
+            if has_frame and (not demanded or now - last_decode < decode_interval):
+                ring.incr(counter_index["frames_skipped"])
+                continue
+
+            decode_start = time.perf_counter()
+            decoded, frame = stream.retrieve()
+            decode_ms = (time.perf_counter() - decode_start) * 1000
+            ring.incr(H_BUCKETS + histogram.bucket_index(decode_ms))
+            ring.incr(H_DECODE_US_SUM, int(decode_ms * 1000))
+            if not decoded:
+                ring.header[H_SOURCE_OK] = 0
+                ring.incr(counter_index["decode_failures"])
+                continue
+            ring.write(frame)
+            ring.header[H_SOURCE_OK] = 1
+            ring.incr(counter_index["frames_decoded"])
+            if last_decode:
+                decode_fps = ewma_rate(decode_fps, now - last_decode)
+                ring.header[H_DECODE_FPS_X100] = int(decode_fps * 100)
+            last_decode = now
+    finally:
+        stream.release()
+        ring.close()
+
+
+def _ingest_process_main(commands, stop_event):
+    """Entry point of a capture process: runs one capture thread per assigned camera"""
+    workers = {}
+    while not stop_event.is_set():
+        try:
+            command = commands.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        action, key, spec = command
+        if action == "add":
+            stop_flag = threading.Event()
+            thread = threading.Thread(target=_capture_loop, args=(spec, stop_flag), daemon=True)
+            thread.start()
+            workers[key] = (thread, stop_flag)
+        elif action == "remove" and key in workers:
+            thread, stop_flag = workers.pop(key)
+            stop_flag.set()
+            thread.join(timeout=5)
+        elif action == "stop":
+            break
+    for thread, stop_flag in workers.values():
+        stop_flag.set()
+    for thread, stop_flag in workers.values():
+        thread.join(timeout=5)
+
+
+class IngestProcess:
+    """Handle for one capture process and the cameras assigned to it"""
+    def __init__(self, context):
+        self.commands = context.Queue()
+        self.stop_event = context.Event()
+        self.process = context.Process(target=_ingest_process_main, args=(self.commands, self.stop_event), daemon=True)
+        self.process.start()
+        self.cameras = set()
+
+    def send(self, action, key, spec=None):
+        self.commands.put((action, key, spec))
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def stop(self):
+        self.send("stop", None)
+        self.stop_event.set()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class SharedMemoryVideoStream:
+    """
+    API-process view of a camera decoded in a capture process.
+    Implements the same read()/wait_for_frame()/stats()/stop() interface as VideoStreamWidget.
+    Frames returned by read() are zero-copy views into shared memory: copy them before keeping them
+    around for longer than a few frame intervals.
+    """
+    def __init__(self, pool, camera_key, ring: SharedFrameRing, ingest_process: IngestProcess,
+                 target_decode_fps=5, telemetry: CameraTelemetry = None):
+        self.pool = pool
+        self.camera_key = camera_key
+        self.ring = ring
+        self.ingest_process = ingest_process
+        self.decode_interval = 1.0 / target_decode_fps if target_decode_fps and target_decode_fps > 0 else 0.0
+        self.telemetry = telemetry or CameraTelemetry(str(camera_key))
+        self.started = False
+
+    def start(self, timeout=5.0):
+        """Wait (up to timeout) for the capture process to publish its first frame"""
+        self.started = True
+        self._demand()
+        deadline = time.time() + timeout
+        while self.ring.header[H_LATEST_SEQ] == 0 and time.time() < deadline and self.ingest_process.is_alive():
+            time.sleep(0.05)
+        return self
+
+    def _demand(self):
+        header = self.ring.header
+        if header is not None:
+            header[H_DEMAND_MS] = _now_ms()
+
+    def _source_ok(self):
+        header = self.ring.header
+        return header is not None and bool(header[H_SOURCE_OK])
+
+    def read(self):
+        """Return (grabbed, frame) for the newest frame without waiting"""
+        grabbed, _, frame = self.read_with_seq()
+        return grabbed, frame
+
+    def read_with_seq(self):
+        """Return (grabbed, seq, frame) for the newest frame without waiting"""
+        self._demand()
+        seq, frame, _ = self.ring.read_latest()
+        return self._source_ok() and frame is not None, seq, frame
+
+    def read_fresh(self, timeout=None):
+        """
+        Like read_with_seq, but waits up to `timeout` seconds for a fresh decode if the newest frame
+        is stale (e.g. the stream was idle). Blocks: call it from a worker thread, not the event loop.
+        """
+        self._demand()
+        seq, frame, timestamp = self.ring.read_latest()
+        stale_after_ms = max(self.decode_interval, 0.1) * 1000
+        if timestamp is None or _now_ms() - timestamp > stale_after_ms:
+            if timeout is None:
+                timeout = max(2 * self.decode_interval, 0.5)
+            newer_seq, newer_frame = self.wait_for_frame(seq, timeout)
+            if newer_frame is not None:
+                seq, frame = newer_seq, newer_frame
+        return self._source_ok() and frame is not None, seq, frame
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """Poll until a frame newer than `after_seq` is published. Returns (seq, frame), frame is None on timeout"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.started:
+            self._demand()
+            seq, frame, _ = self.ring.read_latest()
+            if seq > after_seq and frame is not None:
+                return seq, frame
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(0.005)
+        header = self.ring.header
+        return (int(header[H_LATEST_SEQ]) if header is not None else after_seq), None
+
+    def stats(self):
+        """Capture state read from the shared header; counters are mirrored into the camera telemetry"""
+        header = self.ring.header
+        if header is None:
+            return {"reader_alive": False, "source_ok": False, "ingest_mode": "process"}  # camera removed
+        now_ms = _now_ms()
+        for i, name in enumerate(COUNTER_FIELDS):
+            self.telemetry.set_counter(name, int(header[H_COUNTERS + i]))
+        buckets = [int(c) for c in header[H_BUCKETS:H_BUCKETS + len(DEFAULT_BUCKETS_MS) + 1]]
+        self.telemetry.load_histogram("decode_ms", buckets, int(header[H_DECODE_US_SUM]) / 1000.0)
+
+        seq, _, timestamp = self.ring.read_latest()
+        heartbeat = int(header[H_HEARTBEAT_MS])
+        last_grab = int(header[H_LAST_GRAB_MS])
+        return {
+            "reader_alive": self.ingest_process.is_alive() and heartbeat > 0 and now_ms - heartbeat < 10000,
+            "source_ok": bool(header[H_SOURCE_OK]),
+            "frame_seq": seq,
+            "frame_age_seconds": round((now_ms - timestamp) / 1000, 3) if timestamp else None,
+            "last_grab_age_seconds": round((now_ms - last_grab) / 1000, 3) if last_grab else None,
+            "capture_fps": round(int(header[H_GRAB_FPS_X100]) / 100, 2),
+            "decode_fps": round(int(header[H_DECODE_FPS_X100]) / 100, 2),
+            "ingest_mode": "process",
+            "ingest_pid": self.ingest_process.process.pid,
+        }
+
+    def stop(self):
+        self.started = False
+        self.pool.remove_camera(self.camera_key)
+
+
+class ProcessIngestPool:
+    """Assigns cameras to capture processes, `cameras_per_process` cameras each"""
+    def __init__(self, cameras_per_process=1, max_width=1920, max_height=1080, num_slots=4):
+        # spawn, not fork: the API process runs threads (uvicorn, camera readers) that must not be forked
+        self.context = mp.get_context("spawn")
+        self.cameras_per_process = max(1, cameras_per_process)
+        self.max_width = max_width
+        self.max_height = max_height
+        self.num_slots = num_slots
+        self.processes = []
+        self.rings = {}
+        self.assignments = {}
+        self.lock = threading.Lock()
+
+    def _pick_process(self):
+        for ingest_process in self.processes:
+            if ingest_process.is_alive() and len(ingest_process.cameras) < self.cameras_per_process:
+                return ingest_process
+        ingest_process = IngestProcess(self.context)
+        self.processes.append(ingest_process)
+        return ingest_process
+
+    def add_camera(self, camera_key, src, capture, telemetry=None):
+        """Start decoding `src` in a capture process and return its SharedMemoryVideoStream"""
+        with self.lock:
+            ring = SharedFrameRing(max_width=self.max_width, max_height=self.max_height,
+                                   num_slots=self.num_slots, create=True)
+            ingest_process = self._pick_process()
+            ingest_process.cameras.add(camera_key)
+            ingest_process.send("add", camera_key, {"src": src, "ring": ring.spec(), "capture": capture})
+            self.rings[camera_key] = ring
+            self.assignments[camera_key] = ingest_process
+        return SharedMemoryVideoStream(self, camera_key, ring, ingest_process,
+                                       target_decode_fps=capture["target_decode_fps"], telemetry=telemetry)
+
+    def remove_camera(self, camera_key):
+        """Stop decoding a camera. Blocks while an idle capture process is joined: call it from a worker thread"""
+        idle_process = None
+        with self.lock:
+            ingest_process = self.assignments.pop(camera_key, None)
+            ring = self.rings.pop(camera_key, None)
+            if ingest_process is not None:
+                ingest_process.send("remove", camera_key)
+                ingest_process.cameras.discard(camera_key)
+                if not ingest_process.cameras:
+                    self.processes.remove(ingest_process)
+                    idle_process = ingest_process
+        # Joining the process (up to 5 s) outside the lock lets other cameras be added meanwhile
+        if idle_process is not None:
+            idle_process.stop()
+        if ring is not None:
+            # Readers on other threads may still be encoding or recognizing a zero-copy frame
+            ring.close(unmap_after=RING_UNMAP_GRACE_SECONDS)
+
+    def shutdown(self):
+        for camera_key in list(self.assignments.keys()):
+            self.remove_camera(camera_key)
+        for ingest_process in self.processes:
+            ingest_process.stop()
+        self.processes = []
@@ -0,0 +1,93 @@
+"""
+Result cache for recognize-frame uploads.
+A stalled camera, or a dashboard polling faster than the camera produces frames, uploads the
+same JPEG bytes repeatedly. Results are kept in a small LRU keyed by a BLAKE2b digest of the
+camera id, the sections scheduled for it and the upload bytes, so a repeat is answered without
+running the models and without recording attendance again (but is matched afresh once the
+camera's schedule moves on to another class).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from backend.app.config import config
+
+
+class FrameResultCache:
+    def __init__(self, max_entries: int = 64, ttl_seconds: float = 30):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, camera_key, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(camera_id, data: bytes, sections=None) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(camera_id).encode())
+        digest.update(b"\0")
+        digest.update("\0".join(sections or ()).encode())
+        digest.update(b"\0")
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: str, camera_id, result: Dict[str, Any]):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), str(camera_id), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, camera_id=None):
+        """Drop cached results for one camera (e.g. after its profile changed), or all of them"""
+        with self._lock:
+            if camera_id is None:
+                self._entries.clear()
+                return
+            camera_key = str(camera_id)
+            for key in [k for k, entry in self._entries.items() if entry[1] == camera_key]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+frame_result_cache = FrameResultCache(
+    max_entries=config.get('live_stream.result_cache_size', 64),
+    ttl_seconds=config.get('live_stream.result_cache_ttl_seconds', 30),
+)
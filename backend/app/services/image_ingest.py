@@ -0,0 +1,169 @@
+"""
+Decoding of uploaded frames and student photos.
+The JPEG/PNG header is parsed first, so oversized images are rejected before any pixels are
+decoded. JPEGs are then decoded directly at 1/2, 1/4 or 1/8 scale (libjpeg's DCT scaling via
+IMREAD_REDUCED_COLOR_*) whenever the reduced image is still at least as wide as the caller needs,
+which skips most of the work for 1080p/4K uploads that are resized down anyway.
+EXIF orientation is applied here rather than by OpenCV so the reduction choice sees the
+displayed width, and the behaviour does not depend on the OpenCV build.
+"""
+import struct
+from typing import Any, Dict, Optional, Tuple
+import cv2
+import numpy as np
+from backend.app.config import config
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, ...); C4/C8/CC are not frames
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_REDUCED_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+class ImageTooLarge(ValueError):
+    """Payload or pixel count above the configured limit (HTTP 413)"""
+
+
+class InvalidImage(ValueError):
+    """Bytes that cannot be decoded as an image (HTTP 400)"""
+
+
+def _jpeg_header(data: bytes) -> Tuple[Optional[Tuple[int, int]], int]:
+    """((width, height) or None, EXIF orientation) from the JPEG segments before the scan"""
+    size, orientation = None, 1
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            break
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # standalone markers
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):  # end of image / start of scan
+            break
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        segment = data[i + 4:i + 2 + length]
+        if marker in _SOF_MARKERS and len(segment) >= 5:
+            height, width = struct.unpack(">HH", segment[1:5])
+            size = (width, height)
+        elif marker == 0xE1 and segment[:6] == b"Exif\x00\x00":
+            orientation = _exif_orientation(segment[6:])
+        if size is not None and marker in _SOF_MARKERS:
+            break  # APP1 (EXIF) always precedes the frame header
+        i += 2 + length
+    return size, orientation
+
+
+def _exif_orientation(tiff: bytes) -> int:
+    """Orientation tag (0x0112) of IFD0 in a TIFF-structured EXIF block; 1 if absent"""
+    if len(tiff) < 8 or tiff[:2] not in (b"II", b"MM"):
+        return 1
+    endian = "<" if tiff[:2] == b"II" else ">"
+    offset = struct.unpack(endian + "I", tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return 1
+    count = struct.unpack(endian + "H", tiff[offset:offset + 2])[0]
+    for entry in range(count):
+        start = offset + 2 + entry * 12
+        if start + 12 > len(tiff):
+            break
+        tag, value_type = struct.unpack(endian + "HH", tiff[start:start + 4])
+        if tag == 0x0112 and value_type == 3:  # SHORT
+            value = struct.unpack(endian + "H", tiff[start + 8:start + 10])[0]
+            return value if 1 <= value <= 8 else 1
+    return 1
+
+
+def read_header(data: bytes) -> Dict[str, Any]:
+    """Format, (width, height) and EXIF orientation without decoding; size is None when unknown"""
+    if data[:2] == b"\xff\xd8":
+        size, orientation = _jpeg_header(data)
+        return {"format": "jpeg", "size": size, "orientation": orientation}
+    if data[:8] == _PNG_SIGNATURE and len(data) >= 24 and data[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", data[16:24])
+        return {"format": "png", "size": (width, height), "orientation": 1}
+    return {"format": None, "size": None, "orientation": 1}
+
+
+def apply_orientation(image: np.ndarray, orientation: int) -> np.ndarray:
+    """Rotate/flip a decoded image according to its EXIF orientation value"""
+    if orientation == 2:
+        return cv2.flip(image, 1)
+    if orientation == 3:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(image, 0)
+    if orientation == 5:
+        return cv2.transpose(image)
+    if orientation == 6:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(image), -1)
+    if orientation == 8:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+
+def reduction_for(width: int, min_width: Optional[int], allowed=(8, 4, 2)) -> int:
+    """Largest DCT scale factor that keeps the decoded width at or above min_width"""
+    if not min_width or not width:
+        return 1
+    for factor in allowed:
+        if width // factor >= min_width:
+            return factor
+    return 1
+
+
+class ImageIngest:
+    def __init__(self, max_bytes: int = 10 * 1024 * 1024, max_pixels: int = 40_000_000, reduced_decode: bool = True):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.reduced_decode = reduced_decode
+
+    def check_size(self, size: Optional[int]):
+        """Reject a payload by byte count before (or while) it is read"""
+        if self.max_bytes and size is not None and size > self.max_bytes:
+            raise ImageTooLarge(f"Image is {size} bytes; the limit is {self.max_bytes}")
+
+    async def read_upload(self, upload) -> bytes:
+        """Read a FastAPI UploadFile, refusing anything over max_bytes without reading it all"""
+        self.check_size(getattr(upload, "size", None))
+        data = await upload.read(self.max_bytes + 1 if self.max_bytes else -1)
+        self.check_size(len(data))
+        return data
+
+    def decode(self, data: bytes, min_width: int = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """
+        Decode `data` to a BGR image, EXIF orientation applied. When min_width is given, JPEGs are
+        decoded at the smallest 1/2, 1/4 or 1/8 scale that is still at least min_width wide
+        (as displayed); the caller does the final resize. Raises ImageTooLarge or InvalidImage.
+        """
+        self.check_size(len(data))
+        header = read_header(data)
+        size = header["size"]
+        if size is not None and self.max_pixels and size[0] * size[1] > self.max_pixels:
+            raise ImageTooLarge(f"Image is {size[0]}x{size[1]}; the limit is {self.max_pixels} pixels")
+
+        orientation = header["orientation"]
+        factor = 1
+        if self.reduced_decode and header["format"] == "jpeg" and size is not None:
+            # Orientations 5-8 swap axes, so the displayed width is the stored height
+            displayed_width = size[1] if orientation >= 5 else size[0]
+            factor = reduction_for(displayed_width, min_width)
+
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), _REDUCED_FLAGS[factor] | cv2.IMREAD_IGNORE_ORIENTATION)
+        if image is None:
+            raise InvalidImage("Could not decode image")
+        if size is None and self.max_pixels and image.shape[0] * image.shape[1] > self.max_pixels:
+            raise ImageTooLarge(f"Image is {image.shape[1]}x{image.shape[0]}; the limit is {self.max_pixels} pixels")
+        image = apply_orientation(image, orientation)
+        return image, {"format": header["format"], "source_size": size, "reduction": factor, "orientation": orientation}
+
+
+image_ingest = ImageIngest(
+    max_bytes=config.get('image_ingest.max_upload_bytes', 10 * 1024 * 1024),
+    max_pixels=config.get('image_ingest.max_pixels', 40_000_000),
+    reduced_decode=config.get('image_ingest.reduced_decode', True),
+)
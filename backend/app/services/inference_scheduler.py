@@ -0,0 +1,274 @@
+"""
+Fair scheduling of recognize-frame work across cameras.
+
+Each camera has one slot that holds only its newest pending frame: a frame that arrives
+while an older one from the same camera is still waiting replaces it, and the older request
+is answered with FrameSuperseded (HTTP 429). Worker threads take the next frame from the
+cameras in round-robin order, or by smooth weighted round-robin when policy is "weighted",
+skipping cameras that are already being served or have used up their max_fps budget.
+A camera that floods uploads therefore gets its fair share of the model and no backlog,
+and the work runs off the event loop. Camera ids come from clients, so beyond max_cameras the
+least recently used idle slots without configured settings are forgotten.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+from backend.app.config import config
+
+# Window for the achieved frames/second figure
+_FPS_WINDOW_SECONDS = 10.0
+
+
+class FrameSuperseded(RuntimeError):
+    """A newer frame from the same camera replaced this one before it was processed"""
+
+
+class _Job:
+    __slots__ = ("fn", "future", "loop", "submitted_at")
+
+    def __init__(self, fn: Callable[[], Any], future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.fn = fn
+        self.future = future
+        self.loop = loop
+        self.submitted_at = time.perf_counter()
+
+
+def _resolve(future: asyncio.Future, result=None, error: BaseException = None):
+    """Runs on the request's loop; the request may have been cancelled (client went away)"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class _CameraSlot:
+    def __init__(self, camera_id: str, weight: float = 1, max_fps: float = 0):
+        self.camera_id = camera_id
+        self.weight = max(0.01, float(weight))
+        self.max_fps = max(0.0, float(max_fps or 0))
+        self.pending: Optional[_Job] = None
+        self.busy = False
+        self.next_allowed = 0.0  # perf_counter time when the FPS budget allows the next frame
+        self.current_weight = 0.0  # smooth weighted round-robin state
+        self.submitted = 0
+        self.served = 0
+        self.cancelled = 0  # request went away before its turn; not counted as served
+        self.superseded = 0
+        self.last_used = time.perf_counter()
+        self.errors = 0
+        self.wait_ms_ewma: Optional[float] = None
+        self.service_ms_ewma: Optional[float] = None
+        self.finished: "deque[float]" = deque()
+
+    def eligible(self, now: float) -> bool:
+        return self.pending is not None and not self.busy and now >= self.next_allowed
+
+    def achieved_fps(self, now: float) -> float:
+        while self.finished and now - self.finished[0] > _FPS_WINDOW_SECONDS:
+            self.finished.popleft()
+        return len(self.finished) / _FPS_WINDOW_SECONDS
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "weight": self.weight,
+            "max_fps": self.max_fps or None,
+            "pending": self.pending is not None,
+            "busy": self.busy,
+            "submitted": self.submitted,
+            "served": self.served,
+            "superseded": self.superseded,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "achieved_fps": round(self.achieved_fps(now), 2),
+            "queue_wait_ms_ewma": round(self.wait_ms_ewma, 2) if self.wait_ms_ewma is not None else None,
+            "service_ms_ewma": round(self.service_ms_ewma, 2) if self.service_ms_ewma is not None else None,
+        }
+
+
+class InferenceScheduler:
+    def __init__(self, policy: str = "round_robin", workers: int = 1, default_fps: float = 0,
+                 cameras: Dict[Any, Dict[str, Any]] = None, enabled: bool = True, max_cameras: int = 256):
+        if policy not in ("round_robin", "weighted"):
+            raise ValueError(f"Unknown scheduler policy '{policy}' (use round_robin or weighted)")
+        self.enabled = enabled
+        self.policy = policy
+        self.workers = max(1, workers)
+        self.default_fps = default_fps or 0
+        self.max_cameras = max(1, int(max_cameras))
+        self._camera_settings = {str(k): dict(v or {}) for k, v in (cameras or {}).items()}
+        self._slots: Dict[str, _CameraSlot] = {}
+        self._order: List[str] = []  # round-robin order (first seen)
+        self._next_index = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def _slot(self, camera_id: str) -> _CameraSlot:
+        """Slot for camera_id, created on first use; call with self._cond held"""
+        slot = self._slots.get(camera_id)
+        if slot is None:
+            settings = self._camera_settings.get(camera_id, {})
+            slot = _CameraSlot(camera_id, settings.get('weight', 1), settings.get('max_fps', self.default_fps))
+            self._slots[camera_id] = slot
+            self._order.append(camera_id)
+            if len(self._slots) > self.max_cameras:
+                self._evict_idle(keep=camera_id)
+        slot.last_used = time.perf_counter()
+        return slot
+
+    def _evict_idle(self, keep: str):
+        """Forget the least recently used slots that are idle and have no configured settings"""
+        idle = sorted((slot for slot in self._slots.values()
+                       if slot.camera_id != keep and slot.pending is None and not slot.busy
+                       and slot.camera_id not in self._camera_settings), key=lambda slot: slot.last_used)
+        for slot in idle[:len(self._slots) - self.max_cameras]:
+            index = self._order.index(slot.camera_id)
+            if index < self._next_index:
+                self._next_index -= 1  # keep the turn on the same camera after the list shifts
+            del self._order[index]
+            del self._slots[slot.camera_id]
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._cond:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"inference-scheduler-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    async def run(self, camera_id, fn: Callable[[], Any]):
+        """
+        Run fn() on a scheduler worker as camera_id's next frame and return its result.
+        Raises FrameSuperseded if a newer frame from the same camera arrives first.
+        """
+        loop = asyncio.get_running_loop()
+        if not self.enabled:
+            return await loop.run_in_executor(None, fn)
+        job = _Job(fn, loop.create_future(), loop)
+        with self._cond:
+            slot = self._slot(str(camera_id))
+            replaced = slot.pending
+            if replaced is not None:
+                slot.superseded += 1
+            slot.pending = job
+            slot.submitted += 1
+            self._cond.notify()
+        if replaced is not None:
+            replaced.loop.call_soon_threadsafe(
+                _resolve, replaced.future, None, FrameSuperseded(f"Superseded by a newer frame from camera {camera_id}"))
+        self._ensure_workers()
+        return await job.future
+
+    def _pick(self, now: float):
+        """(slot to serve or None, seconds until a budget-limited camera becomes eligible or None)"""
+        candidates = [self._slots[camera_id] for camera_id in self._order]
+        eligible = [slot for slot in candidates if slot.eligible(now)]
+        if not eligible:
+            waits = [slot.next_allowed - now for slot in candidates
+                     if slot.pending is not None and not slot.busy and slot.next_allowed > now]
+            return None, (min(waits) if waits else None)
+        if self.policy == "weighted":
+            # Smooth weighted round-robin (as in nginx): even interleaving in proportion to weight
+            total = sum(slot.weight for slot in eligible)
+            for slot in eligible:
+                slot.current_weight += slot.weight
+            chosen = max(eligible, key=lambda slot: slot.current_weight)
+            chosen.current_weight -= total
+            return chosen, None
+        # _next_index is the position after the camera just served (up to len(self._order)); it is
+        # wrapped only here, so cameras seen since the last pick extend the cycle after that camera
+        # instead of sending the turn back to the start of the order
+        count = len(self._order)
+        start = self._next_index % count
+        for step in range(count):
+            slot = self._slots[self._order[(start + step) % count]]
+            if slot.eligible(now):
+                self._next_index = (start + step) % count + 1
+                return slot, None
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.perf_counter()
+                    slot, wait = self._pick(now)
+                    if slot is not None:
+                        break
+                    self._cond.wait(wait)
+                job, slot.pending, slot.busy = slot.pending, None, True
+                if slot.max_fps:
+                    slot.next_allowed = now + 1.0 / slot.max_fps
+            started = time.perf_counter()
+            result, error = None, None
+            cancelled = job.future.cancelled()
+            if not cancelled:
+                try:
+                    result = job.fn()
+                except Exception as e:
+                    error = e
+            finished = time.perf_counter()
+            try:
+                job.loop.call_soon_threadsafe(_resolve, job.future, result, error)
+            except RuntimeError:
+                pass  # the request's loop is gone
+            with self._cond:
+                slot.busy = False
+                if cancelled:
+                    # Nothing ran: no served frame, no achieved FPS or latency sample
+                    slot.cancelled += 1
+                    self._cond.notify_all()
+                    continue
+                slot.served += 1
+                slot.errors += error is not None
+                slot.finished.append(finished)
+                wait_ms, service_ms = (started - job.submitted_at) * 1000, (finished - started) * 1000
+                slot.wait_ms_ewma = wait_ms if slot.wait_ms_ewma is None else 0.8 * slot.wait_ms_ewma + 0.2 * wait_ms
+                slot.service_ms_ewma = service_ms if slot.service_ms_ewma is None else 0.8 * slot.service_ms_ewma + 0.2 * service_ms
+                self._cond.notify_all()
+
+    def configure(self, camera_id, weight: float = None, max_fps: float = None) -> Dict[str, Any]:
+        """Set a camera's weight and/or FPS budget (max_fps 0 = unlimited)"""
+        key = str(camera_id)
+        with self._cond:
+            settings = self._camera_settings.setdefault(key, {})
+            slot = self._slot(key)
+            if weight is not None:
+                if weight <= 0:
+                    raise ValueError("weight must be positive")
+                slot.weight = settings['weight'] = float(weight)
+            if max_fps is not None:
+                if max_fps < 0:
+                    raise ValueError("max_fps must not be negative")
+                slot.max_fps = settings['max_fps'] = float(max_fps)
+                slot.next_allowed = 0.0
+            self._cond.notify_all()
+            return slot.snapshot(time.perf_counter())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.perf_counter()
+            cameras = {camera_id: self._slots[camera_id].snapshot(now) for camera_id in self._order}
+        return {
+            "enabled": self.enabled,
+            "policy": self.policy,
+            "workers": self.workers,
+            "default_fps": self.default_fps or None,
+            "superseded": sum(camera["superseded"] for camera in cameras.values()),
+            "cameras": cameras,
+        }
+
+
+_settings = config.get_section('scheduler')
+inference_scheduler = InferenceScheduler(
+    policy=_settings.get('policy', 'round_robin'),
+    workers=_settings.get('workers', 1),
+    default_fps=_settings.get('default_fps', 0),
+    cameras=_settings.get('cameras') or {},
+    enabled=_settings.get('enabled', True),
+    max_cameras=_settings.get('max_cameras', 256),
+)
@@ -0,0 +1,371 @@
+"""
+Local inference server shared by several API worker processes.
+
+With `uvicorn --workers N` every worker would load its own buffalo_l models and student
+cache. Instead, one server process owns the models and the gallery and the workers talk to
+it over a Unix socket (multiprocessing.connection) through RemoteFaceRecognitionService, which
+has the FaceRecognitionService interface.
+
+Messages are pickled, so whoever passes the handshake can run code in the server (and the
+server in its clients). The shared secret is read from the environment variable named by
+inference_server.authkey_env, never from config.yaml, and TCP addresses must be loopback
+unless inference_server.allow_remote is set.
+
+Requests from all workers go through one inference thread. analyze requests that arrive within
+batch_wait_ms of each other are processed together: detection per frame, then one batched
+recognizer run and one gallery match for all their faces.
+
+Start it next to the API (same working directory, so it sees the same database and models):
+    export INFERENCE_SERVER_AUTHKEY=$(python -c 'import secrets; print(secrets.token_hex(32))')
+    python -m backend.app.services.inference_server
+and set inference_server.enabled: true in config.yaml.
+"""
+import argparse
+import ipaddress
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+from typing import Any, Dict, List, Optional
+import numpy as np
+from backend.app.config import config
+from backend.app.services.metrics_service import metrics
+
+
+_MIN_AUTHKEY_LENGTH = 16
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False  # any other host name may resolve off the machine
+
+
+def _address(value: str, allow_remote: bool = False):
+    """Unix socket path, or host:port for a TCP listener where AF_UNIX is unavailable"""
+    if ":" in value and not value.startswith(("/", ".")):
+        host, port = value.rsplit(":", 1)
+        if not allow_remote and not _is_loopback(host):
+            raise ValueError(f"Inference server address {value} is not a loopback address; "
+                             f"set inference_server.allow_remote: true to use it")
+        return (host, int(port)), "AF_INET"
+    return value, "AF_UNIX"
+
+
+def _authkey(settings: Dict[str, Any]) -> bytes:
+    """Shared secret from the environment variable named by inference_server.authkey_env"""
+    name = settings.get('authkey_env', 'INFERENCE_SERVER_AUTHKEY')
+    key = os.getenv(name, "")
+    if len(key) < _MIN_AUTHKEY_LENGTH:
+        raise RuntimeError(f"Set {name} to a random secret of at least {_MIN_AUTHKEY_LENGTH} characters for the "
+                           f"inference server and every API worker, e.g. "
+                           f"`python -c 'import secrets; print(secrets.token_hex(32))'`")
+    return key.encode()
+
+
+class _Request:
+    __slots__ = ("op", "args", "result", "done")
+
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+        self.result = None
+        self.done = threading.Event()
+
+
+class InferenceServer:
+    def __init__(self, service, address: str, authkey: bytes, max_batch_size: int = 8, batch_wait_ms: float = 5,
+                 gallery_refresh_seconds: float = 30, allow_remote: bool = False):
+        self.service = service
+        self.address, self.family = _address(address, allow_remote)
+        self.authkey = authkey
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.gallery_refresh_seconds = gallery_refresh_seconds
+        self._requests: "queue.Queue[_Request]" = queue.Queue()
+        self._gallery: Optional[List[Dict[str, Any]]] = None
+        self._gallery_loaded_at = 0.0
+        self._connections = 0
+        self._stats = {"requests": 0, "batches": 0, "batched_requests": 0, "max_batch": 0, "errors": 0}
+        self._stats_lock = threading.Lock()  # connection threads and the inference thread update the counters
+
+    # -- gallery -----------------------------------------------------------
+
+    def _load_gallery(self):
+        from backend.app.services.database import SessionLocal
+        from backend.app.services.training_service import TrainingService
+        db = SessionLocal()
+        try:
+            with metrics.stage("student_cache_load"):
+                self._gallery = TrainingService(self.service).load_all_student_embeddings(db)
+        finally:
+            db.close()
+        self._gallery_loaded_at = time.time()
+
+    def gallery(self) -> List[Dict[str, Any]]:
+        if self._gallery is None or time.time() - self._gallery_loaded_at > self.gallery_refresh_seconds:
+            self._load_gallery()
+        return self._gallery
+
+    # -- request handling --------------------------------------------------
+
+    def _execute(self, request: _Request):
+        service, args = self.service, request.args
+        if request.op == "info":
+            return {"device": service.device, "det_size": list(service.det_size),
+                    "similarity_threshold": service.similarity_threshold}
+        if request.op == "detect":
+            return service.detect(args["image"], max_num=args.get("max_num", 0), det_size=args.get("det_size"),
+                                  offset=args.get("offset", (0, 0)))
+        if request.op == "embed":
+            return service.embed(args["image"], args["faces"])
+        if request.op == "detect_faces":
+            return service.detect_faces(args["image"], max_num=args.get("max_num", 0), det_size=args.get("det_size"),
+                                        min_face_size=args.get("min_face_size", 0))
+        if request.op == "get_face_embedding":
+            return service.get_face_embedding(args["image"])
+        if request.op == "find_match":
+            return service.find_match(args["embedding"], self.gallery(), args.get("threshold"), sections=args.get("sections"))
+        if request.op == "reload_gallery":
+            self._load_gallery()
+            return {"students": len(self._gallery)}
+        if request.op == "stats":
+            return self.stats()
+        raise ValueError(f"Unknown operation '{request.op}'")
+
+    def _run_batch(self, batch: List[_Request]):
+        analyze = [request for request in batch if request.op == "analyze"]
+        if analyze:
+            try:
+                results = self.service.analyze_batch([request.args for request in analyze], self.gallery())
+                for request, result in zip(analyze, results):
+                    request.result = ("ok", result)
+            except Exception as e:
+                with self._stats_lock:
+                    self._stats["errors"] += len(analyze)
+                for request in analyze:
+                    request.result = ("error", f"{type(e).__name__}: {e}")
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["batched_requests"] += len(analyze)
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(analyze))
+        for request in batch:
+            if request.op != "analyze":
+                try:
+                    request.result = ("ok", self._execute(request))
+                except Exception as e:
+                    with self._stats_lock:
+                        self._stats["errors"] += 1
+                    request.result = ("error", f"{type(e).__name__}: {e}")
+        for request in batch:
+            request.done.set()
+
+    def _inference_loop(self):
+        """Single consumer of the request queue: the models are only ever used from this thread"""
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.perf_counter() + self.batch_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _serve_connection(self, conn):
+        with self._stats_lock:
+            self._connections += 1
+        try:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    break
+                request = _Request(op, args)
+                with self._stats_lock:
+                    self._stats["requests"] += 1
+                self._requests.put(request)
+                request.done.wait()
+                try:
+                    conn.send(request.result)
+                except (OSError, ValueError):
+                    break
+        finally:
+            with self._stats_lock:
+                self._connections -= 1
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            counters, connections = dict(self._stats), self._connections
+        batches = counters["batches"]
+        return {
+            **counters,
+            "mean_batch": round(counters["batched_requests"] / batches, 3) if batches else 0.0,
+            "queue_depth": self._requests.qsize(),
+            "connections": connections,
+            "gallery_size": len(self._gallery) if self._gallery is not None else None,
+            "device": self.service.device,
+        }
+
+    def serve_forever(self):
+        if self.family == "AF_UNIX" and os.path.exists(self.address):
+            os.unlink(self.address)  # stale socket from a previous run
+        listener = Listener(self.address, family=self.family, authkey=self.authkey)
+        if self.family == "AF_UNIX":
+            os.chmod(self.address, 0o600)
+        threading.Thread(target=self._inference_loop, name="inference", daemon=True).start()
+        print(f"✓ Inference server listening on {self.address} (max batch {self.max_batch_size}, wait {self.batch_wait * 1000:g} ms)")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError) as e:
+                    print(f"[!] Rejected inference client: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+
+class RemoteFaceRecognitionService:
+    """
+    FaceRecognitionService backed by an InferenceServer. The server matches against its own
+    gallery (owns_gallery), so callers pass registered_students=None to analyze_frame.
+    Connections are pooled, so the client can be shared by threads.
+    """
+    owns_gallery = True
+
+    def __init__(self, address: str, authkey: bytes, connect_timeout: float = 30, allow_remote: bool = False):
+        self.address, self.family = _address(address, allow_remote)
+        self.authkey = authkey
+        self._idle = []
+        self._lock = threading.Lock()
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                info = self._call("info")
+                break
+            except (ConnectionError, FileNotFoundError, OSError) as e:
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"Inference server at {address} is not reachable: {e}")
+                time.sleep(0.5)
+        self.device = f"remote ({info['device']})"
+        self.det_size = tuple(info["det_size"])
+        self.similarity_threshold = info["similarity_threshold"]
+        print(f"✓ Using inference server at {address} ({info['device']})")
+
+    @classmethod
+    def from_config(cls):
+        settings = config.get_section('inference_server')
+        return cls(
+            settings.get('address', '/tmp/face_attendance_inference.sock'),
+            _authkey(settings),
+            connect_timeout=settings.get('connect_timeout', 30),
+            allow_remote=settings.get('allow_remote', False),
+        )
+
+    def _call(self, op: str, **args):
+        for attempt in range(2):
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = Client(self.address, family=self.family, authkey=self.authkey)
+                conn.send((op, args))
+                status, value = conn.recv()
+            except (EOFError, ConnectionError, BrokenPipeError) as e:
+                # Server restarted: drop the connection and retry once on a fresh one
+                if conn is not None:
+                    conn.close()
+                if attempt:
+                    raise ConnectionError(f"Inference server connection lost: {e}")
+                continue
+            except BaseException:
+                # Anything else (unpicklable arguments, interrupted recv) leaves the stream mid-message
+                if conn is not None:
+                    conn.close()
+                raise
+            with self._lock:
+                self._idle.append(conn)
+            if status == "error":
+                raise RuntimeError(f"Inference server error: {value}")
+            return value
+
+    def detect(self, image: np.ndarray, max_num: int = 0, det_size=None, offset=(0, 0)) -> list:
+        with metrics.stage("inference_rpc"):
+            return self._call("detect", image=image, max_num=max_num, det_size=det_size, offset=offset)
+
+    def embed(self, image: np.ndarray, faces: list) -> list:
+        with metrics.stage("inference_rpc"):
+            return self._call("embed", image=image, faces=faces)
+
+    def detect_faces(self, image: np.ndarray, max_num: int = 0, det_size=None, min_face_size: int = 0) -> list:
+        with metrics.stage("inference_rpc"):
+            return self._call("detect_faces", image=image, max_num=max_num, det_size=det_size, min_face_size=min_face_size)
+
+    def analyze_frame(self, image: np.ndarray, registered_students=None, max_num: int = 0, det_size=None,
+                      detect_input: np.ndarray = None, offset=(0, 0), min_face_size: int = 0, sections=None):
+        """Same result as FaceRecognitionService.analyze_frame, matched against the server's gallery"""
+        with metrics.stage("inference_rpc"):
+            return self._call("analyze", image=image, detect_input=detect_input, offset=offset, max_num=max_num,
+                              det_size=det_size, min_face_size=min_face_size, sections=sections)
+
+    def get_face_embedding(self, face_image: np.ndarray) -> np.ndarray:
+        return self._call("get_face_embedding", image=face_image)
+
+    def compare_embeddings(self, embedding1: np.ndarray, embedding2: np.ndarray, threshold: float = None) -> bool:
+        from backend.app.services.recognition_service import _cosine_distance
+        if embedding1 is None or embedding2 is None:
+            return False
+        return _cosine_distance(embedding1, embedding2) < (threshold if threshold is not None else self.similarity_threshold)
+
+    def find_match(self, new_embedding: np.ndarray, registered_students=None, threshold: float = None, sections=None):
+        if new_embedding is None:
+            return "Unknown", 0.0
+        return self._call("find_match", embedding=new_embedding, threshold=threshold, sections=sections)
+
+    def reload_gallery(self) -> Dict[str, Any]:
+        return self._call("reload_gallery")
+
+    def server_stats(self) -> Dict[str, Any]:
+        return self._call("stats")
+
+
+def main(argv=None):
+    settings = config.get_section('inference_server')
+    parser = argparse.ArgumentParser(description="Shared face inference server for API workers")
+    parser.add_argument("--address", default=settings.get('address', '/tmp/face_attendance_inference.sock'))
+    parser.add_argument("--max-batch-size", type=int, default=settings.get('max_batch_size', 8))
+    parser.add_argument("--batch-wait-ms", type=float, default=settings.get('batch_wait_ms', 5))
+    args = parser.parse_args(argv)
+
+    # Check the secret and the address before spending time on the models
+    authkey = _authkey(settings)
+    allow_remote = settings.get('allow_remote', False)
+    _address(args.address, allow_remote)
+
+    from backend.app.services.database import create_db_and_tables
+    from backend.app.services.recognition_service import FaceRecognitionService
+    create_db_and_tables()
+    server = InferenceServer(
+        FaceRecognitionService(),
+        args.address,
+        authkey,
+        max_batch_size=args.max_batch_size,
+        batch_wait_ms=args.batch_wait_ms,
+        gallery_refresh_seconds=config.get('live_stream.cache_refresh_seconds', 30),
+        allow_remote=allow_remote,
+    )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
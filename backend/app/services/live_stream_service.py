@@ -1,91 +1,357 @@
 import cv2
 import threading
 import time
-from collections import deque
 import numpy as np
+from backend.app.config import get_cameras_config
+from backend.app.services.telemetry import camera_telemetry, CameraTelemetry, ewma_rate
+from backend.app.services.camera_profiles import camera_profiles
+from backend.app.services.frame_ingest_service import ProcessIngestPool, SourcePacer
 
 class VideoStreamWidget:
-    def __init__(self, src=0, width=480, height=360, queue_size=128):
-        self.stream = cv2.VideoCapture(src)
-        self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-        self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-        self.stream.set(cv2.CAP_PROP_FPS, 15)  # Limit FPS for CCTV
-        self.stream.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer lag
+    """
+    Threaded camera reader that keeps only the newest frame.
+    The reader thread grab()s every frame to keep the device buffer drained, but only
+    decodes with retrieve() while consumers are active, at most target_decode_fps times per second.
+    """
+    def __init__(self, src=0, width=480, height=360, capture_fps=15, target_decode_fps=5, idle_decode_seconds=10,
+                 reconnect_after_failures=50, telemetry: CameraTelemetry = None):
+        self.src = src
+        self.width = width
+        self.height = height
+        self.capture_fps = capture_fps
+        # _reconnect (reader thread) swaps self.stream while stop() (another thread) releases it
+        self._stream_lock = threading.Lock()
+        self.stream = self._open()
         self.grabbed, self.frame = self.stream.read()
         self.started = False
-        self.read_lock = threading.Lock()
-        self.frames_queue = deque(maxlen=queue_size)
+        self.ended = False  # a video file source reached its end
+
+        # Single-slot latest-frame buffer; seq increases by one per decoded frame
+        self.seq = 1 if self.grabbed else 0
+        self.frame_time = time.time() if self.grabbed else None
+        self.condition = threading.Condition()
+
+        self.decode_interval = 1.0 / target_decode_fps if target_decode_fps and target_decode_fps > 0 else 0.0
+        self.idle_decode_seconds = idle_decode_seconds
+        self._last_decode = 0.0
+        self._last_demand = time.time()
+
+        # Telemetry: counters/histograms live in the shared registry, rates are tracked here
+        self.telemetry = telemetry or CameraTelemetry(str(src))
+        self.reconnect_after_failures = reconnect_after_failures
+        self._consecutive_failures = 0
+        self._grab_fps = 0.0
+        self._decode_fps = 0.0
+        self._last_grab = None
+
+    def _open(self):
+        stream = cv2.VideoCapture(self.src)
+        stream.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        stream.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        stream.set(cv2.CAP_PROP_FPS, self.capture_fps)  # Limit FPS for CCTV
+        stream.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer lag
+        return stream
+
+    def _reconnect(self):
+        with self._stream_lock:
+            if not self.started:
+                return  # stop() owns the stream now; don't open a new one behind its back
+            self.stream.release()
+            self.stream = self._open()
+        self._consecutive_failures = 0
+        self.telemetry.incr("reconnects")
 
     def start(self):
         if self.started:
             print("[!] Asynchroneous video capturing has already been started.")
             return None
         self.started = True
-        self.thread = threading.Thread(target=self.update, args=())
+        self.thread = threading.Thread(target=self.update, args=(), daemon=True)
         self.thread.start()
         return self
 
+    def _wants_decode(self, now):
+        """Decode only while someone has asked for a frame recently, and no faster than the target FPS"""
+        if self.frame is None:
+            return True
+        if now - self._last_demand > self.idle_decode_seconds:
+            return False
+        return now - self._last_decode >= self.decode_interval
+
     def update(self):
+        try:
+            self._read_loop()
+        finally:
+            with self._stream_lock:
+                self.stream.release()
+
+    def _read_loop(self):
+        pacer = SourcePacer(self.src, self.stream, self.capture_fps)
         while self.started:
-            grabbed, frame = self.stream.read()
-            with self.read_lock:
-                self.grabbed = grabbed
-                if grabbed:
-                    # Add frame to queue if it's not full
-                    if len(self.frames_queue) == self.frames_queue.maxlen:
-                        self.frames_queue.popleft() # remove oldest frame
-                    self.frames_queue.append(frame)
-            time.sleep(0.01) # Small delay to prevent busy-waiting
+            # grab() blocks until the device delivers the next frame; video files are paced instead
+            pacer.wait()
+            grabbed = self.stream.grab()
+            if not grabbed:
+                with self.condition:
+                    self.grabbed = False
+                    if pacer.is_file:
+                        # End of a video file: nothing more will arrive, so stop instead of reopening it
+                        self.ended = True
+                        self.condition.notify_all()
+                        break
+                self.telemetry.incr("grab_failures")
+                self._consecutive_failures += 1
+                if self.reconnect_after_failures and self._consecutive_failures >= self.reconnect_after_failures:
+                    self._reconnect()
+                time.sleep(0.1)  # Back off while the source is unavailable
+                continue
+
+            now = time.time()
+            self._consecutive_failures = 0
+            self.telemetry.incr("frames_grabbed")
+            if self._last_grab is not None:
+                self._grab_fps = ewma_rate(self._grab_fps, now - self._last_grab)
+            self._last_grab = now
+            if not self._wants_decode(now):
+                self.telemetry.incr("frames_skipped")
+                continue
+
+            decode_start = time.perf_counter()
+            decoded, frame = self.stream.retrieve()
+            self.telemetry.observe("decode_ms", (time.perf_counter() - decode_start) * 1000)
+            if not decoded:
+                self.telemetry.incr("decode_failures")
+            else:
+                self.telemetry.incr("frames_decoded")
+                if self._last_decode:
+                    self._decode_fps = ewma_rate(self._decode_fps, now - self._last_decode)
+            with self.condition:
+                self.grabbed = decoded
+                if decoded:
+                    self.frame = frame
+                    self.seq += 1
+                    self.frame_time = now
+                    self._last_decode = now
+                    self.condition.notify_all()
 
     def read(self):
-        with self.read_lock:
-            if self.frames_queue:
-                return self.grabbed, self.frames_queue.pop() # Get newest frame
-            return self.grabbed, self.frame # return last read frame if queue is empty
+        """Return (grabbed, frame) for the newest decoded frame without waiting"""
+        grabbed, _, frame = self.read_with_seq()
+        return grabbed, frame
+
+    def read_with_seq(self):
+        """Return (grabbed, seq, frame) for the newest decoded frame without waiting"""
+        with self.condition:
+            self._last_demand = time.time()
+            return self.grabbed, self.seq, self.frame
+
+    def read_fresh(self, timeout=None):
+        """
+        Like read_with_seq, but if the stored frame is older than one decode interval (e.g. the
+        stream was idle), wait up to `timeout` seconds for the reader thread to decode a fresh one.
+        Blocks: call it from a worker thread, not the event loop.
+        """
+        with self.condition:
+            self._last_demand = time.time()
+            stale_after = max(self.decode_interval, 0.1)
+            if self.frame_time is None or time.time() - self.frame_time > stale_after:
+                if timeout is None:
+                    timeout = max(2 * self.decode_interval, 0.5)
+                seq = self.seq
+                self.condition.wait_for(lambda: self.seq != seq or not self.started or self.ended, timeout=timeout)
+            return self.grabbed, self.seq, self.frame
 
-    def stop(self):
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """Block until a frame newer than `after_seq` is decoded. Returns (seq, frame), frame is None on timeout"""
+        with self.condition:
+            self._last_demand = time.time()
+            if not self.condition.wait_for(lambda: self.seq > after_seq or not self.started or self.ended, timeout=timeout):
+                return self.seq, None
+            return self.seq, self.frame
+
+    def stats(self):
+        """Reader-thread state for telemetry; counters and histograms come from self.telemetry"""
+        now = time.time()
+        with self.condition:
+            frame_time = self.frame_time
+            seq = self.seq
+            grabbed = self.grabbed
+        thread = getattr(self, "thread", None)
+        return {
+            "reader_alive": bool(thread and thread.is_alive()),
+            "source_ok": bool(grabbed),
+            "frame_seq": seq,
+            "frame_age_seconds": round(now - frame_time, 3) if frame_time else None,
+            "last_grab_age_seconds": round(now - self._last_grab, 3) if self._last_grab else None,
+            "capture_fps": round(self._grab_fps, 2),
+            "decode_fps": round(self._decode_fps, 2),
+            "decoding": now - self._last_demand <= self.idle_decode_seconds,
+            "ingest_mode": "thread",
+        }
+
+    def stop(self, timeout=5.0):
+        """
+        Stop the reader thread. If it is stuck in grab() past `timeout`, it releases the stream
+        itself when grab() returns; releasing it from here would race with that call.
+        """
         self.started = False
-        self.thread.join()
+        with self.condition:
+            self.condition.notify_all()
+        thread = getattr(self, "thread", None)
+        if thread is not None:
+            thread.join(timeout)
+        with self._stream_lock:
+            if thread is None or not thread.is_alive():
+                self.stream.release()
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.stream.release()
+        self.stop()
 
 
 class LiveStreamService:
     def __init__(self):
         self.camera_streams = {}
         self.next_camera_id = 1
+        self.camera_config = get_cameras_config()
+        # "thread": one reader thread per camera in this process
+        # "process": cameras are decoded in separate processes and shared through shared memory
+        self.ingest_mode = self.camera_config.get('ingest_mode', 'thread')
+        self.ingest_pool = None
+        if self.ingest_mode == 'process':
+            self.ingest_pool = ProcessIngestPool(
+                cameras_per_process=self.camera_config.get('cameras_per_process', 1),
+                max_width=self.camera_config.get('shm_max_width', 1920),
+                max_height=self.camera_config.get('shm_max_height', 1080),
+                num_slots=self.camera_config.get('shm_slots', 4)
+            )
 
-    def add_camera(self, stream_url: str):
+    def _capture_settings(self):
+        return {
+            "width": 480,
+            "height": 360,
+            "capture_fps": self.camera_config.get('capture_fps', 15),
+            "target_decode_fps": self.camera_config.get('target_decode_fps', 5),
+            "idle_decode_seconds": self.camera_config.get('idle_decode_seconds', 10),
+            "reconnect_after_failures": self.camera_config.get('reconnect_after_failures', 50),
+        }
+
+    def add_camera(self, stream_url: str, profile=None):
+        """Start reading a stream; `profile` (ROI, min_face_size, max_faces) applies to its recognition"""
         camera_id = self.next_camera_id
         self.next_camera_id += 1
         try:
             # Convert string "0" to integer if needed
             if stream_url.isdigit():
                 stream_url = int(stream_url)
-            stream_widget = VideoStreamWidget(stream_url).start()
-            # Give it a moment to initialize
-            time.sleep(0.5)
+            capture = self._capture_settings()
+            if self.ingest_pool is not None:
+                stream_widget = self.ingest_pool.add_camera(
+                    camera_id, stream_url, capture, telemetry=camera_telemetry.get(camera_id, pin=True)
+                ).start(timeout=self.camera_config.get('process_start_timeout', 5))
+            else:
+                stream_widget = VideoStreamWidget(
+                    stream_url,
+                    telemetry=camera_telemetry.get(camera_id, pin=True),
+                    **capture
+                ).start()
+                # Give it a moment to initialize
+                time.sleep(0.5)
             self.camera_streams[camera_id] = stream_widget
+            if profile is not None:
+                camera_profiles.set(camera_id, profile)
             return camera_id
         except Exception as e:
             print(f"Error adding camera: {e}")
             return None
 
     def remove_camera(self, camera_id: int):
-        if camera_id in self.camera_streams:
-            self.camera_streams[camera_id].stop()
-            del self.camera_streams[camera_id]
-            return True
-        return False
+        """Stop a camera reader. Blocks while the reader stops: call it from a worker thread"""
+        # Unregister first, so concurrent readers stop finding the stream before it is torn down
+        stream = self.camera_streams.pop(camera_id, None)
+        if stream is None:
+            return False
+        stream.stop()
+        camera_telemetry.remove(camera_id)
+        camera_profiles.remove(camera_id)
+        return True
 
     def get_frame(self, camera_id: int):
-        if camera_id in self.camera_streams:
-            grabbed, frame = self.camera_streams[camera_id].read()
+        stream = self.camera_streams.get(camera_id)
+        if stream is not None:
+            grabbed, frame = stream.read()
             if grabbed:
                 return frame
         return None
 
+    def get_frame_with_seq(self, camera_id: int, fresh: bool = False):
+        """
+        Return (seq, frame) for the newest frame; seq identifies the frame for caching. (None, None) if unavailable.
+        With fresh=True a stale frame (idle stream) is replaced by a new decode, waiting briefly: worker threads only.
+        """
+        stream = self.camera_streams.get(camera_id)
+        if stream is not None:
+            grabbed, seq, frame = stream.read_fresh() if fresh else stream.read_with_seq()
+            if grabbed:
+                return seq, frame
+        return None, None
+
     def get_all_cameras(self):
         """Return list of all camera IDs"""
         return list(self.camera_streams.keys())
+
+    def shutdown(self):
+        """Stop every camera reader and release shared memory"""
+        for camera_id in list(self.camera_streams.keys()):
+            self.remove_camera(camera_id)
+        if self.ingest_pool is not None:
+            self.ingest_pool.shutdown()
+
+    def get_camera_stats(self, camera_id):
+        """
+        Capture and recognition telemetry for one camera.
+        camera_id may be a live stream id or any camera_id sent to recognize-frame. Returns None if unknown.
+        """
+        key = str(camera_id)
+        stream = self.camera_streams.get(int(key)) if key.isdigit() else None
+        telemetry = camera_telemetry.find(key)
+        if stream is None and telemetry is None:
+            return None
+
+        # Read capture state first: process-mode streams mirror their shared counters into telemetry
+        capture = stream.stats() if stream is not None else None
+        stats = telemetry.snapshot() if telemetry else {"camera_id": key, "counters": {}, "gauges": {}, "latency": {}}
+        stats["live_stream"] = stream is not None
+        if capture is not None:
+            stats["capture"] = capture
+        stats["status"] = self._camera_status(stats)
+        return stats
+
+    def _camera_status(self, stats):
+        """Classify a camera as ok, stalled or lagging from its stats"""
+        capture = stats.get("capture")
+        if capture is not None:
+            if not capture["reader_alive"]:
+                return "stalled"
+            last_grab_age = capture["last_grab_age_seconds"]
+            if last_grab_age is None or last_grab_age > self.camera_config.get('stall_seconds', 5):
+                return "stalled"
+        recognition = stats["latency"].get("recognition_ms")
+        if recognition and recognition["p95_ms"] > self.camera_config.get('lag_threshold_ms', 1000):
+            return "lagging"
+        return "ok"
+
+    def get_all_camera_stats(self):
+        """Per-camera stats plus totals and the ids of stalled/lagging cameras"""
+        camera_ids = {str(cam_id) for cam_id in self.camera_streams} | set(camera_telemetry.camera_ids())
+        cameras = [s for s in (self.get_camera_stats(cam_id) for cam_id in sorted(camera_ids)) if s is not None]
+
+        totals = {}
+        for stats in cameras:
+            for name, value in stats["counters"].items():
+                totals[name] = totals.get(name, 0) + value
+        return {
+            "cameras": cameras,
+            "totals": totals,
+            "stalled": [s["camera_id"] for s in cameras if s["status"] == "stalled"],
+            "lagging": [s["camera_id"] for s in cameras if s["status"] == "lagging"],
+        }
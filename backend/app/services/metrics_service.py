@@ -0,0 +1,150 @@
+"""
+Process-wide metrics for the recognition hot path, rendered in Prometheus text format.
+Stage timers are context managers around each step of recognize-frame; when metrics are
+disabled in config.yaml every call returns immediately.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple, List
+from backend.app.config import config
+from backend.app.services.telemetry import Histogram, DEFAULT_BUCKETS_MS, camera_telemetry
+
+FACES_PER_FRAME_BUCKETS = [0, 1, 2, 3, 5, 10, 20]
+
+# name -> (type, help, histogram bounds)
+METRIC_DEFINITIONS = {
+    "recognition_stage_seconds": ("histogram", "Time spent in each recognize-frame stage", DEFAULT_BUCKETS_MS),
+    "recognition_frame_seconds": ("histogram", "End-to-end recognize-frame latency", DEFAULT_BUCKETS_MS),
+    "recognition_faces_per_frame": ("histogram", "Faces detected per processed frame", FACES_PER_FRAME_BUCKETS),
+    "recognition_frames_total": ("counter", "Frames processed by recognize-frame", None),
+    "recognition_frames_superseded_total": ("counter", "Frames replaced by a newer frame from the same camera before processing", None),
+    "recognition_faces_total": ("counter", "Faces processed, by match result", None),
+    "gallery_matches_total": ("counter", "Matched faces by candidate gallery (section, fallback or full)", None),
+    "student_cache_requests_total": ("counter", "Student embedding cache lookups, by result", None),
+    "student_cache_hit_ratio": ("gauge", "Student embedding cache hit ratio since startup", None),
+    "recognition_result_cache_total": ("counter", "recognize-frame result cache lookups for repeated uploads, by result", None),
+    "snapshot_requests_total": ("counter", "Camera snapshot requests, by result", None),
+    "attendance_records_total": ("counter", "Attendance records written, by source", None),
+    "attendance_archived_total": ("counter", "Attendance records moved to the archive database", None),
+    "attendance_query_seconds": ("histogram", "Attendance listing and export query latency", DEFAULT_BUCKETS_MS),
+}
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra: List[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a histogram observation (milliseconds for latency metrics)"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        series = self._histograms.get(name)
+        histogram = series.get(key) if series else None
+        if histogram is None:
+            bounds = METRIC_DEFINITIONS.get(name, ("histogram", "", DEFAULT_BUCKETS_MS))[2]
+            with self._lock:
+                histogram = self._histograms.setdefault(name, {}).setdefault(key, Histogram(bounds))
+        histogram.observe(value)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Time a recognition pipeline stage"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("recognition_stage_seconds", (time.perf_counter() - start) * 1000, stage=stage)
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+
+        def header(name, metric_type):
+            help_text = METRIC_DEFINITIONS.get(name, (metric_type, name, None))[1]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for name, series in sorted(counters.items()):
+            header(name, "counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for name, series in sorted(gauges.items()):
+            header(name, "gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for name, series in sorted(histograms.items()):
+            header(name, "histogram")
+            # Latency histograms are kept in milliseconds and exported in seconds
+            scale = 1000.0 if name.endswith("_seconds") else 1.0
+            for key, histogram in series.items():
+                counts, total = histogram.counts_and_total()
+                cumulative = 0
+                for i, count in enumerate(counts):
+                    cumulative += count
+                    le = "+Inf" if i == len(histogram.bounds) else f"{histogram.bounds[i] / scale:g}"
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total / scale:g}")
+                lines.append(f"{name}_count{_format_labels(key)} {cumulative}")
+
+        # Per-camera telemetry counters (capture, recognition, snapshots)
+        camera_lines = []
+        for camera_id in sorted(camera_telemetry.camera_ids()):
+            telemetry = camera_telemetry.find(camera_id)
+            if telemetry is None:
+                continue
+            for event, value in sorted(telemetry.snapshot()["counters"].items()):
+                camera_lines.append(f"camera_events_total{_format_labels((('camera_id', camera_id), ('event', event)))} {value:g}")
+        if camera_lines:
+            lines.append("# HELP camera_events_total Per-camera capture and recognition event counters")
+            lines.append("# TYPE camera_events_total counter")
+            lines.extend(camera_lines)
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(enabled=config.get('metrics.enabled', True))
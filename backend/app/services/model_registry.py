@@ -0,0 +1,151 @@
+"""
+Process-wide face recognition service, shared by every router that needs the models.
+Loading insightface and preparing the ONNX sessions takes seconds, so the app starts it in a
+background thread at startup; routes that need the models answer 503 until it is ready while
+everything else (auth, attendance, cameras) is served immediately. A failed load is retried once
+startup.model_retry_seconds have passed; with retries disabled the failure is a plain 500.
+"""
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException
+from backend.app.config import config
+
+
+# Retry-After for 503s answered while the models load (see model_not_ready_response)
+RETRY_AFTER_SECONDS = "2"
+
+
+class ModelNotReady(RuntimeError):
+    """
+    Raised when the recognition service is still loading or failed to load. `retry_after` is the
+    Retry-After value to answer with, or None when retrying won't help (failed, no reload).
+    """
+
+    def __init__(self, message: str, retry_after: Optional[str] = RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def model_not_ready_response(e: ModelNotReady) -> Dict[str, Any]:
+    """Status code and headers for a ModelNotReady: 503 + Retry-After while retrying makes sense, else 500"""
+    if e.retry_after is None:
+        return {"status_code": 500, "headers": None}
+    return {"status_code": 503, "headers": {"Retry-After": e.retry_after}}
+
+
+class ModelRegistry:
+    def __init__(self, factory: Callable[[], Any] = None, retry_seconds: float = None):
+        self._factory = factory
+        self._service = None
+        self._state = "idle"  # idle -> loading -> ready | failed (-> loading again after retry_seconds)
+        self._error: Optional[str] = None
+        self._load_seconds: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._retry_seconds = config.get('startup.model_retry_seconds', 60) if retry_seconds is None else retry_seconds
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def _create(self):
+        if self._factory is not None:
+            return self._factory()
+        if config.get('inference_server.enabled', False):
+            # Models live in a shared inference server process; this is a thin client
+            from backend.app.services.inference_server import RemoteFaceRecognitionService
+            return RemoteFaceRecognitionService.from_config()
+        from backend.app.services.recognition_service import FaceRecognitionService
+        return FaceRecognitionService()
+
+    def start_loading(self) -> bool:
+        """Build the service in a daemon thread; returns False if loading already started or is backing off"""
+        with self._lock:
+            if self._state == "failed" and self._retry_remaining() == 0:
+                print(f"[*] Retrying face recognition model load after failure: {self._error}")
+                self._ready.clear()
+            elif self._state != "idle":
+                return False
+            self._state = "loading"
+        threading.Thread(target=self._load, name="model-loader", daemon=True).start()
+        return True
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            service = self._create()
+        except Exception as e:
+            print(f"[!] Face recognition models failed to load: {e}")
+            with self._lock:
+                self._state = "failed"
+                self._error = str(e)
+                self._failed_at = time.monotonic()
+                self._load_seconds = time.perf_counter() - start
+            self._ready.set()
+            return
+        with self._lock:
+            self._service = service
+            self._state = "ready"
+            self._error = None
+            self._load_seconds = time.perf_counter() - start
+        self._ready.set()
+        print(f"✓ Face recognition models ready in {self._load_seconds:.2f}s")
+
+    def set_service(self, service):
+        """Install an already built service (benchmarks and scripts inject a stub model this way)"""
+        with self._lock:
+            self._service = service
+            self._state = "ready"
+            self._error = None
+        self._ready.set()
+
+    def _retry_remaining(self) -> Optional[float]:
+        """Seconds until a failed load may be retried (0: now), None when retries are disabled; call with _lock held"""
+        if not self._retry_seconds:
+            return None
+        return max(0.0, self._failed_at + self._retry_seconds - time.monotonic())
+
+    def get(self, wait: float = 0):
+        """
+        Return the loaded service, waiting up to `wait` seconds for a load in progress.
+        Starts loading if nothing has requested it yet, or retries a failed load once the backoff
+        has passed. Raises ModelNotReady otherwise.
+        """
+        if self._state == "ready":
+            return self._service
+        self.start_loading()
+        if wait:
+            self._ready.wait(wait)
+        with self._lock:
+            if self._state == "ready":
+                return self._service
+            if self._state == "failed":
+                remaining = self._retry_remaining()
+                if remaining is None:
+                    raise ModelNotReady(f"Face recognition models failed to load: {self._error}", retry_after=None)
+                raise ModelNotReady(f"Face recognition models failed to load: {self._error}; retrying in {math.ceil(remaining)}s",
+                                    retry_after=str(max(1, math.ceil(remaining))))
+        raise ModelNotReady("Face recognition models are still loading")
+
+    @property
+    def ready(self) -> bool:
+        return self._state == "ready"
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "device": getattr(self._service, "device", None),
+                "load_seconds": round(self._load_seconds, 3) if self._load_seconds is not None else None,
+                "error": self._error,
+            }
+
+
+model_registry = ModelRegistry()
+
+
+def get_recognition_service():
+    """FastAPI dependency for routes that need the face models: 503 until they are loaded"""
+    try:
+        return model_registry.get(wait=config.get('startup.model_wait_seconds', 0))
+    except ModelNotReady as e:
+        raise HTTPException(detail=str(e), **model_not_ready_response(e))
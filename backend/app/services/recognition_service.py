@@ -1,13 +1,52 @@
 import numpy as np
-import insightface
-from insightface.app import FaceAnalysis
 from typing import List, Dict, Any
-from scipy.spatial.distance import cosine
-import cv2
 from backend.app.config import config
+from backend.app.services.metrics_service import metrics
+from backend.app.services.embedding_codec import GalleryMatrix
+
+
+class DetectedFace(dict):
+    """Dict with attribute access, the same shape as insightface's Face, so its models can fill it in"""
+    def __getattr__(self, name):
+        return self.get(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def cpu_session_options(profile: Dict[str, Any]):
+    """onnxruntime.SessionOptions for the face_recognition.cpu_profile config section"""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = int(profile.get('intra_op_threads', 0))
+    options.inter_op_num_threads = int(profile.get('inter_op_threads', 0))
+    level = GRAPH_OPTIMIZATION_LEVELS.get(str(profile.get('graph_optimization', 'all')).lower(), "ORT_ENABLE_ALL")
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, level)
+    if str(profile.get('execution_mode', 'sequential')).lower() == 'parallel':
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    else:
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return options
+
+
+def _cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if norm == 0:
+        return 1.0
+    return 1.0 - float(np.dot(a, b)) / norm
 
 class FaceRecognitionService:
-    def __init__(self):
+    def __init__(self, face_app=None):
         # Load configuration
         fr_config = config.get_section('face_recognition')
         det_config = fr_config.get('detection', {})
@@ -17,12 +56,30 @@ class FaceRecognitionService:
         providers = fr_config.get('providers', ['CUDAExecutionProvider', 'CPUExecutionProvider'])
         model_name = fr_config.get('model_name', 'buffalo_l')
         model_path = fr_config.get('model_path', './models')
-        
-        self.app = FaceAnalysis(
-            name=model_name, 
-            root=model_path, 
-            providers=providers
-        )
+        # Only load the models the pipeline uses; buffalo_l also ships landmark and gender/age models
+        allowed_modules = fr_config.get('allowed_modules', ['detection', 'recognition'])
+        cpu_profile = fr_config.get('cpu_profile', {})
+        self.cpu_profile = cpu_profile if cpu_profile.get('enabled', True) else None
+        cpu_profile_applied = False
+
+        if face_app is None:
+            # insightface (and onnxruntime underneath) is imported here so the API can start without it
+            import onnxruntime
+            from insightface.app import FaceAnalysis
+            session_kwargs = {}
+            if self.cpu_profile is not None and "CUDAExecutionProvider" not in onnxruntime.get_available_providers():
+                # CPU-only build: create the sessions with the tuned options straight away
+                providers = [p for p in providers if p != "CUDAExecutionProvider"] or ["CPUExecutionProvider"]
+                session_kwargs["sess_options"] = cpu_session_options(self.cpu_profile)
+                cpu_profile_applied = True
+            face_app = FaceAnalysis(
+                name=model_name,
+                root=model_path,
+                providers=providers,
+                allowed_modules=allowed_modules,
+                **session_kwargs
+            )
+        self.app = face_app
         
         # Try GPU configuration first, fallback to CPU
         det_size_gpu = tuple(det_config.get('det_size_gpu', [320, 320]))
@@ -30,17 +87,190 @@ class FaceRecognitionService:
         det_thresh_gpu = det_config.get('det_threshold_gpu', 0.5)
         det_thresh_cpu = det_config.get('det_threshold_cpu', 0.6)
         
+        # ONNX Runtime silently falls back to CPU when CUDA is unavailable, so check the provider
+        # the detector session actually ended up with instead of relying on prepare() raising
         try:
             self.app.prepare(ctx_id=0, det_size=det_size_gpu, det_thresh=det_thresh_gpu)
+            on_gpu = self._uses_gpu()
+        except Exception as e:
+            print(f"[!] GPU initialization failed, falling back to CPU: {e}")
+            on_gpu = False
+
+        if on_gpu:
+            self.device = "gpu"
+            self.det_size = det_size_gpu
             print(f"✓ Face Recognition initialized with GPU (SCRFD-10G detector)")
             print(f"  Model: {model_name}, Detection size: {det_size_gpu}, Threshold: {det_thresh_gpu}")
-        except:
-            self.app.prepare(ctx_id=0, det_size=det_size_cpu, det_thresh=det_thresh_cpu)
+        else:
+            self.device = "cpu"
+            self.det_size = det_size_cpu
+            self.app.prepare(ctx_id=-1, det_size=det_size_cpu, det_thresh=det_thresh_cpu)
+            if self.cpu_profile is not None and not cpu_profile_applied:
+                # CUDA was advertised but not usable: the sessions exist with default options
+                cpu_profile_applied = self._rebuild_cpu_sessions(cpu_session_options(self.cpu_profile))
             print(f"✓ Face Recognition initialized with CPU (SCRFD-10G detector)")
             print(f"  Model: {model_name}, Detection size: {det_size_cpu}, Threshold: {det_thresh_cpu}")
+            if cpu_profile_applied:
+                print(f"  ONNX Runtime CPU profile: intra_op_threads={self.cpu_profile.get('intra_op_threads', 0)}, "
+                      f"inter_op_threads={self.cpu_profile.get('inter_op_threads', 0)}, "
+                      f"graph_optimization={self.cpu_profile.get('graph_optimization', 'all')}, "
+                      f"execution_mode={self.cpu_profile.get('execution_mode', 'sequential')}")
         
         # Store threshold for matching
         self.similarity_threshold = rec_config.get('similarity_threshold', 0.6)
+        # Scoped matching falls back to the full gallery when the expected sections have no match
+        self.scoped_fallback = config.get('face_recognition.scoped_gallery.fallback_to_full', True)
+        # Precision of the in-memory matching matrix; compact matrices are reranked exactly
+        self.gallery_precision = rec_config.get('gallery_precision', 'float32')
+        self.rerank_top_k = max(1, rec_config.get('rerank_top_k', 8))
+        self.match_chunk_rows = rec_config.get('match_chunk_rows', 8192)
+        # Normalized embedding matrix for the last gallery passed to find_match, its rows by
+        # section and the sub-galleries built from them
+        self._gallery = (None, 0, [], GalleryMatrix(np.empty((0, 0), dtype=np.float32)), {}, {})
+
+    def _uses_gpu(self) -> bool:
+        det_model = getattr(self.app, "det_model", None)
+        session = getattr(det_model, "session", None)
+        if session is None:
+            return False
+        return "CUDAExecutionProvider" in session.get_providers()
+
+    def _rebuild_cpu_sessions(self, options) -> bool:
+        """Recreate each model's ONNX Runtime session on the CPU provider with `options`"""
+        import onnxruntime
+        rebuilt = False
+        for model in self.app.models.values():
+            model_file = getattr(model, "model_file", None)
+            if model_file is None or getattr(model, "session", None) is None:
+                continue
+            model.session = onnxruntime.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+            rebuilt = True
+        return rebuilt
+
+    def detect(self, image: np.ndarray, max_num: int = 0, det_size=None, offset=(0, 0)) -> list:
+        """
+        Run only the detector and return faces without embeddings.
+        det_size overrides the detector input size for this call (used by the adaptive controller);
+        offset is added to boxes and keypoints when `image` is a crop of a larger frame.
+        """
+        input_size = tuple(det_size) if det_size is not None else None
+        with metrics.stage("detect"):
+            bboxes, kpss = self.app.det_model.detect(image, input_size=input_size, max_num=max_num, metric='default')
+
+        dx, dy = offset
+        faces = []
+        for i in range(bboxes.shape[0]):
+            bbox = bboxes[i, 0:4]
+            kps = kpss[i] if kpss is not None else None
+            if dx or dy:
+                bbox = bbox + np.array([dx, dy, dx, dy], dtype=bbox.dtype)
+                kps = kps + np.array([dx, dy], dtype=kps.dtype) if kps is not None else None
+            faces.append(DetectedFace(bbox=bbox, kps=kps, det_score=bboxes[i, 4]))
+        return faces
+
+    def embed(self, image: np.ndarray, faces: list) -> list:
+        """Run the non-detection models (the recognizer) on detected faces of `image`"""
+        self.embed_many([(image, face) for face in faces])
+        return faces
+
+    def embed_many(self, pairs: list):
+        """
+        Embed (image, face) pairs, possibly from different frames. The ArcFace recognizer gets
+        all aligned crops in one batched session run when its input has a dynamic batch size.
+        """
+        if not pairs:
+            return
+        with metrics.stage("embed"):
+            recognizer = self.app.models.get('recognition')
+            batched = (recognizer is not None and hasattr(recognizer, 'get_feat')
+                       and hasattr(recognizer, 'input_size') and not isinstance(getattr(recognizer, 'input_shape', [1])[0], int))
+            if batched:
+                from insightface.utils import face_align
+                crops = [face_align.norm_crop(image, landmark=face.kps, image_size=recognizer.input_size[0]) for image, face in pairs]
+                features = recognizer.get_feat(crops)
+                for (_, face), feature in zip(pairs, features):
+                    face.embedding = feature.flatten()
+            for taskname, model in self.app.models.items():
+                if taskname == 'detection' or (batched and taskname == 'recognition'):
+                    continue
+                for image, face in pairs:
+                    model.get(image, face)
+
+    @staticmethod
+    def _drop_small(faces: list, min_face_size: int):
+        """Split off faces whose shorter side is below min_face_size pixels; returns (kept, dropped_count)"""
+        if not min_face_size:
+            return faces, 0
+        kept = [face for face in faces if min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1]) >= min_face_size]
+        return kept, len(faces) - len(kept)
+
+    def detect_faces(self, image: np.ndarray, max_num: int = 0, det_size=None, min_face_size: int = 0) -> list:
+        """
+        Detect faces and compute their embeddings, like FaceAnalysis.get(), timing the
+        detection and embedding stages separately. Faces whose shorter side is below
+        min_face_size pixels are dropped before the recognizer runs.
+        """
+        faces, _ = self._drop_small(self.detect(image, max_num=max_num, det_size=det_size), min_face_size)
+        return self.embed(image, faces)
+
+    def analyze_frame(self, image: np.ndarray, registered_students: List[Dict[str, Any]], max_num: int = 0, det_size=None,
+                      detect_input: np.ndarray = None, offset=(0, 0), min_face_size: int = 0, sections=None):
+        """
+        Detect, embed and match every face in `image` against `registered_students`.
+        detect_input/offset restrict detection to a region of `image` (see camera_profiles);
+        sections scopes matching to the students the camera expects (see match_many).
+        Returns (faces, too_small_count); each face is a dict with bbox, confidence, name,
+        similarity, student_id and roll_number (None when unmatched).
+        """
+        request = {"image": image, "detect_input": detect_input, "offset": offset,
+                   "max_num": max_num, "det_size": det_size, "min_face_size": min_face_size, "sections": sections}
+        return self.analyze_batch([request], registered_students)[0]
+
+    def analyze_batch(self, requests: List[Dict[str, Any]], registered_students: List[Dict[str, Any]]) -> list:
+        """analyze_frame for several frames: detection per frame, then one embedding batch and one gallery match"""
+        detected = []
+        for request in requests:
+            image = request["image"]
+            detect_input = request.get("detect_input")
+            faces = self.detect(image if detect_input is None else detect_input, max_num=request.get("max_num", 0),
+                                det_size=request.get("det_size"), offset=request.get("offset") or (0, 0))
+            faces, too_small = self._drop_small(faces, request.get("min_face_size", 0))
+            detected.append((image, faces, too_small))
+
+        self.embed_many([(image, face) for image, faces, _ in detected for face in faces])
+        embeddings = [face.embedding for _, faces, _ in detected for face in faces]
+        with metrics.stage("match"):
+            # One match per distinct section scope (frames from different cameras may expect different classes)
+            scopes: Dict[Any, List[int]] = {}
+            index = 0
+            for request, (_, faces, _) in zip(requests, detected):
+                sections = request.get("sections")
+                key = tuple(sorted(sections)) if sections else None
+                scopes.setdefault(key, []).extend(range(index, index + len(faces)))
+                index += len(faces)
+            matches = [None] * len(embeddings)
+            for key, positions in scopes.items():
+                scoped = self.match_many([embeddings[i] for i in positions], registered_students, sections=key)
+                for position, match in zip(positions, scoped):
+                    matches[position] = match
+
+        results, index = [], 0
+        for _, faces, too_small in detected:
+            recognized = []
+            for face in faces:
+                student, similarity = matches[index]
+                index += 1
+                x1, y1, x2, y2 = face.bbox.astype(int)
+                recognized.append({
+                    "bbox": [int(x1), int(y1), int(x2), int(y2)],
+                    "confidence": float(face.det_score),
+                    "name": student["name"] if student else "Unknown",
+                    "similarity": float(similarity),
+                    "student_id": student["id"] if student else None,
+                    "roll_number": student.get("roll_number") if student else None,
+                })
+            results.append((recognized, too_small))
+        return results
 
     def get_face_embedding(self, face_image: np.ndarray) -> np.ndarray:
         """
@@ -69,32 +299,138 @@ class FaceRecognitionService:
         if threshold is None:
             threshold = self.similarity_threshold
         # Cosine distance is 1 - cosine similarity. Lower distance means higher similarity.
-        distance = cosine(embedding1, embedding2)
+        distance = _cosine_distance(embedding1, embedding2)
         return distance < threshold
 
-    def find_match(self, new_embedding: np.ndarray, registered_students: List[Dict[str, Any]], threshold: float = None) -> (str, float):
-        if new_embedding is None:
-            return "Unknown", 0.0
-        
-        # Use configured threshold if not provided
+    def _gallery_matrix(self, registered_students: List[Dict[str, Any]]):
+        """
+        Stack and L2-normalize the student embeddings once per gallery list, stored at
+        gallery_precision (float32, or float16/int8 to shrink large galleries).
+        The cached list from get_cached_students is reused between refreshes, so this
+        only rebuilds when a new list (or a list of a different length) is passed in.
+        Rows are also indexed by section for the scoped sub-galleries.
+        With a compact matrix the list's student dicts are replaced by copies whose embedding
+        is a view of their matrix row, so the cache no longer pins a float32 array per student.
+        """
+        source, size, rows, matrix, _, _ = self._gallery
+        if source is registered_students and size == len(registered_students):
+            return rows, matrix
+        positions = [i for i, student in enumerate(registered_students) if student["embedding"] is not None]
+        rows = [registered_students[i] for i in positions]
+        if rows:
+            normalized = np.stack([np.asarray(student["embedding"], dtype=np.float32) for student in rows])
+            norms = np.linalg.norm(normalized, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            normalized /= norms
+        else:
+            normalized = np.empty((0, 0), dtype=np.float32)
+        matrix = GalleryMatrix.build(normalized, self.gallery_precision, self.match_chunk_rows)
+        if not matrix.exact:
+            for index, position in enumerate(positions):
+                rows[index] = registered_students[position] = {**rows[index], "embedding": matrix.row_view(index)}
+        section_rows: Dict[str, List[int]] = {}
+        for index, student in enumerate(rows):
+            if student.get("section"):
+                section_rows.setdefault(student["section"], []).append(index)
+        self._gallery = (registered_students, len(registered_students), rows, matrix, section_rows, {})
+        return rows, matrix
+
+    def _section_gallery(self, registered_students: List[Dict[str, Any]], sections):
+        """
+        (rows, matrix) of the students in `sections`, sliced from the full gallery matrix once
+        per section set and kept until the gallery changes
+        """
+        self._gallery_matrix(registered_students)
+        _, _, rows, matrix, section_rows, scoped = self._gallery
+        key = frozenset(sections)
+        cached = scoped.get(key)
+        if cached is None:
+            indices = sorted(i for section in key for i in section_rows.get(section, []))
+            cached = ([rows[i] for i in indices], matrix.take(indices))
+            scoped[key] = cached
+        return cached
+
+    def _best_matches(self, queries: np.ndarray, rows: list, matrix: GalleryMatrix):
+        """
+        (best row index, similarity) arrays for normalized queries; None for an empty gallery.
+        With a float16/int8 matrix the rerank_top_k best candidates of each query are re-scored in
+        float32 against their decoded stored rows, which removes the query quantization and float16
+        rounding of the batched pass; the gallery rows themselves stay at gallery_precision.
+        """
+        if not rows:
+            return None
+        similarities = matrix.similarities(queries)
+        if matrix.exact or len(rows) <= 1:
+            best = similarities.argmax(axis=1)
+            return best, similarities[np.arange(len(best)), best]
+        k = min(self.rerank_top_k, len(rows))
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        vectors = matrix.rows(candidates)
+        norms = np.linalg.norm(vectors, axis=2)
+        exact = np.einsum("qkd,qd->qk", vectors, queries) / np.where(norms == 0, 1.0, norms)
+        top = exact.argmax(axis=1)
+        rows_index = np.arange(len(queries))
+        return candidates[rows_index, top], exact[rows_index, top]
+
+    def match_many(self, embeddings: list, registered_students: List[Dict[str, Any]], threshold: float = None,
+                   sections=None) -> list:
+        """
+        Best gallery match for each embedding as (student dict or None, similarity).
+        One matrix product covers all embeddings; similarity is 0.0 for an empty gallery.
+        With `sections` (the classes a camera expects right now, see ScheduleService) only those
+        students are searched first; embeddings without a confident match there are searched
+        again against the full gallery unless scoped_gallery.fallback_to_full is off.
+        """
         if threshold is None:
             threshold = self.similarity_threshold
+        if not embeddings:
+            return []
+        registered_students = registered_students or []
+        rows, matrix = self._gallery_matrix(registered_students)
+        results = [(None, 0.0)] * len(embeddings)
+        valid = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        if not rows or not valid:
+            return results
 
-        min_distance = float('inf')
-        matched_student_name = "Unknown"
+        queries = np.stack([np.asarray(embeddings[i], dtype=np.float32).ravel() for i in valid])
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+        nonzero = norms[:, 0] != 0  # all-zero embedding: nothing to compare
 
-        for student in registered_students:
-            student_embedding = student["embedding"]
-            if student_embedding is None:
-                continue
+        pending = np.flatnonzero(nonzero)
+        if sections:
+            scoped_rows, scoped_matrix = self._section_gallery(registered_students, sections)
+            found = self._best_matches(queries[pending], scoped_rows, scoped_matrix)
+            if found is not None:
+                unmatched = []
+                for (best, similarity), row in zip(zip(*found), pending):
+                    similarity = float(similarity)
+                    # Cosine distance below the threshold is a match; report the similarity either way
+                    if 1 - similarity < threshold:
+                        results[valid[row]] = (scoped_rows[best], similarity)
+                        metrics.inc("gallery_matches_total", scope="section")
+                    else:
+                        results[valid[row]] = (None, similarity)
+                        unmatched.append(row)
+                pending = np.array(unmatched, dtype=int)
+            if not self.scoped_fallback:
+                return results
+        if not len(pending):
+            return results
 
-            distance = cosine(new_embedding, student_embedding)
+        best, similarities = self._best_matches(queries[pending], rows, matrix)
+        for row, index, similarity in zip(pending, best, similarities):
+            similarity = float(similarity)
+            if 1 - similarity < threshold:
+                results[valid[row]] = (rows[index], similarity)
+                metrics.inc("gallery_matches_total", scope="fallback" if sections else "full")
+            else:
+                results[valid[row]] = (None, similarity)
+        return results
 
-            if distance < min_distance:
-                min_distance = distance
-                matched_student_name = student["name"]
-        
-        if min_distance < threshold:
-            return matched_student_name, 1 - min_distance # Return similarity
-        else:
-            return "Unknown", 1 - min_distance # Return similarity even if not matched
+    def find_match(self, new_embedding: np.ndarray, registered_students: List[Dict[str, Any]], threshold: float = None,
+                   sections=None) -> (str, float):
+        if new_embedding is None:
+            return "Unknown", 0.0
+        student, similarity = self.match_many([new_embedding], registered_students, threshold, sections=sections)[0]
+        return (student["name"] if student else "Unknown"), similarity
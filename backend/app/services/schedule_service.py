@@ -0,0 +1,131 @@
+"""
+Camera schedules: which class sections a camera expects to see at a given time.
+A classroom camera only ever sees one section during a period, so recognize-frame matches its
+faces against that section's students first (a small sub-gallery, see
+FaceRecognitionService.match_many) and only falls back to the full gallery when nobody there
+matches. Cameras without a schedule entry for the current time match against everyone.
+"""
+import threading
+import time
+from datetime import datetime, time as dt_time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from backend.app.config import config
+from backend.app.services.database import CameraSchedule
+
+
+def parse_time(value) -> dt_time:
+    """'HH:MM' (or 'HH:MM:SS') to a time; raises ValueError"""
+    if isinstance(value, dt_time):
+        return value
+    try:
+        parts = [int(part) for part in str(value).split(":")]
+        return dt_time(*parts)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid time '{value}' (use HH:MM)")
+
+
+class ScheduleService:
+    def __init__(self, refresh_seconds: float = 30):
+        self.refresh_seconds = refresh_seconds
+        # camera_id -> [(day_of_week or None, start, end, section)], reloaded every refresh_seconds
+        self._windows: Optional[Dict[str, List[Tuple[Optional[int], dt_time, dt_time, str]]]] = None
+        self._loaded_at = 0.0
+        self._generation = 0  # bumped by invalidate(); a load that started before it is discarded
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def to_dict(schedule: CameraSchedule) -> Dict[str, Any]:
+        return {
+            "id": schedule.id,
+            "camera_id": schedule.camera_id,
+            "section": schedule.section,
+            "day_of_week": schedule.day_of_week,
+            "start_time": schedule.start_time.strftime("%H:%M"),
+            "end_time": schedule.end_time.strftime("%H:%M"),
+        }
+
+    def list_schedules(self, db: Session, camera_id: str = None) -> List[Dict[str, Any]]:
+        query = db.query(CameraSchedule)
+        if camera_id is not None:
+            query = query.filter(CameraSchedule.camera_id == str(camera_id))
+        return [self.to_dict(schedule) for schedule in query.order_by(CameraSchedule.camera_id, CameraSchedule.id).all()]
+
+    def add_schedule(self, db: Session, camera_id: str, section: str, start_time, end_time,
+                     day_of_week: int = None) -> Dict[str, Any]:
+        """Create a schedule window; raises ValueError for an invalid day or time"""
+        if day_of_week is not None and not 0 <= day_of_week <= 6:
+            raise ValueError("day_of_week must be 0 (Monday) to 6 (Sunday)")
+        if not section:
+            raise ValueError("section is required")
+        start, end = parse_time(start_time), parse_time(end_time)
+        if start == end:
+            raise ValueError("start_time and end_time must differ")
+        schedule = CameraSchedule(camera_id=str(camera_id), section=section, day_of_week=day_of_week,
+                                  start_time=start, end_time=end)
+        db.add(schedule)
+        db.commit()
+        db.refresh(schedule)
+        self.invalidate()
+        return self.to_dict(schedule)
+
+    def delete_schedule(self, db: Session, schedule_id: int) -> bool:
+        schedule = db.query(CameraSchedule).filter(CameraSchedule.id == schedule_id).first()
+        if schedule is None:
+            return False
+        db.delete(schedule)
+        db.commit()
+        self.invalidate()
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._windows = None
+            self._generation += 1
+
+    def _load(self, db: Session) -> Dict[str, List[Tuple[Optional[int], dt_time, dt_time, str]]]:
+        with self._lock:
+            generation = self._generation
+        windows: Dict[str, List[Tuple[Optional[int], dt_time, dt_time, str]]] = {}
+        for schedule in db.query(CameraSchedule).all():
+            windows.setdefault(schedule.camera_id, []).append(
+                (schedule.day_of_week, schedule.start_time, schedule.end_time, schedule.section))
+        with self._lock:
+            # A schedule change committed while we were querying may be missing from these rows:
+            # answer this call with them but leave the cache empty for the next one
+            if generation == self._generation:
+                self._windows = windows
+                self._loaded_at = time.monotonic()
+        return windows
+
+    def active_sections(self, db: Session, camera_id, when: datetime = None) -> Optional[Tuple[str, ...]]:
+        """
+        Sections scheduled for `camera_id` at `when` (default now, local time), or None when the
+        camera has no window covering that time. Windows that end before they start span midnight.
+        """
+        # invalidate() can reset self._windows from another thread at any point, so work on one snapshot
+        with self._lock:
+            windows = self._windows
+            stale = windows is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+        if stale:
+            windows = self._load(db)
+        windows = windows.get(str(camera_id))
+        if not windows:
+            return None
+        when = when or datetime.now()
+        weekday, now = when.weekday(), when.time()
+        sections = set()
+        for day, start, end, section in windows:
+            if start < end:
+                active = (day is None or day == weekday) and start <= now < end
+            elif now >= start:
+                active = day is None or day == weekday
+            else:
+                # After midnight in a window that started the previous day
+                active = now < end and (day is None or day == (weekday - 1) % 7)
+            if active:
+                sections.add(section)
+        return tuple(sorted(sections)) or None
+
+
+schedule_service = ScheduleService(refresh_seconds=config.get('live_stream.cache_refresh_seconds', 30))
@@ -0,0 +1,74 @@
+"""
+Encoded snapshot cache shared by all viewers of a camera.
+Each camera keeps the JPEG for its newest frame per size variant, keyed by the frame sequence
+number, so N viewers polling the same camera cost one encode per new frame.
+"""
+import threading
+import time
+from typing import Dict, Tuple, Optional
+import cv2
+import numpy as np
+
+
+class SnapshotCache:
+    def __init__(self, jpeg_quality: int = 80, sizes: Dict[str, int] = None):
+        self.jpeg_quality = jpeg_quality
+        self.sizes = dict(sizes or {})  # variant name -> max width
+        # Distinguishes ETags across restarts, when frame sequence numbers start over
+        self.epoch = format(int(time.time()), "x")
+        self._entries: Dict[Tuple[str, str], Tuple[int, str, bytes]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _camera_lock(self, camera_key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(camera_key, threading.Lock())
+
+    def etag(self, camera_id, seq: int, variant: str = None) -> str:
+        return f'"{self.epoch}-{camera_id}-{seq}-{variant or "full"}"'
+
+    def get(self, camera_id, seq: int, frame: np.ndarray, variant: str = None) -> Tuple[str, Optional[bytes], bool]:
+        """
+        Return (etag, jpeg_bytes, cache_hit) for `frame`, encoding it only if this camera/variant
+        has not been encoded at `seq` yet. Raises KeyError for an unknown variant.
+        """
+        if variant is not None and variant not in self.sizes:
+            raise KeyError(variant)
+        camera_key = str(camera_id)
+        key = (camera_key, variant or "full")
+        etag = self.etag(camera_key, seq, variant)
+
+        # Concurrent requests for the same camera wait for a single encode
+        with self._camera_lock(camera_key):
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == seq:
+                self.hits += 1
+                return entry[1], entry[2], True
+
+            self.misses += 1
+            image = frame
+            if variant is not None:
+                max_width = self.sizes[variant]
+                h, w = frame.shape[:2]
+                if w > max_width:
+                    image = cv2.resize(frame, (max_width, int(h * max_width / w)), interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                return etag, None, False
+            data = buffer.tobytes()
+            self._entries[key] = (seq, etag, data)
+            return etag, data, False
+
+    def remove(self, camera_id):
+        """Drop all cached variants of a camera"""
+        camera_key = str(camera_id)
+        with self._camera_lock(camera_key):
+            for key in [k for k in self._entries if k[0] == camera_key]:
+                del self._entries[key]
+        with self._locks_guard:
+            self._locks.pop(camera_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,168 @@
+"""
+Lightweight in-process telemetry: counters and fixed-bucket latency histograms per camera
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List
+from backend.app.config import config
+
+# Latency bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = [0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def ewma_rate(current: float, interval: float) -> float:
+    """Exponentially weighted events/second, updated with the interval since the previous event"""
+    rate = 1.0 / interval if interval > 0 else 0.0
+    return rate if current == 0.0 else 0.9 * current + 0.1 * rate
+
+
+def summarize_buckets(bounds: List[float], counts: List[int], total: float) -> Dict[str, Any]:
+    """Build a histogram summary (count, mean, percentiles) from bucket counts"""
+    count = int(sum(counts))
+    summary = {
+        "count": count,
+        "sum_ms": round(float(total), 3),
+        "mean_ms": round(float(total) / count, 3) if count else 0.0,
+    }
+    for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        summary[name] = _quantile(bounds, counts, count, q)
+    summary["buckets"] = {("+Inf" if i == len(bounds) else str(bounds[i])): int(c) for i, c in enumerate(counts)}
+    return summary
+
+
+def _quantile(bounds, counts, count, q):
+    """Upper bound of the bucket containing the q-th observation"""
+    if not count:
+        return 0.0
+    rank = q * count
+    seen = 0
+    for i, c in enumerate(counts):
+        seen += c
+        if seen >= rank:
+            return float(bounds[i]) if i < len(bounds) else float(bounds[-1])
+    return float(bounds[-1])
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram; the last bucket collects everything above the largest bound"""
+    def __init__(self, bounds: List[float] = None):
+        self.bounds = list(bounds or DEFAULT_BUCKETS_MS)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def bucket_index(self, value: float) -> int:
+        return bisect.bisect_left(self.bounds, value)
+
+    def observe(self, value_ms: float):
+        index = self.bucket_index(value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value_ms
+
+    def load(self, counts: List[int], total: float):
+        """Replace the bucket counts, e.g. with counts kept by another process"""
+        with self._lock:
+            self.counts = list(counts)
+            self.total = total
+
+    def counts_and_total(self):
+        with self._lock:
+            return list(self.counts), self.total
+
+    def snapshot(self) -> Dict[str, Any]:
+        counts, total = self.counts_and_total()
+        return summarize_buckets(self.bounds, counts, total)
+
+
+class CameraTelemetry:
+    """Counters, gauges and latency histograms for a single camera"""
+    def __init__(self, camera_id: str):
+        self.camera_id = camera_id
+        self.created_at = time.time()
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_counter(self, name: str, value: int):
+        with self._lock:
+            self.counters[name] = value
+
+    def load_histogram(self, name: str, counts: List[int], total: float):
+        with self._lock:
+            histogram = self.histograms.setdefault(name, Histogram())
+        histogram.load(counts, total)
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value_ms: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.observe(value_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = dict(self.histograms)
+        return {
+            "camera_id": self.camera_id,
+            "uptime_seconds": round(time.time() - self.created_at, 1),
+            "counters": counters,
+            "gauges": gauges,
+            "latency": {name: h.snapshot() for name, h in histograms.items()},
+        }
+
+
+class TelemetryRegistry:
+    """
+    Registry of CameraTelemetry objects keyed by camera id (always stored as str).
+    Upload camera ids come from clients, so beyond max_cameras the least recently used entry is
+    dropped; pinned entries (live stream cameras, until remove()) are never evicted.
+    """
+    def __init__(self, max_cameras: int = 256):
+        self.max_cameras = max(1, int(max_cameras))
+        self._cameras: "OrderedDict[str, CameraTelemetry]" = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    def get(self, camera_id, pin: bool = False) -> CameraTelemetry:
+        key = str(camera_id)
+        with self._lock:
+            telemetry = self._cameras.get(key)
+            if telemetry is None:
+                telemetry = self._cameras[key] = CameraTelemetry(key)
+            self._cameras.move_to_end(key)
+            if pin:
+                self._pinned.add(key)
+            if len(self._cameras) > self.max_cameras:
+                for stale in [k for k in self._cameras if k not in self._pinned][:len(self._cameras) - self.max_cameras]:
+                    del self._cameras[stale]
+        return telemetry
+
+    def find(self, camera_id):
+        """Return telemetry for a camera without creating it"""
+        return self._cameras.get(str(camera_id))
+
+    def remove(self, camera_id):
+        with self._lock:
+            self._cameras.pop(str(camera_id), None)
+            self._pinned.discard(str(camera_id))
+
+    def camera_ids(self) -> List[str]:
+        return list(self._cameras.keys())
+
+
+# Shared registry used by the live stream readers and the recognition endpoint
+camera_telemetry = TelemetryRegistry(config.get('live_stream.telemetry_max_cameras', 256))
@@ -1,12 +1,29 @@
 import numpy as np
-from sqlalchemy.orm import Session
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session, undefer
 from backend.app.services.recognition_service import FaceRecognitionService
 from backend.app.services.database import Student
-from typing import List
+from typing import List, Optional
+
+# Columns returned by the student listing; the embedding blob is never selected
+_LISTING_COLUMNS = (Student.id, Student.name, Student.roll_number, Student.email, Student.photo_path, Student.section)
+_LISTING_KEYS = tuple(column.key for column in _LISTING_COLUMNS)
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 class TrainingService:
-    def __init__(self, recognition_service: FaceRecognitionService):
-        self.recognition_service = recognition_service
+    def __init__(self, recognition_service: Optional[FaceRecognitionService] = None):
+        # Without an explicit service the shared one is resolved on first use, so the
+        # DB-only helpers below work before the face models have loaded
+        self._recognition_service = recognition_service
+
+    @property
+    def recognition_service(self) -> FaceRecognitionService:
+        if self._recognition_service is not None:
+            return self._recognition_service
+        from backend.app.services.model_registry import model_registry
+        return model_registry.get()
 
     def generate_and_store_embedding(self, db: Session, student_name: str, image_data: np.ndarray, 
                                      roll_number: str = None, email: str = None, photo_path: str = None):
@@ -55,22 +72,25 @@ class TrainingService:
         return db_student
 
     def load_all_student_embeddings(self, db: Session) -> List[dict]:
-        students = db.query(Student).all()
+        students = db.query(Student).options(undefer(Student.embedding)).filter(Student.embedding.isnot(None)).all()
         return [{
             "id": student.id,
             "name": student.name,
             "roll_number": student.roll_number,
+            "section": student.section,
             "embedding": student.get_embedding()
-        } for student in students if student.get_embedding() is not None]
+        } for student in students if student.embedding]
 
     def store_student_embedding(self, db: Session, student_name: str, embedding: np.ndarray,
-                                roll_number: str = None, email: str = None, photo_path: str = None):
+                                roll_number: str = None, email: str = None, photo_path: str = None,
+                                section: str = None):
         """Store student with pre-computed embedding"""
         db_student = Student(
             name=student_name,
             roll_number=roll_number,
             email=email,
-            photo_path=photo_path
+            photo_path=photo_path,
+            section=section
         )
         db_student.set_embedding(embedding)
         db.add(db_student)
@@ -78,13 +98,27 @@ class TrainingService:
         db.refresh(db_student)
         return db_student
 
-    def get_all_students_list(self, db: Session) -> List[dict]:
-        """Get all students without embeddings for display purposes"""
-        students = db.query(Student).all()
-        return [{
-            "id": student.id,
-            "name": student.name,
-            "roll_number": student.roll_number,
-            "email": student.email,
-            "photo_path": student.photo_path
-        } for student in students]
+    def get_all_students_list(self, db: Session, q: str = None, after_id: int = None,
+                              limit: int = None) -> List[dict]:
+        """
+        Students without embeddings for display purposes, ordered by id. Only the listed columns
+        are selected. q is a case-insensitive prefix of the name or roll number; pages are keyset
+        based: pass the last id of the previous page as after_id.
+        """
+        query = select(*_LISTING_COLUMNS).order_by(Student.id)
+        if q:
+            pattern = _escape_like(q) + "%"
+            # Each prefix is a range scan of its NOCASE index; left as an OR next to ORDER BY id,
+            # SQLite prefers walking the primary key and testing every row
+            matches = union(select(Student.id).where(Student.name.like(pattern, escape="\\")),
+                            select(Student.id).where(Student.roll_number.like(pattern, escape="\\")))
+            query = query.where(Student.id.in_(matches))
+        if after_id is not None:
+            query = query.where(Student.id > after_id)
+        if limit is not None:
+            query = query.limit(limit)
+        return [dict(zip(_LISTING_KEYS, row)) for row in db.execute(query)]
+
+    def get_student_by_roll_number(self, db: Session, roll_number: str) -> Optional[dict]:
+        row = db.execute(select(*_LISTING_COLUMNS).where(Student.roll_number == roll_number)).first()
+        return dict(zip(_LISTING_KEYS, row)) if row else None
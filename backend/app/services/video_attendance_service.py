@@ -0,0 +1,361 @@
+"""
+Attendance from recorded video files, for rooms without a live feed.
+
+Each file is read sequentially with OpenCV. Frames between samples are only grabbed (demuxed),
+not converted, and a sampled frame whose thumbnail barely differs from the last analyzed one
+(a static scene) skips detection, up to scene_max_skip_seconds. Analyzed frames go through the
+same ROI/min-face/section-scoped matching as recognize-frame. Files are processed by a thread
+pool; the models release the GIL during inference.
+
+Attendance rows are stamped with the video time (recording start + frame position), one per
+student per cooldown window, and are idempotent: a row is skipped when the student already has
+one for that camera within the cooldown, so re-processing a recording adds nothing.
+
+Usage (from the repository root):
+    python -m backend.app.services.video_attendance_service room101.mp4 --camera-id Room101 --start 2024-03-04T09:00
+"""
+import argparse
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import cv2
+import numpy as np
+from backend.app.config import config
+from backend.app.services.camera_profiles import camera_profiles
+from backend.app.services.database import SessionLocal, Attendance
+from backend.app.services.event_bus import event_bus, attendance_event
+from backend.app.services.metrics_service import metrics
+from backend.app.services.schedule_service import schedule_service
+from backend.app.services.training_service import TrainingService
+
+
+def parse_recorded_at(value: str) -> datetime:
+    """
+    ISO recording start as naive local time, the way attendance timestamps are stored.
+    An explicit offset or a trailing 'Z' is converted to local time; raises ValueError.
+    """
+    start = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if start.tzinfo is not None:
+        start = start.astimezone().replace(tzinfo=None)
+    return start
+
+
+class VideoFileProgress:
+    def __init__(self, path: str, camera_id: str, recorded_at: Optional[datetime]):
+        self.path = path
+        self.camera_id = camera_id
+        self.recorded_at = recorded_at  # None until the worker derives it from the file
+        self.status = "queued"  # queued -> running -> done | failed
+        self.error: Optional[str] = None
+        self.total_frames = 0
+        self.video_fps = 0.0
+        self.frames_read = 0
+        self.frames_sampled = 0
+        self.frames_analyzed = 0
+        self.frames_skipped_static = 0
+        self.faces = 0
+        self.students: Dict[int, datetime] = {}  # student_id -> first sighting (video time)
+        self.attendance_created = 0
+        self.attendance_existing = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "file": os.path.basename(self.path),
+            "camera_id": self.camera_id,
+            "recorded_at": self.recorded_at.isoformat() if self.recorded_at else None,
+            "status": self.status,
+            "error": self.error,
+            "progress": round(self.frames_read / self.total_frames, 4) if self.total_frames else None,
+            "video_fps": round(self.video_fps, 2),
+            "frames_read": self.frames_read,
+            "frames_sampled": self.frames_sampled,
+            "frames_analyzed": self.frames_analyzed,
+            "frames_skipped_static": self.frames_skipped_static,
+            "faces": self.faces,
+            "students_seen": len(self.students),
+            "attendance_created": self.attendance_created,
+            "attendance_existing": self.attendance_existing,
+            "elapsed_seconds": round(elapsed, 3),
+            "frames_per_second": round(self.frames_read / elapsed, 2) if elapsed else 0.0,
+            "analyzed_per_second": round(self.frames_analyzed / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class VideoJob:
+    def __init__(self, files: List[VideoFileProgress], cleanup: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.files = files
+        self.cleanup = cleanup  # delete uploaded files when done
+        self.created_at = datetime.now()
+
+    @property
+    def status(self) -> str:
+        states = {f.status for f in self.files}
+        if states <= {"queued"}:
+            return "queued"
+        if states & {"queued", "running"}:
+            return "running"
+        return "failed" if "failed" in states else "done"
+
+    @property
+    def finished_at(self) -> Optional[float]:
+        """When the last file finished, or None while any file is queued or running"""
+        if any(f.finished_at is None for f in self.files):
+            return None
+        return max((f.finished_at for f in self.files), default=time.time())
+
+    def to_dict(self) -> Dict[str, Any]:
+        frames = sum(f.frames_read for f in self.files)
+        started = [f.started_at for f in self.files if f.started_at]
+        finished = [f.finished_at or time.time() for f in self.files if f.started_at]
+        elapsed = max(finished) - min(started) if started else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "frames_read": frames,
+            "frames_per_second": round(frames / elapsed, 2) if elapsed else 0.0,
+            "attendance_created": sum(f.attendance_created for f in self.files),
+            "files": [f.to_dict() for f in self.files],
+        }
+
+
+class VideoAttendanceService:
+    def __init__(self, settings: Dict[str, Any] = None):
+        settings = settings or {}
+        self.sample_fps = settings.get('sample_fps', 2)
+        self.scene_change_threshold = settings.get('scene_change_threshold', 3.0)
+        self.scene_max_skip_seconds = settings.get('scene_max_skip_seconds', 10)
+        self.resize_width = settings.get('resize_width', 960)
+        self.max_workers = max(1, settings.get('max_workers', 2))
+        self.job_retention_seconds = settings.get('job_retention_minutes', 60) * 60
+        self.max_finished_jobs = max(0, settings.get('max_finished_jobs', 100))
+        self.cooldown = timedelta(minutes=config.get('attendance.cooldown_minutes', 5))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, VideoJob] = {}
+        self._lock = threading.Lock()
+        self._record_lock = threading.Lock()
+
+    # -- jobs --------------------------------------------------------------
+
+    @staticmethod
+    def default_start(path: str) -> datetime:
+        """Recording start when none is given: file modification time (end of recording) minus its duration"""
+        capture = cv2.VideoCapture(path)
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 0
+            frames = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+        finally:
+            capture.release()
+        duration = frames / fps if fps > 0 else 0
+        return datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration)
+
+    def submit(self, paths: List[str], camera_id: str, recorded_at: List[Optional[datetime]] = None,
+               recognition_service=None, cleanup: bool = False) -> VideoJob:
+        """
+        Queue files for processing on the worker pool; returns the job to poll. Does no file I/O:
+        a missing recorded_at is derived from the file (default_start) on the worker.
+        """
+        recorded_at = recorded_at or [None] * len(paths)
+        files = [VideoFileProgress(path, str(camera_id), start) for path, start in zip(paths, recorded_at)]
+        job = VideoJob(files, cleanup=cleanup)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="video")
+            self._prune_jobs()
+            self._jobs[job.id] = job
+        for progress in files:
+            self._executor.submit(self._run_file, progress, job, recognition_service)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[VideoJob]:
+        with self._lock:
+            self._prune_jobs()
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._prune_jobs()
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    def _prune_jobs(self):
+        """
+        Forget finished jobs after job_retention_minutes, and the oldest finished ones beyond
+        max_finished_jobs; queued and running jobs are always kept. Call with self._lock held.
+        """
+        finished = sorted((job.finished_at, job_id) for job_id, job in self._jobs.items()
+                          if job.finished_at is not None)
+        cutoff = time.time() - self.job_retention_seconds
+        excess = len(finished) - self.max_finished_jobs
+        for index, (finished_at, job_id) in enumerate(finished):
+            if finished_at < cutoff or index < excess:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_file(self, progress: VideoFileProgress, job: VideoJob, recognition_service):
+        try:
+            if recognition_service is None:
+                from backend.app.services.model_registry import model_registry
+                recognition_service = model_registry.get(wait=config.get('startup.model_wait_seconds', 0) or 600)
+            if progress.recorded_at is None:
+                progress.recorded_at = self.default_start(progress.path)
+            self.process_file(progress, recognition_service)
+        except Exception as e:
+            progress.status = "failed"
+            progress.error = f"{type(e).__name__}: {e}"
+            progress.finished_at = time.time()
+            print(f"[!] Video {progress.path} failed: {progress.error}")
+        finally:
+            if job.cleanup and os.path.exists(progress.path):
+                os.remove(progress.path)
+
+    # -- processing --------------------------------------------------------
+
+    @staticmethod
+    def _thumbnail(frame: np.ndarray) -> np.ndarray:
+        small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def process_file(self, progress: VideoFileProgress, recognition_service):
+        """Sample, analyze and record attendance for one file, updating `progress` as it goes"""
+        progress.status = "running"
+        progress.started_at = time.time()
+        capture = cv2.VideoCapture(progress.path)
+        if not capture.isOpened():
+            raise ValueError(f"Could not open video {progress.path}")
+        db = SessionLocal()
+        try:
+            progress.video_fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+            progress.total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            step = max(1, int(round(progress.video_fps / self.sample_fps))) if self.sample_fps else 1
+            registered_students = None
+            if not getattr(recognition_service, "owns_gallery", False):
+                registered_students = TrainingService(recognition_service).load_all_student_embeddings(db)
+            profile = camera_profiles.get(progress.camera_id)
+
+            last_thumbnail, last_analyzed_at = None, None
+            index = -1
+            while capture.grab():
+                index += 1
+                progress.frames_read += 1
+                if index % step:
+                    continue  # grabbed only: no color conversion for frames between samples
+                ok, frame = capture.retrieve()
+                if not ok:
+                    continue
+                progress.frames_sampled += 1
+                offset_seconds = index / progress.video_fps
+                frame_time = progress.recorded_at + timedelta(seconds=offset_seconds)
+
+                # Skip near-identical frames (empty room, nobody moving); re-check periodically
+                thumbnail = self._thumbnail(frame)
+                if (last_thumbnail is not None and self.scene_change_threshold
+                        and offset_seconds - last_analyzed_at < self.scene_max_skip_seconds
+                        and float(np.abs(thumbnail - last_thumbnail).mean()) < self.scene_change_threshold):
+                    progress.frames_skipped_static += 1
+                    continue
+                last_thumbnail, last_analyzed_at = thumbnail, offset_seconds
+
+                h, w = frame.shape[:2]
+                if self.resize_width and w > self.resize_width:
+                    frame = cv2.resize(frame, (self.resize_width, int(h * self.resize_width / w)), interpolation=cv2.INTER_AREA)
+                detect_input, offset = profile.crop(frame)
+                faces, _ = recognition_service.analyze_frame(
+                    frame, registered_students,
+                    max_num=profile.max_faces,
+                    detect_input=detect_input if detect_input is not frame else None,
+                    offset=offset,
+                    min_face_size=profile.min_face_size,
+                    sections=schedule_service.active_sections(db, progress.camera_id, frame_time),
+                )
+                progress.frames_analyzed += 1
+                progress.faces += len(faces)
+                for face in faces:
+                    student_id = face["student_id"]
+                    if student_id is None:
+                        continue
+                    first_seen = progress.students.get(student_id)
+                    if first_seen is None or frame_time - first_seen > self.cooldown:
+                        progress.students[student_id] = frame_time
+                        self._record(db, progress, face, frame_time)
+        finally:
+            capture.release()
+            db.close()
+        progress.status = "done"
+        progress.finished_at = time.time()
+
+    def _record(self, db, progress: VideoFileProgress, face: Dict[str, Any], timestamp: datetime):
+        """Insert an attendance row unless the student already has one for this camera within the cooldown"""
+        student_id = face["student_id"]
+        # Workers processing recordings of the same room must not both insert the same sighting
+        with self._record_lock:
+            existing = db.query(Attendance.id).filter(
+                Attendance.student_id == student_id,
+                Attendance.camera_id == progress.camera_id,
+                Attendance.timestamp > timestamp - self.cooldown,
+                Attendance.timestamp < timestamp + self.cooldown,
+            ).first()
+            if existing is not None:
+                progress.attendance_existing += 1
+                return
+            attendance = Attendance(student_id=student_id, camera_id=progress.camera_id, timestamp=timestamp)
+            db.add(attendance)
+            db.commit()
+        progress.attendance_created += 1
+        metrics.inc("attendance_records_total", source="video")
+        event_bus.publish("attendance", attendance_event(
+            attendance, source="video", student_name=face["name"], roll_number=face["roll_number"]
+        ), camera_id=progress.camera_id)
+
+
+video_attendance_service = VideoAttendanceService(config.get_section('video_attendance'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record attendance from recorded video files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--camera-id", required=True, help="Camera (room) the recordings come from")
+    parser.add_argument("--start", action="append", type=parse_recorded_at,
+                        help="Recording start time (ISO), once per file; default: file mtime minus duration")
+    parser.add_argument("--sample-fps", type=float, default=video_attendance_service.sample_fps)
+    parser.add_argument("--workers", type=int, default=video_attendance_service.max_workers)
+    args = parser.parse_args(argv)
+    if args.start and len(args.start) != len(args.files):
+        parser.error("give --start once per file")
+
+    from backend.app.services.database import create_db_and_tables
+    from backend.app.services.model_registry import model_registry
+    create_db_and_tables()
+    service = VideoAttendanceService({**config.get_section('video_attendance'),
+                                      "sample_fps": args.sample_fps, "max_workers": args.workers})
+    job = service.submit(args.files, args.camera_id, args.start, recognition_service=model_registry.get(wait=600))
+    while job.status in ("queued", "running"):
+        time.sleep(2)
+        state = job.to_dict()
+        for f in state["files"]:
+            done = f"{f['progress']:.0%}" if f["progress"] is not None else f"{f['frames_read']} frames"
+            print(f"  {f['file']}: {f['status']} {done}, {f['frames_per_second']} frames/s, "
+                  f"{f['students_seen']} students, {f['attendance_created']} new records")
+    state = job.to_dict()
+    print(f"{'✓' if state['status'] == 'done' else '✗'} {len(state['files'])} file(s), {state['frames_read']} frames at "
+          f"{state['frames_per_second']} frames/s, {state['attendance_created']} attendance records")
+    for f in state["files"]:
+        if f["error"]:
+            print(f"  {f['file']}: {f['error']}")
+    service.shutdown()
+    return 0 if state["status"] == "done" else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,280 @@
+"""
+INT8 dynamic quantization of the local face model pack, with an accuracy and latency check.
+
+Writes a copy of the model pack (e.g. models/models/buffalo_l -> models/models/buffalo_l_int8)
+in which the selected models (the ArcFace recognizer by default) are quantized with
+onnxruntime.quantization.quantize_dynamic and the rest are copied unchanged. Both versions are
+then run on the same face crops with the configured CPU session profile, comparing:
+
+  - embedding cosine similarity between the float and INT8 recognizer
+  - match decisions: for every pair of crops, whether (1 - similarity) < threshold agrees
+  - nearest-neighbour agreement between the two embedding sets
+  - detector box count and IoU agreement (when the detector is quantized too)
+  - mean / p95 latency per model
+
+and prints a JSON report ending in a "safe_to_deploy" verdict (exit code 1 when it fails).
+Face crops come from --images (default ./student_photos); without usable photos synthetic
+crops are used and the verdict is only indicative.
+
+To deploy, set face_recognition.model_name to the new pack name in config.yaml.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.quantize_models
+    python -m backend.benchmarks.quantize_models --tasks recognition detection --images ./student_photos
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backend.app.config import config
+from backend.app.services.recognition_service import cpu_session_options
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def classify_model(path):
+    """Task of an insightface model file, using the same shape rules as insightface's model router"""
+    import onnxruntime
+    session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+    inputs, outputs = session.get_inputs(), session.get_outputs()
+    shape = inputs[0].shape
+    if len(outputs) >= 5:
+        return "detection"
+    if len(shape) == 4 and isinstance(shape[2], int) and shape[2] == shape[3]:
+        if shape[2] == 192:
+            return "landmark"
+        if shape[2] == 96:
+            return "genderage"
+        if len(inputs) == 1 and shape[2] >= 112 and shape[2] % 16 == 0:
+            return "recognition"
+    return "other"
+
+
+def quantize_pack(src_dir, dst_dir, tasks, per_channel, weight_type):
+    """Copy the pack to dst_dir, quantizing models whose task is in `tasks`"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    os.makedirs(dst_dir, exist_ok=True)
+    files = {}
+    for src in sorted(glob.glob(os.path.join(src_dir, "*.onnx"))):
+        dst = os.path.join(dst_dir, os.path.basename(src))
+        task = classify_model(src)
+        if task in tasks:
+            quantize_dynamic(src, dst, per_channel=per_channel,
+                             weight_type=QuantType.QUInt8 if weight_type == "quint8" else QuantType.QInt8)
+            action = "quantized"
+        else:
+            shutil.copy2(src, dst)
+            action = "copied"
+        files[task] = files.get(task) or {
+            "task": task, "action": action, "float": src, "int8": dst,
+            "float_mb": round(os.path.getsize(src) / 1e6, 2), "int8_mb": round(os.path.getsize(dst) / 1e6, 2),
+        }
+    return files
+
+
+def _session(path, profile):
+    import onnxruntime
+    return onnxruntime.InferenceSession(path, sess_options=cpu_session_options(profile), providers=["CPUExecutionProvider"])
+
+
+def _latency(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"mean_ms": round(statistics.fmean(samples), 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)}
+
+
+def load_images(images_dir, limit):
+    paths = sorted(p for p in Path(images_dir).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS) if images_dir and Path(images_dir).is_dir() else []
+    images = []
+    for path in paths[:limit]:
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def face_crops(images, detector, count, seed=0):
+    """112x112 aligned crops of the largest face per image; synthetic crops if none are found"""
+    from insightface.utils import face_align
+    crops = []
+    for image in images:
+        bboxes, kpss = detector.detect(image, max_num=1, metric='default')
+        if bboxes.shape[0] and kpss is not None:
+            crops.append(face_align.norm_crop(image, landmark=kpss[0]))
+    if crops:
+        return crops, False
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        small = rng.integers(0, 255, (14, 14, 3), dtype=np.uint8)
+        crops.append(cv2.resize(small, (112, 112), interpolation=cv2.INTER_CUBIC))
+    return crops, True
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare_recognition(float_model, int8_model, crops, threshold, repeat):
+    float_emb = np.stack([float_model.get_feat(crop).flatten() for crop in crops])
+    int8_emb = np.stack([int8_model.get_feat(crop).flatten() for crop in crops])
+    float_emb /= np.linalg.norm(float_emb, axis=1, keepdims=True)
+    int8_emb /= np.linalg.norm(int8_emb, axis=1, keepdims=True)
+
+    cosine = np.sum(float_emb * int8_emb, axis=1)
+    float_sim = float_emb @ float_emb.T
+    int8_sim = int8_emb @ int8_emb.T
+    upper = np.triu_indices(len(crops), k=1)
+    decisions = (1 - float_sim[upper] < threshold) == (1 - int8_sim[upper] < threshold)
+    report = {
+        "samples": len(crops),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        "decision_agreement": round(float(decisions.mean()), 5) if decisions.size else 1.0,
+        "pairs": int(decisions.size),
+    }
+    if len(crops) > 1:
+        np.fill_diagonal(float_sim, -np.inf)
+        np.fill_diagonal(int8_sim, -np.inf)
+        report["nearest_neighbour_agreement"] = round(float(np.mean(float_sim.argmax(1) == int8_sim.argmax(1))), 5)
+    report["float_latency"] = _latency(lambda: float_model.get_feat(crops[0]), repeat)
+    report["int8_latency"] = _latency(lambda: int8_model.get_feat(crops[0]), repeat)
+    return report
+
+
+def compare_detection(float_model, int8_model, images, repeat):
+    counts_equal, ious = [], []
+    for image in images:
+        float_boxes, _ = float_model.detect(image, metric='default')
+        int8_boxes, _ = int8_model.detect(image, metric='default')
+        counts_equal.append(len(float_boxes) == len(int8_boxes))
+        for box in float_boxes:
+            ious.append(max((_iou(box, other) for other in int8_boxes), default=0.0))
+    return {
+        "images": len(images),
+        "count_agreement": round(float(np.mean(counts_equal)), 5) if counts_equal else None,
+        "iou_mean": round(float(np.mean(ious)), 5) if ious else None,
+        "float_latency": _latency(lambda: float_model.detect(images[0], metric='default'), repeat),
+        "int8_latency": _latency(lambda: int8_model.detect(images[0], metric='default'), repeat),
+    }
+
+
+def main(argv=None):
+    fr_config = config.get_section('face_recognition')
+    model_name = fr_config.get('model_name', 'buffalo_l')
+    model_root = os.path.expanduser(fr_config.get('model_path', './models'))
+    det_size = tuple(fr_config.get('detection', {}).get('det_size_cpu', [192, 192]))
+
+    parser = argparse.ArgumentParser(description="INT8 dynamic quantization with a float vs INT8 comparison")
+    parser.add_argument("--model-dir", default=os.path.join(model_root, "models", model_name),
+                        help="Float model pack directory")
+    parser.add_argument("--output-dir", help="Quantized pack directory (default: <model-dir>_int8)")
+    parser.add_argument("--tasks", nargs="+", default=["recognition"], choices=["recognition", "detection"],
+                        help="Models to quantize; the detector usually loses more accuracy than it gains")
+    parser.add_argument("--weight-type", choices=["qint8", "quint8"], default="qint8")
+    parser.add_argument("--per-channel", action="store_true", help="Per-channel weight scales (more accurate, slower to quantize)")
+    parser.add_argument("--images", default=config.get('student_photos.directory', './student_photos'),
+                        help="Photos used for the comparison")
+    parser.add_argument("--samples", type=int, default=64, help="Maximum photos/crops to compare")
+    parser.add_argument("--repeat", type=int, default=30, help="Latency iterations per model")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Minimum per-crop float/INT8 embedding cosine")
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="Minimum match-decision agreement")
+    parser.add_argument("--max-latency-ratio", type=float, default=1.0, help="INT8/float latency must not exceed this")
+    parser.add_argument("--skip-quantize", action="store_true", help="Only compare an existing --output-dir")
+    args = parser.parse_args(argv)
+
+    from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+    from insightface.model_zoo.scrfd import SCRFD
+
+    output_dir = args.output_dir or args.model_dir.rstrip("/\\") + "_int8"
+    if not os.path.isdir(args.model_dir):
+        print(f"✗ Model pack not found: {args.model_dir}")
+        return 2
+    if args.skip_quantize:
+        files = {}
+        for src in sorted(glob.glob(os.path.join(args.model_dir, "*.onnx"))):
+            dst = os.path.join(output_dir, os.path.basename(src))
+            files.setdefault(classify_model(src), {"float": src, "int8": dst, "action": "existing"})
+    else:
+        files = quantize_pack(args.model_dir, output_dir, set(args.tasks), args.per_channel, args.weight_type)
+
+    profile = fr_config.get('cpu_profile', {})
+    threshold = fr_config.get('recognition', {}).get('similarity_threshold', 0.6)
+    report = {"model_dir": args.model_dir, "output_dir": output_dir, "tasks": args.tasks,
+              "cpu_profile": profile, "files": files, "checks": {}}
+
+    images = load_images(args.images, args.samples)
+    detector = None
+    if "detection" in files:
+        detector = SCRFD(model_file=files["detection"]["float"], session=_session(files["detection"]["float"], profile))
+        detector.prepare(-1, input_size=det_size)
+
+    if "recognition" in files:
+        crops, synthetic = face_crops(images, detector, args.samples) if detector else face_crops([], None, args.samples)
+        float_model = ArcFaceONNX(model_file=files["recognition"]["float"], session=_session(files["recognition"]["float"], profile))
+        int8_model = ArcFaceONNX(model_file=files["recognition"]["int8"], session=_session(files["recognition"]["int8"], profile))
+        float_model.prepare(-1)
+        int8_model.prepare(-1)
+        report["checks"]["recognition"] = {"synthetic_inputs": synthetic,
+                                           **compare_recognition(float_model, int8_model, crops, threshold, args.repeat)}
+
+    if "detection" in files and "detection" in args.tasks:
+        det_images = images or [cv2.resize(np.random.default_rng(0).integers(0, 255, (60, 80, 3), dtype=np.uint8), (640, 480))]
+        int8_detector = SCRFD(model_file=files["detection"]["int8"], session=_session(files["detection"]["int8"], profile))
+        int8_detector.prepare(-1, input_size=det_size)
+        report["checks"]["detection"] = compare_detection(detector, int8_detector, det_images, args.repeat)
+
+    reasons = []
+    recognition = report["checks"].get("recognition")
+    if recognition:
+        if recognition["cosine_min"] < args.min_cosine:
+            reasons.append(f"recognizer cosine_min {recognition['cosine_min']} < {args.min_cosine}")
+        if recognition["decision_agreement"] < args.min_agreement:
+            reasons.append(f"match decision agreement {recognition['decision_agreement']} < {args.min_agreement}")
+        ratio = recognition["int8_latency"]["mean_ms"] / max(recognition["float_latency"]["mean_ms"], 1e-6)
+        recognition["latency_ratio"] = round(ratio, 3)
+        if ratio > args.max_latency_ratio:
+            reasons.append(f"recognizer INT8 latency ratio {ratio:.2f} > {args.max_latency_ratio}")
+        if recognition["synthetic_inputs"]:
+            reasons.append("no face photos found; comparison used synthetic crops")
+    detection = report["checks"].get("detection")
+    if detection:
+        if detection["count_agreement"] is not None and detection["count_agreement"] < args.min_agreement:
+            reasons.append(f"detector box count agreement {detection['count_agreement']} < {args.min_agreement}")
+        ratio = detection["int8_latency"]["mean_ms"] / max(detection["float_latency"]["mean_ms"], 1e-6)
+        detection["latency_ratio"] = round(ratio, 3)
+        if ratio > args.max_latency_ratio:
+            reasons.append(f"detector INT8 latency ratio {ratio:.2f} > {args.max_latency_ratio}")
+    if not report["checks"]:
+        reasons.append("no quantized model was compared")
+
+    report["safe_to_deploy"] = not reasons
+    report["reasons"] = reasons
+    print(json.dumps(report, indent=2))
+    if report["safe_to_deploy"]:
+        print(f"\n✓ Safe to deploy: set face_recognition.model_name to \"{os.path.basename(output_dir.rstrip('/'))}\"")
+    else:
+        print("\n✗ Not safe to deploy: " + "; ".join(reasons))
+    return 0 if report["safe_to_deploy"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+Offline micro-benchmarks for the attendance backend.
+Runs against a throwaway SQLite database with a FaceRecognitionService built on
+StubFaceAnalysis installed in the model registry, so no model files or GPU are needed.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.run_benchmarks                  # full run, saved to backend/benchmarks/results/
+    python -m backend.benchmarks.run_benchmarks --quick          # smaller sizes
+
+Timings only compare on the same machine, so no baseline is committed. Record one before a change
+and compare against it afterwards:
+    python -m backend.benchmarks.run_benchmarks --only find_match --output backend/benchmarks/results/before.json
+    python -m backend.benchmarks.run_benchmarks --only find_match --compare backend/benchmarks/results/before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# The database URL is read when backend.app.services.database is imported, so point it
+# at a scratch file before any backend module is loaded.
+_tmp_dir = tempfile.mkdtemp(prefix="attendance_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+
+import numpy as np
+import cv2
+
+from backend.benchmarks.stub_face_model import StubFaceAnalysis, make_identities
+from backend.app.services.recognition_service import FaceRecognitionService
+from backend.app.services.model_registry import model_registry
+
+model_registry.set_service(FaceRecognitionService(face_app=StubFaceAnalysis()))
+
+from backend.app.services.database import Base, engine, SessionLocal, Student, Attendance, create_db_and_tables
+
+
+def measure(fn, repeat=20, warmup=2):
+    """Run fn repeat times and return latency statistics in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+        "repeat": repeat,
+    }
+
+
+def reset_database():
+    Base.metadata.drop_all(bind=engine)
+    create_db_and_tables()
+
+
+def seed_students(count, identities=None):
+    """Insert `count` students with embeddings (bulk, outside the timed section)"""
+    identities = identities if identities is not None else make_identities(count)
+    db = SessionLocal()
+    try:
+        rows = []
+        for i in range(count):
+            student = Student(name=f"Student {i:06d}", roll_number=f"R{i:06d}", email=f"s{i}@example.com",
+                              photo_path=f"./student_photos/R{i:06d}_1.jpg")
+            student.set_embedding(identities[i])
+            rows.append(student)
+        db.add_all(rows)
+        db.commit()
+    finally:
+        db.close()
+    return identities
+
+
+def seed_attendance(count, student_count):
+    db = SessionLocal()
+    try:
+        start = datetime(2024, 1, 1)
+        db.bulk_insert_mappings(Attendance, [
+            {"student_id": (i % student_count) + 1, "timestamp": start + timedelta(seconds=30 * i), "camera_id": str(i % 8)}
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def synthetic_frame(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buffer.tobytes()
+
+
+class BenchmarkContext:
+    """Lazily imports the app and shares it between benchmarks"""
+    def __init__(self, quick):
+        self.quick = quick
+        self._client = None
+
+    @property
+    def recognition(self):
+        from backend.app.api.v1.endpoints import recognition
+        return recognition
+
+    @property
+    def client(self):
+        if self._client is None:
+            from fastapi.testclient import TestClient
+            from backend.app.main import app
+            self._client = TestClient(app)
+        return self._client
+
+
+def bench_find_match(ctx):
+    service = model_registry.get()
+    results = []
+    sizes = [100, 1000] if ctx.quick else [100, 1000, 5000, 20000]
+    for size in sizes:
+        identities = make_identities(size)
+        # Sections of 50 students, as a camera schedule would scope them
+        students = [{"id": i, "name": f"Student {i}", "roll_number": f"R{i}", "section": f"S{i // 50}",
+                     "embedding": identities[i]} for i in range(size)]
+        rng = np.random.default_rng(1)
+        query = identities[size // 2] + rng.normal(0, 0.02, identities.shape[1]).astype(np.float32)
+        repeat = 20 if size <= 1000 else 5
+        stats = measure(lambda: service.find_match(query, students), repeat=repeat, warmup=1)
+        results.append({"params": {"gallery_size": size, "scope": "full"}, **stats})
+        section = (students[size // 2]["section"],)
+        stats = measure(lambda: service.find_match(query, students, sections=section), repeat=repeat, warmup=1)
+        results.append({"params": {"gallery_size": size, "scope": "section"}, **stats})
+    return results
+
+
+def bench_gallery_precision(ctx):
+    """float16/int8 gallery matrices vs float32: memory, batched match latency and decision agreement"""
+    from backend.app.services import embedding_codec
+    service = model_registry.get()
+    saved = service.gallery_precision
+    results = []
+    sizes = [1000, 10000] if ctx.quick else [1000, 10000, 100000]
+    for size in sizes:
+        identities = make_identities(size)
+        students = [{"id": i, "name": f"Student {i}", "roll_number": f"R{i}", "embedding": identities[i]} for i in range(size)]
+        rng = np.random.default_rng(2)
+        # Enrolled faces at varying noise (cosine 0.3-0.9, straddling the threshold) plus strangers
+        known = rng.integers(0, size, 48)
+        noise = rng.uniform(0.02, 0.12, (48, 1)).astype(np.float32)
+        queries = list(identities[known] + rng.normal(0, 1, (48, identities.shape[1])).astype(np.float32) * noise)
+        queries += list(rng.normal(0, 1, (16, identities.shape[1])).astype(np.float32))
+        normalized = np.stack(queries) / np.linalg.norm(np.stack(queries), axis=1, keepdims=True)
+
+        baseline = None
+        for precision in ("float32", "float16", "int8"):
+            service.gallery_precision = precision
+            gallery = list(students)  # new list: the service rebuilds its matrix
+            matches = service.match_many(queries, gallery)
+            matrix = service._gallery[3]
+            decisions = [student["id"] if student else None for student, _ in matches]
+            approx_top1 = matrix.similarities(normalized).argmax(axis=1)
+            if baseline is None:
+                baseline = (decisions, approx_top1)
+            stats = measure(lambda: service.match_many(queries, gallery), repeat=10 if size > 10000 else 20, warmup=1)
+            results.append({
+                "params": {"gallery_size": size, "precision": precision, "queries": len(queries)},
+                **stats,
+                "matrix_bytes": matrix.nbytes,
+                "blob_bytes_per_student": len(embedding_codec.encode(identities[0], precision)),
+                "agreement": round(float(np.mean([a == b for a, b in zip(decisions, baseline[0])])), 4),
+                "top1_agreement_before_rerank": round(float(np.mean(approx_top1 == baseline[1])), 4),
+            })
+    service.gallery_precision = saved
+    return results
+
+
+def bench_student_cache_load(ctx):
+    results = []
+    sizes = [100, 1000] if ctx.quick else [100, 1000, 10000]
+    for size in sizes:
+        reset_database()
+        seed_students(size)
+        training_service = ctx.recognition.training_service
+
+        def load():
+            db = SessionLocal()
+            try:
+                training_service.load_all_student_embeddings(db)
+            finally:
+                db.close()
+        stats = measure(load, repeat=5 if size > 1000 else 10, warmup=1)
+        results.append({"params": {"students": size}, **stats})
+    return results
+
+
+def bench_recognize_frame(ctx):
+    results = []
+    reset_database()
+    identities = seed_students(200 if ctx.quick else 1000)
+    StubFaceAnalysis.identities = identities
+    recognition = ctx.recognition
+    recognition._student_cache["data"] = None
+    client = ctx.client
+    resolutions = [(640, 480), (1280, 720)] if ctx.quick else [(640, 480), (1280, 720), (1920, 1080)]
+    # The same bytes are posted every iteration, so the repeated-upload result cache is turned
+    # off to measure the full pipeline, then measured on its own
+    from backend.app.services.frame_result_cache import frame_result_cache
+    cache_size = frame_result_cache.max_entries
+    for width, height in resolutions:
+        frame = synthetic_frame(width, height)
+
+        def post():
+            response = client.post("/api/v1/recognition/recognize-frame", params={"camera_id": "bench"},
+                                   files={"file": ("frame.jpg", frame, "image/jpeg")})
+            assert response.status_code == 200, response.text
+        for cached in (False, True):
+            frame_result_cache.max_entries = cache_size if cached else 0
+            frame_result_cache.invalidate()
+            stats = measure(post, repeat=10 if ctx.quick else 30)
+            params = {"resolution": f"{width}x{height}", "faces": StubFaceAnalysis.faces_per_frame}
+            if cached:
+                params["repeated_upload_cache"] = True
+            results.append({"params": params, **stats})
+    frame_result_cache.max_entries = cache_size
+    return results
+
+
+def bench_decode(ctx):
+    """Full decode + resize vs. the image_ingest reduced-scale decode, down to the default resize width"""
+    from backend.app.services.image_ingest import image_ingest
+    target = 480
+    results = []
+    resolutions = [(640, 480), (1920, 1080), (3840, 2160)] if ctx.quick else [(640, 480), (1280, 720), (1920, 1080), (2592, 1944), (3840, 2160)]
+    for width, height in resolutions:
+        data = synthetic_frame(width, height)
+
+        def full():
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image.shape[1] > target:
+                image = cv2.resize(image, (target, int(image.shape[0] * target / image.shape[1])), interpolation=cv2.INTER_LINEAR)
+
+        def reduced():
+            image, _ = image_ingest.decode(data, min_width=target)
+            if image.shape[1] > target:
+                image = cv2.resize(image, (target, int(image.shape[0] * target / image.shape[1])), interpolation=cv2.INTER_LINEAR)
+
+        reduction = image_ingest.decode(data, min_width=target)[1]["reduction"]
+        for mode, fn in (("full", full), ("reduced", reduced)):
+            stats = measure(fn, repeat=10 if ctx.quick else 30)
+            results.append({"params": {"mode": mode, "resolution": f"{width}x{height}", "reduction": reduction if mode == "reduced" else 1}, **stats})
+    return results
+
+
+def bench_attendance_insert(ctx):
+    results = []
+    reset_database()
+    seed_students(100)
+    count = 200 if ctx.quick else 1000
+
+    def insert_committing_each():
+        db = SessionLocal()
+        try:
+            for i in range(count):
+                db.add(Attendance(student_id=(i % 100) + 1, camera_id="bench"))
+                db.commit()
+        finally:
+            db.close()
+
+    def insert_single_commit():
+        db = SessionLocal()
+        try:
+            db.add_all([Attendance(student_id=(i % 100) + 1, camera_id="bench") for i in range(count)])
+            db.commit()
+        finally:
+            db.close()
+
+    for mode, fn in (("commit_each", insert_committing_each), ("single_commit", insert_single_commit)):
+        stats = measure(fn, repeat=3, warmup=0)
+        stats["rows_per_second"] = round(count / (stats["mean_ms"] / 1000), 1)
+        results.append({"params": {"mode": mode, "rows": count}, **stats})
+    return results
+
+
+def bench_attendance_listing(ctx):
+    results = []
+    client = ctx.client
+    row_counts = [1000, 10000] if ctx.quick else [1000, 10000, 50000]
+    for rows in row_counts:
+        reset_database()
+        seed_students(500)
+        seed_attendance(rows, 500)
+        for skip in (0, rows // 2):
+            stats = measure(lambda: client.get("/api/v1/attendance/", params={"skip": skip, "limit": 100}), repeat=10)
+            results.append({"params": {"endpoint": "list", "rows": rows, "skip": skip}, **stats})
+        stats = measure(lambda: client.get("/api/v1/attendance/export/csv"), repeat=3, warmup=1)
+        results.append({"params": {"endpoint": "export_csv", "rows": rows}, **stats})
+    return results
+
+
+BENCHMARKS = {
+    "find_match": bench_find_match,
+    "gallery_precision": bench_gallery_precision,
+    "student_cache_load": bench_student_cache_load,
+    "recognize_frame": bench_recognize_frame,
+    "decode": bench_decode,
+    "attendance_insert": bench_attendance_insert,
+    "attendance_listing": bench_attendance_listing,
+}
+
+
+def _result_key(benchmark, params):
+    return benchmark + " " + json.dumps(params, sort_keys=True)
+
+
+def compare(current, baseline, threshold):
+    """Print mean latency change per benchmark; return the keys that regressed by more than threshold"""
+    previous = {_result_key(r["benchmark"], r["params"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'benchmark':<70} {'baseline':>10} {'current':>10} {'change':>8}")
+    for result in current["results"]:
+        key = _result_key(result["benchmark"], result["params"])
+        old = previous.get(key)
+        if old is None:
+            continue
+        change = (result["mean_ms"] - old["mean_ms"]) / old["mean_ms"] if old["mean_ms"] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{key:<70} {old['mean_ms']:>10.3f} {result['mean_ms']:>10.3f} {change:>+7.1%}{flag}")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks with a stub face model")
+    parser.add_argument("--quick", action="store_true", help="Use smaller sizes")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--output", help="Result file (default: backend/benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Baseline result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    ctx = BenchmarkContext(args.quick)
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "quick": args.quick,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "results": [],
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"Running {name}...")
+        for result in BENCHMARKS[name](ctx):
+            result = {"benchmark": name, **result}
+            report["results"].append(result)
+            print(f"  {json.dumps(result['params'], sort_keys=True):<55} mean {result['mean_ms']:.3f} ms  p95 {result['p95_ms']:.3f} ms")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\n✓ Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Startup profile for the API: import cost of backend.app.main and time-to-first-response.
+
+1. Imports backend.app.main in a fresh interpreter with `-X importtime` and reports the
+   slowest modules and top-level packages, failing if a module listed in --forbid
+   (heavy model libraries by default) is imported just by loading the app.
+2. Starts uvicorn in a subprocess and measures how long it takes until /health answers,
+   until a route that needs no model (/api/v1/attendance/) answers, and optionally until
+   the face models report ready on /health/ready.
+
+Prints a JSON report and exits non-zero when a budget is exceeded, so it can gate CI.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.startup_profile
+    python -m backend.benchmarks.startup_profile --max-first-response 3 --output startup.json
+    python -m backend.benchmarks.startup_profile --wait-models 120
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_FORBIDDEN = ["insightface", "onnxruntime", "scipy", "torch", "ultralytics", "PIL"]
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _scratch_env():
+    """Environment for child processes: repo on the path and a throwaway database"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(REPO_ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='attendance_startup_')}/startup.db"
+    return env
+
+
+def profile_imports(module, top, forbidden):
+    """Import `module` with -X importtime and summarize where the time goes"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_ROOT, env=_scratch_env(), capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)), int(match.group(2))))
+
+    packages = {}
+    for name, self_us, _ in modules:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    imported = {name.split(".")[0] for name, _, _ in modules}
+    total_us = next((cumulative for name, _, cumulative in modules if name == module), sum(packages.values()))
+
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else None,
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(total_us / 1e6, 3),
+        "modules_imported": len(modules),
+        "slowest_modules": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 2), "self_ms": round(self_us / 1000, 2)}
+            for name, self_us, cumulative in sorted(modules, key=lambda m: m[2], reverse=True)[:top]
+        ],
+        "slowest_packages": [
+            {"package": package, "self_ms": round(self_us / 1000, 2)}
+            for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]
+        ],
+        "forbidden_imported": sorted(name for name in forbidden if name in imported),
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url, timeout=1.0):
+    """Return the HTTP status for url, or None if the server is not accepting connections yet"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout, OSError):
+        return None
+
+
+def _wait_for(url, deadline, accept):
+    while time.perf_counter() < deadline:
+        status = _get(url)
+        if status is not None and accept(status):
+            return status
+        time.sleep(0.05)
+    return None
+
+
+def profile_first_response(timeout, wait_models):
+    """Start uvicorn and time the first successful responses"""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    log = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=_scratch_env(), stdout=log, stderr=subprocess.STDOUT,
+    )
+    report = {"port": port}
+    try:
+        deadline = start + timeout
+        status = _wait_for(f"{base}/health", deadline, lambda s: s == 200)
+        report["health_seconds"] = round(time.perf_counter() - start, 3) if status else None
+
+        status = _wait_for(f"{base}/api/v1/attendance/?limit=1", deadline, lambda s: s == 200) if status else None
+        report["first_response_seconds"] = round(time.perf_counter() - start, 3) if status else None
+
+        if wait_models and status:
+            ready = _wait_for(f"{base}/health/ready", start + wait_models, lambda s: s == 200)
+            report["models_ready_seconds"] = round(time.perf_counter() - start, 3) if ready else None
+        if status:
+            try:
+                with urllib.request.urlopen(f"{base}/health", timeout=2) as response:
+                    report["models"] = json.loads(response.read())["models"]
+            except (urllib.error.URLError, OSError, ValueError):
+                pass
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.seek(0)
+        output = log.read().decode(errors="replace").strip().splitlines()
+        log.close()
+    if report.get("first_response_seconds") is None:
+        report["server_output"] = output[-20:]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time and time-to-first-response profile")
+    parser.add_argument("--module", default="backend.app.main", help="Module to import-profile")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules/packages to report")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="Top-level packages that must not be imported by the module")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the first response")
+    parser.add_argument("--wait-models", type=float, default=0,
+                        help="Also wait up to this many seconds for /health/ready (0 to skip)")
+    parser.add_argument("--max-import", type=float, help="Fail if importing the module takes longer (seconds)")
+    parser.add_argument("--max-first-response", type=float, help="Fail if the first response takes longer (seconds)")
+    parser.add_argument("--skip-server", action="store_true", help="Only profile imports")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "imports": profile_imports(args.module, args.top, args.forbid)}
+    if not args.skip_server:
+        report["server"] = profile_first_response(args.timeout, args.wait_models)
+
+    failures = []
+    imports = report["imports"]
+    if not imports["ok"]:
+        failures.append(f"import of {args.module} failed: {imports['error']}")
+    if imports["forbidden_imported"]:
+        failures.append(f"heavy packages imported at startup: {', '.join(imports['forbidden_imported'])}")
+    if args.max_import is not None and imports["import_seconds"] > args.max_import:
+        failures.append(f"import took {imports['import_seconds']}s (budget {args.max_import}s)")
+    server = report.get("server")
+    if server is not None:
+        first = server.get("first_response_seconds")
+        if first is None:
+            failures.append("server did not answer within the timeout")
+        elif args.max_first_response is not None and first > args.max_first_response:
+            failures.append(f"first response took {first}s (budget {args.max_first_response}s)")
+        if args.wait_models and server.get("models_ready_seconds") is None:
+            failures.append("face models were not ready within --wait-models")
+    report["failures"] = failures
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
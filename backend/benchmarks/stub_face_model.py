@@ -0,0 +1,101 @@
+"""
+Deterministic stand-in for insightface.app.FaceAnalysis.
+Emits synthetic faces at fixed positions and embeddings drawn from a known identity set,
+so the recognition pipeline can be benchmarked without model files or a GPU.
+"""
+import zlib
+import numpy as np
+
+
+class StubFace:
+    """Attribute container with the fields the pipeline reads from insightface's Face"""
+    def __init__(self, bbox, kps, det_score):
+        self.bbox = bbox
+        self.kps = kps
+        self.det_score = det_score
+        self.embedding = None
+
+
+class StubDetector:
+    def __init__(self, owner):
+        self.owner = owner
+        self.input_size = None
+        self.session = None
+
+    def prepare(self, ctx_id, input_size=None, det_thresh=0.5, **kwargs):
+        self.input_size = input_size
+
+    def detect(self, img, input_size=None, max_num=0, metric='default'):
+        """Lay out faces_per_frame boxes in a row across the image"""
+        h, w = img.shape[:2]
+        count = self.owner.faces_per_frame
+        if max_num:
+            count = min(count, max_num)
+        size = max(16, min(w // (count + 1), h // 2)) if count else 0
+        bboxes = np.zeros((count, 5), dtype=np.float32)
+        kpss = np.zeros((count, 5, 2), dtype=np.float32)
+        for i in range(count):
+            x1 = (i + 0.5) * w / (count + 1)
+            y1 = h / 4
+            bboxes[i] = [x1, y1, x1 + size, y1 + size, 0.9]
+            kpss[i, :, 0] = x1 + size / 2
+            kpss[i, :, 1] = y1 + size / 2
+        return bboxes, kpss
+
+
+class StubRecognizer:
+    """
+    Embedding for each face is derived from the frame content and face index:
+    with probability known_ratio it is a noisy copy of one of owner.identities, otherwise random.
+    """
+    def __init__(self, owner):
+        self.owner = owner
+        self.taskname = 'recognition'
+
+    def prepare(self, ctx_id, **kwargs):
+        pass
+
+    def get(self, img, face):
+        seed = zlib.crc32(img[::max(1, img.shape[0] // 8), ::max(1, img.shape[1] // 8)].tobytes())
+        seed = (seed + int(face.bbox[0]) * 7919) & 0xFFFFFFFF
+        rng = np.random.default_rng(seed)
+        identities = self.owner.identities
+        if identities is not None and len(identities) and rng.random() < self.owner.known_ratio:
+            base = identities[rng.integers(len(identities))]
+            embedding = base + rng.normal(0, self.owner.noise, base.shape[0]).astype(np.float32)
+        else:
+            embedding = rng.normal(0, 1, self.owner.embedding_size).astype(np.float32)
+        face.embedding = embedding / np.linalg.norm(embedding)
+        return face.embedding
+
+
+class StubFaceAnalysis:
+    """Drop-in for FaceAnalysis(name=..., root=..., providers=...)"""
+    faces_per_frame = 3
+    known_ratio = 0.7
+    noise = 0.02
+    embedding_size = 512
+    identities = None  # (N, embedding_size) unit vectors the stub "recognizes"
+
+    def __init__(self, name=None, root=None, providers=None, **kwargs):
+        self.det_model = StubDetector(self)
+        self.models = {'detection': self.det_model, 'recognition': StubRecognizer(self)}
+
+    def prepare(self, ctx_id, det_thresh=0.5, det_size=(640, 640)):
+        self.det_model.prepare(ctx_id, input_size=det_size, det_thresh=det_thresh)
+
+    def get(self, img, max_num=0):
+        bboxes, kpss = self.det_model.detect(img, max_num=max_num)
+        faces = []
+        for i in range(bboxes.shape[0]):
+            face = StubFace(bbox=bboxes[i, 0:4], kps=kpss[i], det_score=bboxes[i, 4])
+            self.models['recognition'].get(img, face)
+            faces.append(face)
+        return faces
+
+
+def make_identities(count, embedding_size=512, seed=0):
+    """Random unit vectors used both as the enrolled gallery and as the stub's known faces"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(0, 1, (count, embedding_size)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
@@ -1,8 +1,12 @@
 """
 Database Migration Script
 Adds new columns to existing tables:
-- students: roll_number, email, photo_path
+- students: roll_number, email, photo_path, section
 - attendance: camera_id
+adds the indexes used by student search and attendance retention, and creates the camera_schedules table
+
+    python -m backend.migrate_database_schema --reencode-embeddings float16
+rewrites every stored embedding in another format (float32, float16 or int8)
 """
 
 import sqlite3
@@ -54,6 +58,14 @@ def migrate_database():
         else:
             print("✓ photo_path column already exists")
 
+        if 'section' not in students_columns:
+            print("Adding 'section' column to students table...")
+            cursor.execute("ALTER TABLE students ADD COLUMN section TEXT")
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_students_section ON students (section)")
+            print("✓ Added section column")
+        else:
+            print("✓ section column already exists")
+
         # Add new column to attendance table if it doesn't exist
         if 'camera_id' not in attendance_columns:
             print("Adding 'camera_id' column to attendance table...")
@@ -62,6 +74,15 @@ def migrate_database():
         else:
             print("✓ camera_id column already exists")
 
+        # Student search matches name / roll number prefixes case-insensitively
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_students_name_nocase ON students (name COLLATE NOCASE)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_students_roll_number_nocase ON students (roll_number COLLATE NOCASE)")
+        print("✓ student search indexes ready")
+
+        # Retention and date-range queries filter attendance by timestamp
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_attendance_timestamp ON attendance (timestamp)")
+        print("✓ attendance timestamp index ready")
+
         # Update existing students with default roll numbers if needed
         cursor.execute("SELECT id, name FROM students WHERE roll_number IS NULL")
         students_without_roll = cursor.fetchall()
@@ -74,6 +95,12 @@ def migrate_database():
             print("✓ Updated existing students with default roll numbers")
 
         conn.commit()
+
+        # New tables (camera_schedules) are created by SQLAlchemy
+        from backend.app.services.database import create_db_and_tables
+        create_db_and_tables()
+        print("✓ camera_schedules table ready")
+
         print("\n✓ Database migration completed successfully!")
 
     except Exception as e:
@@ -82,5 +109,29 @@ def migrate_database():
     finally:
         conn.close()
 
+def reencode_embeddings(storage):
+    """Rewrite all student embeddings in `storage` format (see embedding_codec)"""
+    from backend.app.services import embedding_codec
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, embedding FROM students WHERE embedding IS NOT NULL")
+        rows = cursor.fetchall()
+        before = sum(len(blob) for _, blob in rows)
+        updates = [(embedding_codec.encode(embedding_codec.decode(blob), storage), student_id) for student_id, blob in rows]
+        cursor.executemany("UPDATE students SET embedding = ? WHERE id = ?", updates)
+        conn.commit()
+        after = sum(len(blob) for blob, _ in updates)
+        print(f"✓ Re-encoded {len(rows)} embeddings as {storage}: {before} -> {after} bytes")
+    except Exception as e:
+        print(f"\n✗ Re-encoding failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
-    migrate_database()
+    import sys
+    if len(sys.argv) == 3 and sys.argv[1] == "--reencode-embeddings":
+        reencode_embeddings(sys.argv[2])
+    else:
+        migrate_database()
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# The SQLAlchemy engine is created when backend.app.services.database is imported; point it
+# at a throwaway file before any test module imports the app
+_TEST_DIR = tempfile.mkdtemp(prefix="face_attendance_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
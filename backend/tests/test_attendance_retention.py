@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import text
+from backend.app.services.database import Attendance, Student, SessionLocal, create_db_and_tables, engine
+from backend.app.services.attendance_retention import AttendanceRetention
+
+
+@pytest.fixture
+def retention(tmp_path):
+    create_db_and_tables()
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM attendance")
+        connection.exec_driver_sql("DELETE FROM students")
+    engine.dispose()  # drop pooled connections that have a previous test's archive attached
+    return AttendanceRetention({"archive_path": str(tmp_path / "archive.db"), "incremental_vacuum": False})
+
+
+def _add_attendance(db, student, when):
+    record = Attendance(student_id=student.id, timestamp=when, camera_id="cam")
+    db.add(record)
+    db.commit()
+    return record.id
+
+
+def _archive(retention):
+    with engine.connect() as connection:
+        retention.attach(connection)
+        return connection.execute(text(
+            "SELECT id, source_id, timestamp FROM archive.attendance_archive ORDER BY id")).all()
+
+
+def test_reused_attendance_ids_do_not_overwrite_archived_rows(retention):
+    db = SessionLocal()
+    student = Student(name="Ada", roll_number="R1")
+    db.add(student)
+    db.commit()
+    old = datetime.now() - timedelta(days=30)
+    ids = [_add_attendance(db, student, old + timedelta(minutes=i)) for i in range(3)]
+
+    # Archive the two newest rows: SQLite hands out the highest freed id again
+    db.query(Attendance).filter(Attendance.id == ids[0]).update({"timestamp": datetime.now()})
+    db.commit()
+    assert retention.run(horizon_days=1)["archived"] == 2
+    reused = _add_attendance(db, student, old + timedelta(hours=1))
+    assert reused in ids[1:]
+
+    retention.run(horizon_days=0)
+    rows = _archive(retention)
+    assert len(rows) == 4
+    assert sorted(row.source_id for row in rows) == sorted(ids + [reused])
+    assert len({row.id for row in rows}) == 4
+    db.close()
+
+
+def test_archived_rows_do_not_reuse_live_ids(retention):
+    db = SessionLocal()
+    student = Student(name="Ada", roll_number="R1")
+    db.add(student)
+    db.commit()
+    archived = _add_attendance(db, student, datetime.now() - timedelta(days=30))
+    retention.run(horizon_days=1)
+    live = _add_attendance(db, student, datetime.now())
+    db.close()
+
+    with engine.connect() as connection:
+        rows = retention.query_rows(connection, include_archived=True)
+    assert [(row["id"], row["archived"]) for row in rows] == [(live, 0), (None, 1)]
+    assert rows[1]["archive_id"] == 1 and rows[0]["archive_id"] is None
+    assert live == archived  # the id SQLite handed out again belongs to the live row only
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from backend.app.services import embedding_codec
+from backend.app.services.embedding_codec import GalleryMatrix
+
+
+@pytest.mark.parametrize("storage, tolerance", [("float32", 0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_encode_decode_round_trip(storage, tolerance):
+    vector = np.random.default_rng(3).normal(size=512).astype(np.float32)
+    blob = embedding_codec.encode(vector, storage)
+    assert embedding_codec.storage_format(blob) == storage
+    decoded = embedding_codec.decode(blob)
+    assert decoded.dtype == np.float32 and decoded.shape == (512,)
+    assert np.abs(decoded - vector).max() <= tolerance * np.abs(vector).max()
+
+
+def test_compact_blobs_are_smaller_and_never_look_like_float32():
+    vector = np.ones(512, dtype=np.float32)
+    sizes = {storage: len(embedding_codec.encode(vector, storage)) for storage in ("float32", "float16", "int8")}
+    assert sizes == {"float32": 2048, "float16": 1029, "int8": 521}
+    # A legacy float32 blob that happens to start with the magic bytes is still float32 (even length)
+    legacy = embedding_codec.MAGIC + b"\x01" + bytes(2043)
+    assert embedding_codec.storage_format(legacy) == "float32"
+
+
+def test_zero_and_missing_embeddings():
+    assert embedding_codec.decode(None) is None
+    assert embedding_codec.decode(b"") is None
+    zero = embedding_codec.decode(embedding_codec.encode(np.zeros(8, dtype=np.float32), "int8"))
+    np.testing.assert_array_equal(zero, np.zeros(8, dtype=np.float32))
+    with pytest.raises(ValueError):
+        embedding_codec.encode(np.ones(8), "bfloat16")
+
+
+def _gallery(rows=300, dim=512, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(rows, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("precision, tolerance", [("float16", 2e-3), ("int8", 2e-2)])
+def test_compact_similarities_track_float32(precision, tolerance):
+    gallery = _gallery()
+    queries = gallery[:16] + _gallery(16, seed=1) * 0.3
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    expected = queries @ gallery.T
+    matrix = GalleryMatrix.build(gallery, precision, chunk_rows=64)
+    native = matrix.similarities(queries)
+    expanded = matrix._expanded_similarities(queries)
+    assert native.dtype == np.float32 and native.shape == expected.shape
+    assert np.abs(native - expected).max() < tolerance
+    assert np.abs(expanded - expected).max() < tolerance
+    assert (native.argmax(axis=1) == np.arange(16)).all()
+
+
+def test_int8_gallery_is_stored_transposed_and_decodes_like_int8_blobs():
+    gallery = _gallery(rows=40, dim=64)
+    matrix = GalleryMatrix.build(gallery, "int8")
+    assert matrix.data.shape == (64, 40) and matrix.data.flags.c_contiguous
+    assert len(matrix) == 40 and matrix.nbytes == 64 * 40 + 40 * 4
+    blob_rows = np.stack([embedding_codec.decode(embedding_codec.encode(row, "int8")) for row in gallery[[3, 7]]])
+    np.testing.assert_allclose(matrix.rows(np.array([3, 7])), blob_rows, atol=1e-6)
+    view = matrix.row_view(7)
+    assert np.shares_memory(view, matrix.data)
+    np.testing.assert_allclose(view / np.linalg.norm(view.astype(np.float32)), gallery[7], atol=2e-2)
+    subset = matrix.take([3, 7, 11])
+    assert subset.data.shape == (64, 3) and subset.data.flags.c_contiguous
+    np.testing.assert_array_equal(subset.rows(np.array([[0, 2]])), matrix.rows(np.array([[3, 11]])))
+    np.testing.assert_allclose(subset.similarities(gallery[[7]]), matrix.similarities(gallery[[7]])[:, [3, 7, 11]])
+
+
+def test_similarities_fall_back_without_onnxruntime(monkeypatch):
+    gallery = _gallery(rows=50, dim=32)
+    monkeypatch.setattr(embedding_codec, "_session", lambda precision, dim: None)
+    for precision in ("float16", "int8"):
+        scores = GalleryMatrix.build(gallery, precision, chunk_rows=16).similarities(gallery[:4])
+        assert np.abs(scores - gallery[:4] @ gallery.T).max() < 2e-2
@@ -0,0 +1,57 @@
+import asyncio
+from backend.app.services.event_bus import EventBus
+
+
+def _subscribe(bus, **kwargs):
+    async def scenario():
+        subscription, replay, reset = bus.subscribe(**kwargs)
+        bus.unsubscribe(subscription)
+        return replay, reset
+    return asyncio.run(scenario())
+
+
+def _publish(bus, count, camera_id="cam"):
+    return [bus.publish("attendance", {"n": i}, camera_id=camera_id) for i in range(count)]
+
+
+def test_last_event_id_replays_only_newer_events():
+    bus = EventBus(replay_size=10)
+    ids = _publish(bus, 3)
+    replay, reset = _subscribe(bus, last_event_id=ids[0])
+    assert not reset
+    assert [message.splitlines()[0] for message in replay] == [f"id: {ids[1]}", f"id: {ids[2]}"]
+    assert _subscribe(bus, last_event_id=ids[2]) == ([], False)
+
+
+def test_replay_respects_the_subscription_filter():
+    bus = EventBus(replay_size=10)
+    first = _publish(bus, 1)[0]
+    _publish(bus, 2, camera_id="other")
+    _publish(bus, 1)
+    replay, reset = _subscribe(bus, camera_id="cam", last_event_id=first)
+    assert not reset and len(replay) == 1 and '"n":0' in replay[0]
+
+
+def test_unresumable_last_event_id_asks_for_a_reset():
+    bus = EventBus(replay_size=2)
+    ids = _publish(bus, 5)
+    assert _subscribe(bus, last_event_id=ids[0]) == ([], True)  # fell out of the replay buffer
+    assert _subscribe(bus, last_event_id=ids[2])[1] is False
+    assert _subscribe(bus, last_event_id="0-1") == ([], True)  # previous process (other epoch)
+    assert _subscribe(bus, last_event_id=f"{bus.epoch}-99") == ([], True)  # newer than anything published
+    assert _subscribe(bus, last_event_id="garbage") == ([], True)
+    assert _subscribe(bus) == ([], False)
+
+
+def test_slow_subscriber_drops_oldest_events():
+    async def scenario():
+        bus = EventBus(buffer_size=2)
+        subscription, _, _ = bus.subscribe()
+        _publish(bus, 4)
+        messages = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+        bus.unsubscribe(subscription)
+        return bus, messages
+
+    bus, messages = asyncio.run(scenario())
+    assert ['"n":2' in messages[0], '"n":3' in messages[1]] == [True, True]
+    assert bus.stats()["dropped"] == 2
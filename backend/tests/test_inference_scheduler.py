@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import pytest
+from backend.app.services.inference_scheduler import InferenceScheduler, FrameSuperseded
+
+
+async def _wait_busy(scheduler, camera_id):
+    for _ in range(200):
+        if scheduler.stats()["cameras"].get(camera_id, {}).get("busy"):
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"camera {camera_id} never started")
+
+
+def test_newest_frame_wins_and_cameras_take_turns():
+    served = []
+    gate = threading.Event()
+
+    def frame(name, block=False):
+        def work():
+            if block:
+                gate.wait(5)
+            served.append(name)
+            return name
+        return work
+
+    async def scenario():
+        scheduler = InferenceScheduler(workers=1)
+        first = asyncio.ensure_future(scheduler.run("A", frame("A1", block=True)))
+        await _wait_busy(scheduler, "A")
+        # While A1 runs, A2 queues behind it and is then replaced by A3
+        waiting = [asyncio.ensure_future(scheduler.run(camera, frame(name)))
+                   for camera, name in (("A", "A2"), ("B", "B1"), ("C", "C1"))]
+        await asyncio.sleep(0.01)
+        latest = asyncio.ensure_future(scheduler.run("A", frame("A3")))
+        await asyncio.sleep(0.01)
+        gate.set()
+        results = await asyncio.gather(first, *waiting, latest, return_exceptions=True)
+        return scheduler, results
+
+    scheduler, results = asyncio.run(scenario())
+    assert results[0] == "A1"
+    assert isinstance(results[1], FrameSuperseded)
+    assert results[2:] == ["B1", "C1", "A3"]
+    assert served == ["A1", "B1", "C1", "A3"]  # round-robin from the camera after A
+    stats = scheduler.stats()
+    assert stats["superseded"] == 1 and stats["cameras"]["A"]["served"] == 2
+
+
+def test_weighted_policy_interleaves_in_proportion():
+    scheduler = InferenceScheduler(policy="weighted", cameras={"A": {"weight": 2}, "B": {"weight": 1}})
+    for camera in ("A", "B"):
+        scheduler._slot(camera).pending = object()
+    picks = [scheduler._pick(0.0)[0].camera_id for _ in range(6)]
+    assert picks == ["A", "B", "A", "A", "B", "A"]
+
+
+def test_errors_reach_the_caller_and_disabled_runs_on_the_executor():
+    def boom():
+        raise ValueError("bad frame")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await InferenceScheduler(workers=1).run("cam", boom)
+        return await InferenceScheduler(enabled=False).run("cam", threading.get_ident)
+
+    assert asyncio.run(scenario()) != threading.get_ident()
+
+
+def test_idle_unconfigured_slots_are_evicted_beyond_max_cameras():
+    scheduler = InferenceScheduler(max_cameras=3, cameras={"fixed": {"weight": 2}})
+    with scheduler._cond:
+        scheduler._slot("fixed")
+        scheduler._slot("waiting").pending = object()
+        for camera in ("a", "b", "c"):
+            scheduler._slot(camera)
+    assert scheduler._order == ["fixed", "waiting", "c"]
+    assert set(scheduler._slots) == set(scheduler._order)
+
+
+def test_cancelled_requests_are_not_counted_as_served():
+    gate = threading.Event()
+
+    async def scenario():
+        scheduler = InferenceScheduler(workers=1)
+        first = asyncio.ensure_future(scheduler.run("A", lambda: gate.wait(5)))
+        await _wait_busy(scheduler, "A")
+        abandoned = asyncio.ensure_future(scheduler.run("B", lambda: "B1"))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()  # client went away while waiting for its turn
+        gate.set()
+        await first
+        for _ in range(200):
+            if scheduler.stats()["cameras"]["B"]["cancelled"]:
+                break
+            await asyncio.sleep(0.01)
+        return scheduler.stats()["cameras"]["B"]
+
+    camera = asyncio.run(scenario())
+    assert camera["cancelled"] == 1 and camera["served"] == 0 and camera["achieved_fps"] == 0
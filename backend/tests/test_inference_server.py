@@ -0,0 +1,30 @@
+import pytest
+from backend.app.services.inference_server import _address, _authkey
+
+
+@pytest.mark.parametrize("key", [None, "", "too-short"])
+def test_missing_or_short_authkey_is_refused(monkeypatch, key):
+    if key is None:
+        monkeypatch.delenv("INFERENCE_SERVER_AUTHKEY", raising=False)
+    else:
+        monkeypatch.setenv("INFERENCE_SERVER_AUTHKEY", key)
+    with pytest.raises(RuntimeError):
+        _authkey({})
+
+
+def test_authkey_is_read_from_the_configured_variable(monkeypatch):
+    monkeypatch.setenv("MY_INFERENCE_SECRET", "0123456789abcdef0123")
+    assert _authkey({"authkey_env": "MY_INFERENCE_SECRET"}) == b"0123456789abcdef0123"
+
+
+@pytest.mark.parametrize("address", ["0.0.0.0:9000", "10.0.0.5:9000", "inference.local:9000"])
+def test_non_loopback_tcp_needs_allow_remote(address):
+    with pytest.raises(ValueError):
+        _address(address)
+    assert _address(address, allow_remote=True)[1] == "AF_INET"
+
+
+def test_loopback_and_unix_socket_addresses():
+    assert _address("127.0.0.1:9000") == (("127.0.0.1", 9000), "AF_INET")
+    assert _address("localhost:9000") == (("localhost", 9000), "AF_INET")
+    assert _address("/tmp/face.sock") == ("/tmp/face.sock", "AF_UNIX")
@@ -0,0 +1,58 @@
+import asyncio
+import time
+import pytest
+from backend.app.main import app
+from backend.app.services.model_registry import ModelRegistry, model_registry, ModelNotReady
+from backend.app.services.training_service import TrainingService
+
+
+def _flaky_factory(failures):
+    calls = []
+
+    def factory():
+        calls.append(time.monotonic())
+        if len(calls) <= failures:
+            raise RuntimeError("no models")
+        return "service"
+    return factory, calls
+
+
+def test_models_not_ready_in_a_service_answer_503(monkeypatch):
+    monkeypatch.setattr(model_registry, "_state", "failed")
+    monkeypatch.setattr(model_registry, "_error", "no models")
+    monkeypatch.setattr(model_registry, "_failed_at", time.monotonic())
+    monkeypatch.setattr(model_registry, "_retry_seconds", 30)
+    with pytest.raises(ModelNotReady) as info:
+        TrainingService().recognition_service
+    response = asyncio.run(app.exception_handlers[ModelNotReady](None, info.value))
+    assert response.status_code == 503
+    assert 1 <= int(response.headers["retry-after"]) <= 30
+
+
+def test_failed_load_is_retried_after_the_backoff():
+    factory, calls = _flaky_factory(failures=1)
+    registry = ModelRegistry(factory, retry_seconds=0.2)
+    with pytest.raises(ModelNotReady) as info:
+        registry.get(wait=5)
+    assert info.value.retry_after == "1"
+    with pytest.raises(ModelNotReady):
+        registry.get(wait=5)  # still backing off: no second attempt yet
+    assert len(calls) == 1
+
+    time.sleep(0.25)
+    assert registry.get(wait=5) == "service"
+    assert len(calls) == 2
+    assert registry.status()["state"] == "ready" and registry.status()["error"] is None
+
+
+def test_failed_load_without_retries_answers_500():
+    factory, calls = _flaky_factory(failures=1)
+    registry = ModelRegistry(factory, retry_seconds=0)
+    for _ in range(2):
+        with pytest.raises(ModelNotReady) as info:
+            registry.get(wait=5)
+    assert len(calls) == 1
+    assert info.value.retry_after is None
+    response = asyncio.run(app.exception_handlers[ModelNotReady](None, info.value))
+    assert response.status_code == 500
+    assert "retry-after" not in response.headers
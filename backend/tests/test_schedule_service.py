@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, time as dt_time
+import pytest
+from backend.app.services.database import SessionLocal, create_db_and_tables, engine
+from backend.app.services.schedule_service import ScheduleService
+
+MONDAY = datetime(2024, 3, 4)
+
+
+def _at(day_offset, hour, minute=0):
+    return MONDAY.replace(day=MONDAY.day + day_offset, hour=hour, minute=minute)
+
+
+def _service(windows):
+    service = ScheduleService(refresh_seconds=3600)
+    service._windows = {"cam": windows}
+    service._loaded_at = time.monotonic()
+    return service
+
+
+def test_window_across_midnight_belongs_to_the_day_it_starts():
+    service = _service([(0, dt_time(22, 0), dt_time(2, 0), "Night")])  # Monday 22:00 - Tuesday 02:00
+    assert service.active_sections(None, "cam", _at(0, 23)) == ("Night",)
+    assert service.active_sections(None, "cam", _at(1, 1, 59)) == ("Night",)
+    assert service.active_sections(None, "cam", _at(1, 2)) is None
+    assert service.active_sections(None, "cam", _at(0, 1)) is None  # would have started on Sunday
+    assert service.active_sections(None, "cam", _at(1, 23)) is None
+
+
+def test_sunday_night_window_runs_into_monday():
+    service = _service([(6, dt_time(23, 0), dt_time(1, 0), "Late")])
+    assert service.active_sections(None, "cam", _at(0, 0, 30)) == ("Late",)
+    assert service.active_sections(None, "cam", _at(6, 23, 30)) == ("Late",)
+
+
+def test_every_day_windows_and_overlaps():
+    service = _service([(None, dt_time(20, 0), dt_time(6, 0), "B"), (None, dt_time(5, 0), dt_time(7, 0), "A")])
+    assert service.active_sections(None, "cam", _at(3, 5, 30)) == ("A", "B")
+    assert service.active_sections(None, "cam", _at(3, 21)) == ("B",)
+    assert service.active_sections(None, "cam", _at(3, 12)) is None
+    assert service.active_sections(None, "other", _at(3, 21)) is None
+
+
+@pytest.fixture
+def db():
+    create_db_and_tables()
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM camera_schedules")
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def test_schedules_reload_after_invalidate(db):
+    service = ScheduleService(refresh_seconds=3600)
+    assert service.active_sections(db, "cam", _at(0, 23)) is None
+    service.add_schedule(db, "cam", "Night", "22:00", "02:00", day_of_week=0)
+    assert service.active_sections(db, "cam", _at(1, 1)) == ("Night",)
+    with pytest.raises(ValueError):
+        service.add_schedule(db, "cam", "Night", "22:00", "22:00")
+
+
+def test_load_racing_invalidate_does_not_cache_stale_windows(db):
+    service = ScheduleService(refresh_seconds=3600)
+    service.add_schedule(db, "cam", "Old", "08:00", "10:00")
+
+    class _InvalidatedMidQuery:
+        """Session whose schedule query returns the rows it read just before a concurrent change lands"""
+        def query(self, model):
+            rows = db.query(model).all()
+            service.invalidate()
+            return type("Query", (), {"all": lambda _: rows})()
+
+    assert service.active_sections(_InvalidatedMidQuery(), "cam", _at(0, 9)) == ("Old",)
+    assert service._windows is None  # the racing load answered its caller but wasn't cached
+    assert service.active_sections(db, "cam", _at(0, 9)) == ("Old",)
+    assert service._windows is not None
@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+import pytest
+from backend.app.services.database import Attendance, Student, SessionLocal, create_db_and_tables, engine
+from backend.app.services.video_attendance_service import VideoAttendanceService, VideoFileProgress
+
+
+class _NoFaces:
+    """Recognition stand-in: owns its gallery (nothing loaded from the db) and never sees anyone"""
+    owns_gallery = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def analyze_frame(self, frame, registered_students, **kwargs):
+        self.calls += 1
+        return [], 0
+
+
+@pytest.fixture
+def db():
+    create_db_and_tables()
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM attendance")
+        connection.exec_driver_sql("DELETE FROM students")
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def _write_video(path, frames, fps=10):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (160, 120))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def test_record_is_idempotent_within_cooldown(db):
+    student = Student(name="Ada", roll_number="R1")
+    db.add(student)
+    db.commit()
+    service = VideoAttendanceService()
+    face = {"student_id": student.id, "name": "Ada", "roll_number": "R1"}
+    seen_at = datetime(2026, 3, 2, 9, 0)
+
+    first = VideoFileProgress("a.mp4", "room-1", seen_at)
+    service._record(db, first, face, seen_at)
+    service._record(db, first, face, seen_at + timedelta(minutes=1))
+    # Re-processing the same recording (or an overlapping one) doesn't duplicate the sighting either
+    again = VideoFileProgress("a.mp4", "room-1", seen_at)
+    service._record(db, again, face, seen_at)
+
+    assert db.query(Attendance).count() == 1
+    assert (first.attendance_created, first.attendance_existing) == (1, 1)
+    assert (again.attendance_created, again.attendance_existing) == (0, 1)
+
+    # Another camera, or a sighting past the cooldown, is a new record
+    service._record(db, again, face, seen_at + service.cooldown + timedelta(minutes=1))
+    service._record(db, VideoFileProgress("b.mp4", "room-2", seen_at), face, seen_at)
+    assert db.query(Attendance).count() == 3
+
+
+def test_static_scene_frames_are_skipped(db, tmp_path):
+    still = np.full((120, 160, 3), 90, dtype=np.uint8)
+    path = _write_video(tmp_path / "still.avi", [still] * 30)
+    service = VideoAttendanceService({"sample_fps": 10, "scene_max_skip_seconds": 60})
+    model = _NoFaces()
+    progress = VideoFileProgress(path, "room-1", datetime(2026, 3, 2, 9, 0))
+
+    service.process_file(progress, model)
+
+    assert progress.status == "done"
+    assert progress.frames_sampled == 30
+    assert progress.frames_analyzed == model.calls == 1
+    assert progress.frames_skipped_static == 29
+
+
+def test_scene_changes_and_max_skip_force_analysis(db, tmp_path):
+    # Alternating dark/bright frames: every sample differs from the last analyzed one
+    frames = [np.full((120, 160, 3), 40 if i % 2 else 200, dtype=np.uint8) for i in range(10)]
+    changing = _write_video(tmp_path / "changing.avi", frames)
+    service = VideoAttendanceService({"sample_fps": 10, "scene_max_skip_seconds": 60})
+    progress = VideoFileProgress(changing, "room-1", datetime(2026, 3, 2, 9, 0))
+    service.process_file(progress, _NoFaces())
+    assert (progress.frames_analyzed, progress.frames_skipped_static) == (10, 0)
+
+    # A still scene is re-analyzed once scene_max_skip_seconds have passed
+    still = _write_video(tmp_path / "still.avi", [np.full((120, 160, 3), 90, dtype=np.uint8)] * 30)
+    service = VideoAttendanceService({"sample_fps": 10, "scene_max_skip_seconds": 1})
+    progress = VideoFileProgress(still, "room-1", datetime(2026, 3, 2, 9, 0))
+    service.process_file(progress, _NoFaces())
+    assert progress.frames_analyzed == 3
+    assert progress.frames_skipped_static == 27
+
+
+def test_submit_resolves_missing_start_on_the_worker(db, tmp_path, monkeypatch):
+    path = _write_video(tmp_path / "clip.avi", [np.full((120, 160, 3), 90, dtype=np.uint8)] * 10)
+    service = VideoAttendanceService({"sample_fps": 10, "max_workers": 1})
+    calls = []
+    original = VideoAttendanceService.default_start
+    monkeypatch.setattr(VideoAttendanceService, "default_start",
+                        staticmethod(lambda p: calls.append(p) or original(p)))
+    try:
+        job = service.submit([path], "room-1", recognition_service=_NoFaces())
+        deadline = time.time() + 10
+        while job.status in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        service.shutdown()
+
+    assert job.status == "done"
+    assert calls == [path]
+    assert job.files[0].recorded_at is not None
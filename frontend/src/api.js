@@ -54,6 +54,20 @@ export const getAllStudents = async () => {
   return response.json();
 };
 
+// One page of students, optionally filtered by a name / roll number prefix.
+// Pass the returned nextAfterId as afterId to get the next page (null when there is none).
+export const getStudentsPage = async ({ q = "", afterId = null, limit = 100 } = {}) => {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (q) params.append("q", q);
+  if (afterId !== null) params.append("after_id", String(afterId));
+  const response = await fetch(`${API_BASE_URL}/students/?${params}`);
+  if (!response.ok) {
+    throw new Error("Failed to fetch students");
+  }
+  const nextAfterId = response.headers.get("X-Next-After-Id");
+  return { students: await response.json(), nextAfterId: nextAfterId ? Number(nextAfterId) : null };
+};
+
 export const deleteStudent = async (studentId) => {
   const response = await fetch(`${API_BASE_URL}/students/${studentId}`, {
     method: "DELETE",
@@ -148,9 +148,12 @@ function SingleCameraView({ camera }) {
   const [snapshot, setSnapshot] = useState(null)
 
   useEffect(() => {
-    let interval
+    let timeout
+    let cancelled = false
     if (isRunning) {
-      interval = setInterval(async () => {
+      const processFrame = async () => {
+        // The backend suggests the next interval based on its current load
+        let nextInterval = 500
         try {
           const { getCameraSnapshot, recognizeFrame } = await import('../api')
           const blob = await getCameraSnapshot(camera.id)
@@ -174,14 +177,22 @@ function SingleCameraView({ camera }) {
           if (result.recognized_faces) {
             setRecognizedFaces(result.recognized_faces)
           }
+          if (result.next_interval_ms) {
+            nextInterval = result.next_interval_ms
+          }
         } catch (err) {
           console.error('Error during recognition:', err)
         }
-      }, 500) // Process every 0.5 seconds for faster updates
+        if (!cancelled) {
+          timeout = setTimeout(processFrame, nextInterval)
+        }
+      }
+      timeout = setTimeout(processFrame, 0)
     }
 
     return () => {
-      if (interval) clearInterval(interval)
+      cancelled = true
+      if (timeout) clearTimeout(timeout)
       if (snapshot && snapshot.startsWith('blob:')) {
         URL.revokeObjectURL(snapshot)
       }
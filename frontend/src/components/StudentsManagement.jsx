@@ -1,34 +1,60 @@
 import React, { useState, useEffect } from 'react'
-import { getAllStudents } from '../api'
+import { getStudentsPage } from '../api'
 import './StudentsManagement.css'
 
+const PAGE_SIZE = 100
+
 function StudentsManagement() {
   const [students, setStudents] = useState([])
   const [loading, setLoading] = useState(true)
   const [showModal, setShowModal] = useState(false)
   const [selectedStudent, setSelectedStudent] = useState(null)
   const [searchTerm, setSearchTerm] = useState('')
+  const [nextAfterId, setNextAfterId] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [formData, setFormData] = useState({
     name: '',
     images: []
   })
 
+  // Search runs on the server (name / roll number prefix); wait for the user to stop typing.
+  // Responses can arrive out of order, so one for a search term that has since changed is ignored
   useEffect(() => {
-    fetchStudents()
-  }, [])
+    let ignore = false
+    const timer = setTimeout(() => fetchStudents(() => ignore), 250)
+    return () => {
+      ignore = true
+      clearTimeout(timer)
+    }
+  }, [searchTerm])
 
-  const fetchStudents = async () => {
+  const fetchStudents = async (isStale = () => false) => {
     try {
-      setLoading(true)
-      const response = await getAllStudents()
-      setStudents(response)
+      const page = await getStudentsPage({ q: searchTerm.trim(), limit: PAGE_SIZE })
+      if (isStale()) return
+      setStudents(page.students)
+      setNextAfterId(page.nextAfterId)
       setLoading(false)
     } catch (err) {
+      if (isStale()) return
       console.error('Error fetching students:', err)
       setLoading(false)
     }
   }
 
+  const handleLoadMore = async () => {
+    try {
+      setLoadingMore(true)
+      const page = await getStudentsPage({ q: searchTerm.trim(), afterId: nextAfterId, limit: PAGE_SIZE })
+      setStudents((current) => [...current, ...page.students])
+      setNextAfterId(page.nextAfterId)
+    } catch (err) {
+      console.error('Error fetching students:', err)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleAddStudent = () => {
     setSelectedStudent(null)
     setFormData({ name: '', images: [] })
@@ -64,10 +90,6 @@ function StudentsManagement() {
     fetchStudents()
   }
 
-  const filteredStudents = students.filter(student =>
-    student.name.toLowerCase().includes(searchTerm.toLowerCase())
-  )
-
   if (loading) {
     return <div className="loading">Loading students...</div>
   }
@@ -83,7 +105,7 @@ function StudentsManagement() {
         <input
           type="text"
           className="search-input"
-          placeholder="🔍 Search students by name..."
+          placeholder="🔍 Search students by name or roll number..."
           value={searchTerm}
           onChange={(e) => setSearchTerm(e.target.value)}
         />
@@ -92,10 +114,10 @@ function StudentsManagement() {
         </button>
       </div>
 
-      {filteredStudents.length > 0 ? (
+      {students.length > 0 ? (
         <div className="students-grid">
-          {filteredStudents.map((student) => (
-            <div key={student.name} className="student-card">
+          {students.map((student) => (
+            <div key={student.id} className="student-card">
               <div className="student-card-header">
                 <div className="student-avatar">
                   {student.name.charAt(0).toUpperCase()}
@@ -135,6 +157,14 @@ function StudentsManagement() {
         </div>
       )}
 
+      {nextAfterId !== null && (
+        <div className="card-actions">
+          <button className="btn btn-secondary" onClick={handleLoadMore} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
+
       {showModal && (
         <AddStudentModal
           student={selectedStudent}
@@ -1,3 +1,17 @@
+"""
+Realtime API checks and load generator.
+
+    python test_realtime.py                      # smoke test: one request per endpoint
+    python test_realtime.py load --cameras 8 --fps 2 --duration 60 --dashboard-rps 2
+
+The load mode simulates N virtual cameras posting frames to /recognition/recognize-frame at a
+target FPS, mixed with dashboard reads of /attendance/ and /cameras/, and reports throughput,
+latency percentiles, error rates and backpressure (429/503) responses per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import time
 import httpx
 import cv2
 import numpy as np
@@ -34,7 +48,7 @@ async def test_recognize_frame():
         response = await client.post(f"{BASE_URL}/recognition/recognize-frame", files=files)
         print(f"Recognize Frame Status: {response.status_code}")
         json_response = response.json()
-        print(f"Recognized Faces: {json_response.get("recognized_faces")}")
+        print(f"Recognized Faces: {json_response.get('recognized_faces')}")
         # Decode and display annotated frame if available
         # if "annotated_frame" in json_response:
         #     img_data = base64.b64decode(json_response["annotated_frame"])
@@ -93,6 +107,183 @@ async def main():
     await test_add_camera_and_snapshot()
     await test_get_attendance_records()
 
+# ---------------------------------------------------------------------------
+# Load generator
+# ---------------------------------------------------------------------------
+
+BACKPRESSURE_STATUSES = {429, 503}
+
+class EndpointStats:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.ok = 0
+        self.errors = 0
+        self.backpressure = 0
+        self.status_counts = {}
+        self.missed_slots = 0
+
+    def record(self, status, latency_ms):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if status in BACKPRESSURE_STATUSES:
+            self.backpressure += 1
+        elif isinstance(status, int) and 200 <= status < 300:
+            self.ok += 1
+            self.latencies.append(latency_ms)
+        else:
+            self.errors += 1
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self, duration):
+        total = self.ok + self.errors + self.backpressure
+        return {
+            "endpoint": self.name,
+            "requests": total,
+            "ok": self.ok,
+            "throughput_rps": round(self.ok / duration, 2) if duration else 0.0,
+            "p50_ms": round(self.percentile(0.50), 1),
+            "p95_ms": round(self.percentile(0.95), 1),
+            "p99_ms": round(self.percentile(0.99), 1),
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "backpressure_rate": round(self.backpressure / total, 4) if total else 0.0,
+            "missed_slots": self.missed_slots,
+            "status_counts": {str(k): v for k, v in sorted(self.status_counts.items(), key=lambda kv: str(kv[0]))},
+        }
+
+def make_frames(width, height, count, seed):
+    """Pre-encode a few distinct synthetic JPEG frames per camera"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        image = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
+        cv2.putText(image, f"cam {seed} frame {i}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+        _, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        frames.append(encoded.tobytes())
+    return frames
+
+async def timed_request(client, stats, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        response = None
+        status = type(e).__name__
+    stats.record(status, (time.perf_counter() - start) * 1000)
+    return response
+
+async def virtual_camera(client, args, camera_index, stats, deadline):
+    """Post frames at the target FPS; a camera waits for each response like the dashboard does"""
+    frames = make_frames(args.width, args.height, 1 if args.static_frames else 8, camera_index)
+    interval = 1.0 / args.fps
+    next_slot = time.perf_counter() + (camera_index % 10) * interval / 10  # Stagger camera start
+    frame_index = 0
+    while time.perf_counter() < deadline:
+        now = time.perf_counter()
+        if now < next_slot:
+            await asyncio.sleep(next_slot - now)
+        files = {"file": ("frame.jpg", frames[frame_index % len(frames)], "image/jpeg")}
+        frame_index += 1
+        response = await timed_request(client, stats, "POST", f"{args.base_url}/recognition/recognize-frame",
+                                       params={"camera_id": f"load-{camera_index}"}, files=files)
+        step = interval
+        if args.honor_backoff and response is not None and response.status_code == 200:
+            step = max(interval, response.json().get("next_interval_ms", 0) / 1000)
+        next_slot += step
+        behind = time.perf_counter() - next_slot
+        if behind > step:
+            # Drop the slots we could not serve instead of bursting to catch up
+            skipped = int(behind // step)
+            stats.missed_slots += skipped
+            next_slot += skipped * step
+
+async def dashboard_reader(client, args, stats_by_endpoint, deadline):
+    """Alternate attendance and camera list reads at the target rate"""
+    interval = 1.0 / args.dashboard_rps
+    targets = [("attendance", f"{args.base_url}/attendance/", {"skip": 0, "limit": 100}),
+               ("cameras", f"{args.base_url}/cameras/", None)]
+    index = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        name, url, params = targets[index % len(targets)]
+        index += 1
+        await timed_request(client, stats_by_endpoint[name], "GET", url, params=params)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+async def run_load(args):
+    stats = {name: EndpointStats(name) for name in ("recognize-frame", "attendance", "cameras")}
+    limits = httpx.Limits(max_connections=args.cameras + args.dashboard_readers + 4)
+    timeout = httpx.Timeout(args.timeout)
+    print(f"Load: {args.cameras} camera(s) x {args.fps} FPS, {args.dashboard_readers} dashboard reader(s) x "
+          f"{args.dashboard_rps} req/s for {args.duration}s against {args.base_url}")
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        tasks = [virtual_camera(client, args, i, stats["recognize-frame"], deadline) for i in range(args.cameras)]
+        if args.dashboard_rps > 0:
+            tasks += [dashboard_reader(client, args, stats, deadline) for _ in range(args.dashboard_readers)]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "command"},
+        "elapsed_seconds": round(elapsed, 2),
+        "target_frame_rps": args.cameras * args.fps,
+        "endpoints": [s.summary(elapsed) for s in stats.values() if s.ok + s.errors + s.backpressure > 0],
+    }
+    print(f"\n{'endpoint':<16} {'reqs':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6} {'bp%':>6} {'missed':>7}")
+    for row in report["endpoints"]:
+        print(f"{row['endpoint']:<16} {row['requests']:>7} {row['throughput_rps']:>8.2f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['error_rate'] * 100:>6.1f} "
+              f"{row['backpressure_rate'] * 100:>6.1f} {row['missed_slots']:>7}")
+    frames = next((row for row in report["endpoints"] if row["endpoint"] == "recognize-frame"), None)
+    if frames:
+        print(f"\nAchieved {frames['throughput_rps']:.2f} of {report['target_frame_rps']:.2f} target frames/s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Realtime API smoke test and load generator")
+    parser.add_argument("--base-url", default=BASE_URL)
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("smoke", help="One request per endpoint (default)")
+    load = subparsers.add_parser("load", help="Concurrent multi-camera load test")
+    load.add_argument("--cameras", type=int, default=4, help="Number of virtual cameras")
+    load.add_argument("--fps", type=float, default=2.0, help="Target frames per second per camera")
+    load.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds")
+    load.add_argument("--dashboard-rps", type=float, default=1.0, help="Requests per second per dashboard reader (0 disables)")
+    load.add_argument("--dashboard-readers", type=int, default=1, help="Number of concurrent dashboard readers")
+    load.add_argument("--width", type=int, default=640)
+    load.add_argument("--height", type=int, default=480)
+    load.add_argument("--static-frames", action="store_true", help="Send the same bytes every frame (stalled camera)")
+    load.add_argument("--honor-backoff", action="store_true", help="Slow down to the server's next_interval_ms")
+    load.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    load.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+    if args.command == "load":
+        if args.fps <= 0:
+            parser.error("--fps must be greater than 0")
+        if args.cameras < 1:
+            parser.error("--cameras must be at least 1")
+        if args.duration <= 0:
+            parser.error("--duration must be greater than 0")
+        if args.dashboard_rps < 0:
+            parser.error("--dashboard-rps must not be negative")
+    return args
+
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    args = parse_args()
+    if args.command == "load":
+        asyncio.run(run_load(args))
+    else:
+        BASE_URL = args.base_url
+        asyncio.run(main())